@@ -1,12 +1,11 @@
 import os
 import time
+import warnings
 from pathlib import Path
-from typing import Union
+from typing import List, Optional, Union
 
 import bokeh
-import pandas as pd
 from bson import ObjectId
-from navani import echem as ec
 
 from pydatalab import bokeh_plots
 from pydatalab.blocks.base import DataBlock
@@ -14,9 +13,11 @@ from pydatalab.file_utils import get_file_info_by_id
 from pydatalab.logger import LOGGER
 from pydatalab.mongo import flask_mongo
 
+from .summary import get_cycle_summary, get_cycle_summary_df, ingest_echem_file
 from .utils import (
     compute_gpcl_differential,
     filter_df_by_cycle_index,
+    read_echem_cache,
     reduce_echem_cycle_sampling,
 )
 
@@ -52,6 +53,8 @@ class CycleBlock(DataBlock):
         "derivative_mode": None,
     }
 
+    _render_in_background = True
+
     def _get_characteristic_mass_g(self):
         # return {"characteristic_mass": 1000}
         doc = flask_mongo.db.items.find_one(
@@ -62,34 +65,36 @@ class CycleBlock(DataBlock):
             return characteristic_mass_mg / 1000.0
         return None
 
-    def _load(self, file_id: Union[str, ObjectId], reload: bool = False):
-        """Loads the echem data using navani, summarises it, then caches the results
-        to disk with suffixed names.
+    def _render_cache_extras(self):
+        # The plot depends on the characteristic mass stored on the item itself
+        return {"characteristic_mass_g": self._get_characteristic_mass_g()}
+
+    def _load(
+        self,
+        file_id: Union[str, ObjectId],
+        reload: bool = False,
+        cycle_list: Optional[List[int]] = None,
+    ):
+        """Loads the echem data using navani and returns it alongside the cycle summary.
+
+        The parsed data is cached in a columnar format containing only the required
+        columns, such that subsequent loads only need to read the requested cycles
+        from disk, and the cycle summary is stored in the database against the
+        current revision of the file.
 
         Parameters:
             file_id: The ID of the file to load.
             reload: Whether to reload the data from the file, or use the cached version, if available.
+            cycle_list: The cycles to load, following the conventions of `filter_df_by_cycle_index`
+                (all cycles if `None`).
 
         """
 
-        required_keys = (
-            "Time",
-            "Voltage",
-            "Capacity",
-            "Current",
-            "dqdv",
-            "dvdq",
-            "half cycle",
-            "full cycle",
-        )
-
         keys_with_units = {
             "Time": "time (s)",
             "Voltage": "voltage (V)",
             "Capacity": "capacity (mAh)",
             "Current": "current (mA)",
-            "Charge Capacity": "charge capacity (mAh)",
-            "Discharge Capacity": "discharge capacity (mAh)",
             "dqdv": "dQ/dV (mA/V)",
             "dvdq": "dV/dQ (V/mA)",
         }
@@ -97,9 +102,6 @@ class CycleBlock(DataBlock):
         file_info = get_file_info_by_id(file_id, update_if_live=True)
         filename = file_info["name"]
 
-        if file_info.get("is_live"):
-            reload = True
-
         ext = os.path.splitext(filename)[-1].lower()
 
         if ext not in self.accepted_file_extensions:
@@ -107,47 +109,43 @@ class CycleBlock(DataBlock):
                 f"Unrecognized filetype {ext}, must be one of {self.accepted_file_extensions}"
             )
 
-        parsed_file_loc = Path(file_info["location"]).with_suffix(".RAW_PARSED.pkl")
-        cycle_summary_file_loc = Path(file_info["location"]).with_suffix(".SUMMARY.pkl")
+        parsed_file_loc = Path(file_info["location"]).with_suffix(".RAW_PARSED")
+        revision = file_info.get("revision")
 
+        # Both caches are keyed on the file revision, which is incremented whenever
+        # a live file is synced, so they remain valid until the file actually changes
         raw_df = None
         cycle_summary_df = None
         if not reload:
-            if parsed_file_loc.exists():
-                raw_df = pd.read_pickle(parsed_file_loc)
-
-            if cycle_summary_file_loc.exists():
-                cycle_summary_df = pd.read_pickle(cycle_summary_file_loc)
+            cycle_summary = get_cycle_summary(file_id, revision=revision)
+            if cycle_summary is not None:
+                raw_df = read_echem_cache(
+                    parsed_file_loc, source_revision=revision, cycle_list=cycle_list
+                )
+                cycle_summary_df = get_cycle_summary_df(cycle_summary)
 
         if raw_df is None:
-            try:
-                LOGGER.debug("Loading file %s", file_info["location"])
-                start_time = time.time()
-                raw_df = ec.echem_file_loader(file_info["location"])
-                LOGGER.debug(
-                    "Loaded file %s in %s seconds",
-                    file_info["location"],
-                    time.time() - start_time,
-                )
-            except Exception as exc:
-                raise RuntimeError(f"Navani raised an error when parsing: {exc}") from exc
-            raw_df.to_pickle(parsed_file_loc)
-
-        try:
-            if cycle_summary_df is None:
-                cycle_summary_df = ec.cycle_summary(raw_df)
-                cycle_summary_df.to_pickle(cycle_summary_file_loc)
-        except Exception:
-            pass
-
-        raw_df = raw_df.filter(required_keys)
-        raw_df.rename(columns=keys_with_units, inplace=True)
+            LOGGER.debug("Loading file %s", file_info["location"])
+            start_time = time.time()
+            ingest_echem_file({"_id": file_id, **file_info}, force=reload)
+            LOGGER.debug(
+                "Loaded file %s in %s seconds",
+                file_info["location"],
+                time.time() - start_time,
+            )
+            # Remove any legacy pickled caches from previous versions
+            parsed_file_loc.with_suffix(".RAW_PARSED.pkl").unlink(missing_ok=True)
+            parsed_file_loc.with_suffix(".SUMMARY.pkl").unlink(missing_ok=True)
 
-        if cycle_summary_df is not None:
-            cycle_summary_df.rename(columns=keys_with_units, inplace=True)
-            cycle_summary_df["cycle index"] = pd.to_numeric(
-                cycle_summary_df.index, downcast="integer"
+            raw_df = read_echem_cache(
+                parsed_file_loc, source_revision=revision, cycle_list=cycle_list
             )
+            if raw_df is None:
+                raise RuntimeError(f"Unable to read parsed data for {filename}")
+            cycle_summary_df = get_cycle_summary_df(get_cycle_summary(file_id, revision=revision))
+
+        raw_df = raw_df.filter(keys_with_units.keys() | {"half cycle", "full cycle"})
+        raw_df.rename(columns=keys_with_units, inplace=True)
 
         return raw_df, cycle_summary_df
 
@@ -178,13 +176,26 @@ class CycleBlock(DataBlock):
         if not isinstance(cycle_list, list):
             cycle_list = None
 
-        raw_df, cycle_summary_df = self._load(file_id)
+        df = None
+        cycle_summary = None
+        if mode == "final capacity":
+            # Serve the summary directly from the database without reading the raw data,
+            # if it has already been computed for the current revision of the file
+            file_info = get_file_info_by_id(file_id, update_if_live=True)
+            cycle_summary = get_cycle_summary(file_id, revision=file_info.get("revision"))
+            cycle_summary_df = get_cycle_summary_df(cycle_summary)
+            if cycle_summary and cycle_summary.get("error"):
+                warnings.warn(cycle_summary["error"])
+
+        if cycle_summary is None:
+            df, cycle_summary_df = self._load(file_id, cycle_list=cycle_list)
 
         characteristic_mass_g = self._get_characteristic_mass_g()
 
         if characteristic_mass_g:
-            raw_df["capacity (mAh/g)"] = raw_df["capacity (mAh)"] / characteristic_mass_g
-            raw_df["current (mA/g)"] = raw_df["current (mA)"] / characteristic_mass_g
+            if df is not None:
+                df["capacity (mAh/g)"] = df["capacity (mAh)"] / characteristic_mass_g
+                df["current (mA/g)"] = df["current (mA)"] / characteristic_mass_g
             if cycle_summary_df is not None:
                 cycle_summary_df["charge capacity (mAh/g)"] = (
                     cycle_summary_df["charge capacity (mAh)"] / characteristic_mass_g
@@ -193,11 +204,17 @@ class CycleBlock(DataBlock):
                     cycle_summary_df["discharge capacity (mAh)"] / characteristic_mass_g
                 )
 
-        df = filter_df_by_cycle_index(raw_df, cycle_list)
         if cycle_summary_df is not None:
             cycle_summary_df = filter_df_by_cycle_index(cycle_summary_df, cycle_list)
 
         if mode in ("dQ/dV", "dV/dQ"):
+            # Cache the differential of each half cycle against the current file revision,
+            # such that changing the selected cycles only computes the newly selected ones
+            file_info = get_file_info_by_id(file_id, update_if_live=False)
+            cache_dir = None
+            if not file_info.get("is_live"):
+                cache_dir = Path(file_info["location"]).with_suffix(".DIFFERENTIAL")
+
             df = compute_gpcl_differential(
                 df,
                 mode=mode,
@@ -206,14 +223,26 @@ class CycleBlock(DataBlock):
                 window_size_1=int(self.data["win_size_1"]),
                 window_size_2=int(self.data["win_size_2"]),
                 use_normalized_capacity=bool(characteristic_mass_g),
+                cache_dir=cache_dir,
+                cache_key={
+                    "source_revision": file_info.get("revision"),
+                    "characteristic_mass_g": characteristic_mass_g,
+                },
             )
 
-        # Reduce df size to 100 points per cycle by default if there are more than a 100k points
-        if len(df) > 1e5:
+        downsampling_options = self._get_downsampling_options()
+
+        # Reduce df size to 100 points per cycle by default if there are more than a 100k points,
+        # unless a shape-preserving downsampling method has been requested
+        if df is not None and downsampling_options["downsample_method"] is None and len(df) > 1e5:
             df = reduce_echem_cycle_sampling(df, num_samples=100)
 
         layout = bokeh_plots.double_axes_echem_plot(
-            df, cycle_summary=cycle_summary_df, mode=mode, normalized=bool(characteristic_mass_g)
+            df,
+            cycle_summary=cycle_summary_df,
+            mode=mode,
+            normalized=bool(characteristic_mass_g),
+            **downsampling_options,
         )
 
         if layout is not None:
@@ -0,0 +1,191 @@
+"""This submodule implements incremental parsing of append-only cycler exports,
+such that files that are still being written to by a running cycler (i.e.,
+"live" files synced from a remote) can be ingested by parsing only the rows
+that were appended since they were last read.
+
+The parsing state (byte offset into the file, a digest of the bytes preceding
+that offset and the cycling state of the last parsed row) is stored alongside
+the columnar cache of the parsed data (see `write_echem_cache`).
+
+Currently supported formats:
+    - Ivium `.txt` exports (tab-separated time, current and voltage columns), processed
+      equivalently to `navani.echem.ivium_processing`.
+
+"""
+
+import hashlib
+import io
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from pydatalab.logger import LOGGER
+
+__all__ = ("detect_incremental_format", "parse_incrementally")
+
+IVIUM_COLUMNS = ("time /s", "I /mA", "E /V")
+"""The columns that identify an Ivium `.txt` export."""
+
+DIGEST_WINDOW_BYTES = 4096
+"""The number of bytes at the start of the file and before the last parsed offset
+that are hashed to check that the file has only been appended to since it was last
+parsed, without having to re-read the whole file."""
+
+
+def _read_header(location: Union[str, Path]) -> Tuple[Optional[List[str]], int]:
+    """Returns the column names in the first line of the file, and the length of
+    that line in bytes.
+
+    """
+    with open(location, "rb") as f:
+        first_line = f.readline()
+    if not first_line.endswith(b"\n"):
+        return None, 0
+    return first_line.decode("utf-8", errors="replace").rstrip("\r\n").split("\t"), len(first_line)
+
+
+def _get_digest(location: Union[str, Path], offset: int) -> str:
+    digest = hashlib.sha256()
+    with open(location, "rb") as f:
+        digest.update(f.read(min(offset, DIGEST_WINDOW_BYTES)))
+        start = max(offset - DIGEST_WINDOW_BYTES, 0)
+        f.seek(start)
+        digest.update(f.read(offset - start))
+    return digest.hexdigest()
+
+
+def detect_incremental_format(location: Union[str, Path]) -> Optional[str]:
+    """Returns the name of the incremental parser for the given file, or `None`
+    if the file format does not support incremental parsing.
+
+    """
+    if not str(location).lower().endswith(".txt"):
+        return None
+
+    try:
+        header, _ = _read_header(location)
+    except OSError:
+        return None
+
+    if header and set(IVIUM_COLUMNS).issubset(header):
+        return "ivium"
+
+    return None
+
+
+def _process_ivium_rows(df: pd.DataFrame, previous: Optional[Dict[str, Any]]) -> pd.DataFrame:
+    """Computes the navani columns for newly read rows of an Ivium export,
+    continuing from the state of the previously parsed row (if any).
+
+    """
+    time = df["time /s"].to_numpy(dtype=float)
+    current = df["I /mA"].to_numpy(dtype=float)
+
+    dq = np.diff(time, prepend=previous["time"] if previous else 0.0) * current
+    state = np.where(current >= 0, 0, 1)
+
+    changes = np.empty(len(df), dtype=bool)
+    changes[1:] = state[1:] != state[:-1]
+    if len(df):
+        changes[0] = previous is None or state[0] != previous["state"]
+    half_cycle = (previous["half_cycle"] if previous else 0) + np.cumsum(changes)
+
+    capacity = pd.Series(np.abs(dq)).groupby(half_cycle).cumsum().to_numpy() / 3600
+    if previous is not None:
+        capacity[half_cycle == previous["half_cycle"]] += previous["capacity"]
+
+    df["dq"] = dq
+    df["Capacity"] = capacity
+    df["state"] = state
+    df["half cycle"] = half_cycle
+    df["Voltage"] = df["E /V"]
+    df["Time"] = df["time /s"]
+    df["Current"] = df["I /mA"]
+    df["full cycle"] = np.ceil(df["half cycle"] / 2)
+
+    return df
+
+
+_ROW_PROCESSORS = {"ivium": _process_ivium_rows}
+"""The functions used to compute the navani columns from newly read rows, for each supported format."""
+
+
+def parse_incrementally(
+    location: Union[str, Path], state: Optional[Dict[str, Any]] = None
+) -> Optional[Tuple[pd.DataFrame, Dict[str, Any]]]:
+    """Parse the rows of an append-only cycler export that were added since
+    it was last parsed.
+
+    Only complete lines are parsed, so a partially-written final line will be
+    picked up by the next call.
+
+    Parameters:
+        location: The path to the file.
+        state: The state returned by the previous call for this file, or `None`
+            to parse the file from the beginning.
+
+    Returns:
+        A dataframe of the newly parsed rows with the same columns as the navani
+        parser for this format, and the new state, or `None` if the file cannot be
+        parsed incrementally (e.g., an unsupported format, or the previously parsed
+        part of the file has changed), in which case it should be fully reparsed.
+
+    """
+    try:
+        header, header_length = _read_header(location)
+        if state is None:
+            file_format = detect_incremental_format(location)
+            if file_format is None:
+                return None
+            state = {
+                "format": file_format,
+                "header": header,
+                "byte_offset": header_length,
+                "digest": _get_digest(location, header_length),
+                "previous": None,
+            }
+
+        elif (
+            header != state["header"]
+            or Path(location).stat().st_size < state["byte_offset"]
+            or _get_digest(location, state["byte_offset"]) != state["digest"]
+        ):
+            LOGGER.debug("File %s has been modified, cannot parse incrementally", location)
+            return None
+
+        with open(location, "rb") as f:
+            f.seek(state["byte_offset"])
+            tail = f.read()
+    except OSError as exc:
+        LOGGER.debug("Unable to parse %s incrementally: %s", location, exc)
+        return None
+
+    tail = tail[: tail.rfind(b"\n") + 1]
+    if tail.strip():
+        df = pd.read_csv(
+            io.BytesIO(tail), sep="\t", header=None, names=state["header"], index_col=False
+        )
+    else:
+        df = pd.DataFrame({column: pd.Series(dtype=float) for column in state["header"]})
+
+    df = _ROW_PROCESSORS[state["format"]](df, state["previous"])
+
+    byte_offset = state["byte_offset"] + len(tail)
+    previous = state["previous"]
+    if len(df):
+        last_row = df.iloc[-1]
+        previous = {
+            "time": float(last_row["Time"]),
+            "state": int(last_row["state"]),
+            "half_cycle": int(last_row["half cycle"]),
+            "capacity": float(last_row["Capacity"]),
+        }
+
+    return df, {
+        **state,
+        "byte_offset": byte_offset,
+        "digest": _get_digest(location, byte_offset),
+        "previous": previous,
+    }
@@ -0,0 +1,313 @@
+"""This submodule implements a persistent store of per-cycle summaries of
+electrochemical cycling files, such that cycle-level data (capacities,
+efficiencies, voltage limits and durations) can be queried and plotted
+without re-reading the raw data file.
+
+Summaries are stored in the `cycle_summaries` collection, with one document
+per file, linked to the file's `ObjectId` and the revision of the file from
+which the summary was computed.
+
+"""
+
+import contextlib
+import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+import navani.echem as ec
+import pandas as pd
+import pymongo
+from bson import ObjectId
+
+from pydatalab.logger import LOGGER
+from pydatalab.mongo import flask_mongo
+
+from .incremental import parse_incrementally
+from .utils import (
+    ECHEM_CACHE_COLUMNS,
+    _get_parser_version,
+    append_echem_cache,
+    compute_cycle_summary,
+    read_echem_cache,
+    read_echem_cache_metadata,
+    write_echem_cache,
+)
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+__all__ = (
+    "CYCLE_SUMMARY_COLLECTION",
+    "ECHEM_INGEST_EXTENSIONS",
+    "save_cycle_summary",
+    "get_cycle_summary",
+    "get_cycle_summary_df",
+    "ingest_echem_file",
+)
+
+CYCLE_SUMMARY_COLLECTION = "cycle_summaries"
+
+ECHEM_INGEST_EXTENSIONS = (".mpr", ".res", ".nda", ".ndax")
+"""File extensions that are unambiguously cycler data, which will be parsed and
+summarised as soon as they are uploaded or synced. Files with more generic extensions
+(e.g., `.txt`) are summarised the first time they are loaded by a cycle block."""
+
+
+def _get_collection(database: Optional[pymongo.database.Database] = None):
+    if database is None:
+        database = flask_mongo.db
+    return database[CYCLE_SUMMARY_COLLECTION]
+
+
+def save_cycle_summary(
+    file_info: Dict[str, Any],
+    summary_df: Optional[pd.DataFrame] = None,
+    error: Optional[str] = None,
+    database: Optional[pymongo.database.Database] = None,
+) -> None:
+    """Store the cycle summary for the current revision of a file, replacing any
+    summary of a previous revision.
+
+    Parameters:
+        file_info: The file document from the database (must contain `_id` and `revision`).
+        summary_df: The summary computed by `compute_cycle_summary`, indexed by full cycle.
+        error: If the summary could not be computed, the reason why, which will be stored
+            in place of the summary so that it is reported rather than recomputed.
+        database: The database to use, defaulting to the Flask app's database.
+
+    """
+    cycles = []
+    if summary_df is not None:
+        records = summary_df.reset_index().astype(object)
+        cycles = records.where(records.notna(), None).to_dict(orient="records")
+
+    _get_collection(database).replace_one(
+        {"file_id": ObjectId(file_info["_id"])},
+        {
+            "file_id": ObjectId(file_info["_id"]),
+            "revision": file_info.get("revision"),
+            "item_ids": file_info.get("item_ids", []),
+            "parser_version": _get_parser_version(),
+            "last_modified": datetime.datetime.now(tz=datetime.timezone.utc),
+            "status": "error" if error else "success",
+            "error": error,
+            "cycles": cycles,
+        },
+        upsert=True,
+    )
+
+
+def get_cycle_summary(
+    file_id: Union[str, ObjectId],
+    revision: Optional[int] = None,
+    database: Optional[pymongo.database.Database] = None,
+) -> Optional[Dict[str, Any]]:
+    """Returns the stored cycle summary document for the given file, if it exists
+    and was computed from the given revision of the file (if provided).
+
+    """
+    query: Dict[str, Any] = {"file_id": ObjectId(file_id)}
+    if revision is not None:
+        query["revision"] = revision
+    return _get_collection(database).find_one(query, projection={"_id": 0})
+
+
+def get_cycle_summary_df(summary: Optional[Dict[str, Any]]) -> Optional[pd.DataFrame]:
+    """Converts a stored cycle summary document into a dataframe indexed by full cycle,
+    as used by the cycle block plots, or `None` if there is no valid summary.
+
+    """
+    if not summary or summary.get("status") != "success" or not summary.get("cycles"):
+        return None
+
+    summary_df = pd.DataFrame(summary["cycles"]).set_index("full cycle")
+    summary_df["cycle index"] = pd.to_numeric(summary_df.index, downcast="integer")
+    return summary_df
+
+
+@contextlib.contextmanager
+def _cache_lock(cache_dir: Path):
+    """Hold an exclusive lock on the cache directory for the duration of the context,
+    to prevent concurrent (incremental) writes from multiple server processes.
+
+    """
+    if fcntl is None:
+        yield
+        return
+
+    lock_file = cache_dir.with_name(f"{cache_dir.name}.lock")
+    with open(lock_file, "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _ingest_appended_rows(
+    file_info: Dict[str, Any],
+    cache_dir: Path,
+    metadata: Dict[str, Any],
+    database: Optional[pymongo.database.Database] = None,
+) -> bool:
+    """Attempt to parse only the rows appended to a file since it was last ingested,
+    appending them to the columnar cache and updating the summaries of the affected cycles.
+
+    Returns:
+        Whether the file was successfully ingested incrementally.
+
+    """
+    revision = file_info.get("revision")
+    result = parse_incrementally(file_info["location"], metadata["incremental_state"])
+    if result is None:
+        return False
+
+    new_rows, incremental_state = result
+    previous_revision = metadata["source_revision"]
+    if not append_echem_cache(
+        new_rows,
+        cache_dir,
+        metadata,
+        source_revision=revision,
+        incremental_state=incremental_state,
+    ):
+        return False
+
+    LOGGER.debug("Appended %s new rows from %s to cache", len(new_rows), file_info["location"])
+
+    # Only recompute the summaries of the cycles that received new data
+    summary_df = get_cycle_summary_df(
+        get_cycle_summary(file_info["_id"], revision=previous_revision, database=database)
+    )
+    error = None
+    try:
+        if summary_df is None:
+            summary_df = compute_cycle_summary(read_echem_cache(cache_dir, revision))
+        elif len(new_rows):
+            affected_cycles = new_rows["full cycle"].dropna().unique()
+            affected_rows = read_echem_cache(
+                cache_dir,
+                revision,
+                half_cycles=[int(2 * c + offset) for c in affected_cycles for offset in (-1, 0)],
+            )
+            affected_summary_df = compute_cycle_summary(affected_rows)
+            summary_df = pd.concat(
+                [
+                    summary_df.drop(columns="cycle index").drop(
+                        affected_summary_df.index, errors="ignore"
+                    ),
+                    affected_summary_df,
+                ]
+            ).sort_index()
+        else:
+            summary_df = summary_df.drop(columns="cycle index")
+    except Exception as exc:
+        summary_df = None
+        error = f"Unable to compute cycle summary: {exc}"
+        LOGGER.warning("%s for file %s", error, file_info["location"])
+
+    save_cycle_summary(file_info, summary_df=summary_df, error=error, database=database)
+    return True
+
+
+def _summarise_cached_rows(
+    file_info: Dict[str, Any],
+    cache_dir: Path,
+    database: Optional[pymongo.database.Database] = None,
+) -> bool:
+    """Recompute and store the cycle summary of a file from its up-to-date columnar cache,
+    without reparsing the file.
+
+    Returns:
+        Whether the cache could be read and the summary was stored.
+
+    """
+    try:
+        raw_df = read_echem_cache(cache_dir, file_info.get("revision"))
+    except Exception as exc:
+        LOGGER.debug("Unable to read cache of %s: %s", file_info["location"], exc)
+        return False
+    if raw_df is None:
+        return False
+
+    summary_df = None
+    error = None
+    try:
+        summary_df = compute_cycle_summary(raw_df)
+    except Exception as exc:
+        error = f"Unable to compute cycle summary: {exc}"
+        LOGGER.warning("%s for file %s", error, file_info["location"])
+
+    save_cycle_summary(file_info, summary_df=summary_df, error=error, database=database)
+    return True
+
+
+def ingest_echem_file(
+    file_info: Dict[str, Any],
+    database: Optional[pymongo.database.Database] = None,
+    force: bool = False,
+) -> None:
+    """Parse a cycler file, writing the columnar cache of its raw data
+    and storing its cycle summary in the database.
+
+    For append-only formats that have previously been ingested, only the rows
+    appended since then will be parsed (see `pydatalab.apps.echem.incremental`).
+    Otherwise, the whole file is parsed with navani.
+
+    Parameters:
+        file_info: The file document from the database.
+        database: The database to use, defaulting to the Flask app's database.
+        force: Whether to fully reparse the file even if the cache is up to date.
+
+    Raises:
+        RuntimeError: If the file could not be parsed at all.
+
+    """
+    location = file_info["location"]
+    cache_dir = Path(location).with_suffix(".RAW_PARSED")
+    revision = file_info.get("revision")
+
+    with _cache_lock(cache_dir):
+        metadata = None if force else read_echem_cache_metadata(cache_dir)
+        if metadata is not None and metadata.get("source_revision") == revision:
+            # Already ingested by another process, though the stored summary may have been
+            # lost independently of the cache (e.g., when restoring the database), in which
+            # case it is rebuilt from the cached columns
+            if get_cycle_summary(file_info["_id"], revision=revision, database=database):
+                return
+            if _summarise_cached_rows(file_info, cache_dir, database=database):
+                return
+
+        if metadata is not None and metadata.get("incremental_state"):
+            if _ingest_appended_rows(file_info, cache_dir, metadata, database=database):
+                return
+
+        incremental_state = None
+        try:
+            result = parse_incrementally(location)
+            if result is not None:
+                raw_df, incremental_state = result
+            else:
+                raw_df = ec.echem_file_loader(location)
+        except Exception as exc:
+            raise RuntimeError(f"Navani raised an error when parsing: {exc}") from exc
+
+        write_echem_cache(
+            raw_df,
+            cache_dir,
+            ECHEM_CACHE_COLUMNS,
+            source_revision=revision,
+            incremental_state=incremental_state,
+        )
+
+        summary_df = None
+        error = None
+        try:
+            summary_df = compute_cycle_summary(raw_df)
+        except Exception as exc:
+            error = f"Unable to compute cycle summary: {exc}"
+            LOGGER.warning("%s for file %s", error, location)
+
+        save_cycle_summary(file_info, summary_df=summary_df, error=error, database=database)
@@ -1,11 +1,100 @@
-from typing import List, Optional
+import hashlib
+import importlib.metadata
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
 import navani.echem as ec
 import numpy as np
 import pandas as pd
 
 from pydatalab.logger import LOGGER
-from pydatalab.utils import reduce_df_size
+
+ECHEM_CACHE_VERSION = 2
+"""The version of the on-disk parsed echem cache format; incrementing this
+will invalidate all existing caches."""
+
+FULL_PRECISION_COLUMNS = ("Time",)
+"""Columns that are not downcast to single precision when cached."""
+
+ECHEM_CACHE_COLUMNS = (
+    "Time",
+    "Voltage",
+    "Capacity",
+    "Current",
+    "dqdv",
+    "dvdq",
+    "half cycle",
+    "full cycle",
+    "state",
+)
+"""The columns of the parsed navani dataframe that are stored in the columnar cache;
+`"state"` is retained so that cycle summaries can be recomputed from the cache."""
+
+CYCLE_SUMMARY_KEYS_WITH_UNITS = {
+    "Current": "current (mA)",
+    "UCV": "max voltage (V)",
+    "LCV": "min voltage (V)",
+    "Charge Capacity": "charge capacity (mAh)",
+    "Discharge Capacity": "discharge capacity (mAh)",
+    "CE": "coulombic efficiency",
+    "Average Charge Voltage": "average charge voltage (V)",
+    "Average Discharge Voltage": "average discharge voltage (V)",
+    "Duration": "duration (s)",
+}
+"""The columns of the navani cycle summary that are retained, and their names with units."""
+
+DIFFERENTIAL_PARALLEL_MIN_ROWS = 200_000
+"""The number of rows above which differentials of half cycles are computed in a process pool."""
+
+DIFFERENTIAL_CACHE_VERSION = 2
+"""The version of the format of the cached differentials, bumped to invalidate old cache files."""
+
+DIFFERENTIAL_MAX_WORKERS = 8
+"""The maximum number of processes to use when computing differentials in parallel."""
+
+DIFFERENTIAL_CACHE_MAX_ENTRIES = 16
+"""The maximum number of cached differential results (i.e., parameter combinations) to keep per file."""
+
+_DIFFERENTIAL_EXECUTOR: Optional[ProcessPoolExecutor] = None
+_DIFFERENTIAL_EXECUTOR_PID: Optional[int] = None
+_DIFFERENTIAL_EXECUTOR_LOCK = threading.Lock()
+
+
+def _get_differential_executor() -> ProcessPoolExecutor:
+    """Returns the process pool used to compute differentials in parallel, creating it on
+    first use in this process.
+
+    The pool is long-lived, so that worker startup is only paid once, and uses the `spawn`
+    start method, as forking a multithreaded server process (with open database and SSH
+    connections) is unsafe.
+
+    """
+    global _DIFFERENTIAL_EXECUTOR, _DIFFERENTIAL_EXECUTOR_PID
+
+    with _DIFFERENTIAL_EXECUTOR_LOCK:
+        if _DIFFERENTIAL_EXECUTOR is None or _DIFFERENTIAL_EXECUTOR_PID != os.getpid():
+            _DIFFERENTIAL_EXECUTOR = ProcessPoolExecutor(
+                max_workers=min(os.cpu_count() or 1, DIFFERENTIAL_MAX_WORKERS),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _DIFFERENTIAL_EXECUTOR_PID = os.getpid()
+        return _DIFFERENTIAL_EXECUTOR
+
+
+def _reset_differential_executor() -> None:
+    global _DIFFERENTIAL_EXECUTOR
+
+    with _DIFFERENTIAL_EXECUTOR_LOCK:
+        if _DIFFERENTIAL_EXECUTOR is not None and _DIFFERENTIAL_EXECUTOR_PID == os.getpid():
+            _DIFFERENTIAL_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+        _DIFFERENTIAL_EXECUTOR = None
 
 
 def reduce_echem_cycle_sampling(df: pd.DataFrame, num_samples: int = 100) -> pd.DataFrame:
@@ -20,14 +109,134 @@ def reduce_echem_cycle_sampling(df: pd.DataFrame, num_samples: int = 100) -> pd.
     Returns:
         The output dataframe.
 
+    The strided indices of every half cycle are computed in a single vectorized pass
+    over the `"half cycle"` column, matching the output of applying
+    `pydatalab.utils.reduce_df_size` (with `endpoint=True`) to each half cycle in turn.
+
+    """
+
+    half_cycles = df["half cycle"].to_numpy()
+
+    # Stable sort of the rows by half cycle, dropping rows without a half cycle
+    # to match the behaviour of `df.groupby("half cycle")`
+    valid_rows = np.flatnonzero(~pd.isna(half_cycles))
+    order = valid_rows[np.argsort(half_cycles[valid_rows], kind="stable")]
+    if len(order) == 0:
+        return df.iloc[[]].copy()
+
+    sorted_half_cycles = half_cycles[order]
+    starts = np.flatnonzero(
+        np.concatenate(([True], sorted_half_cycles[1:] != sorted_half_cycles[:-1]))
+    )
+    sizes = np.diff(np.append(starts, len(order)))
+    strides = -(-sizes // num_samples)
+
+    # Each half cycle keeps its first point, every `stride`-th point before the final
+    # point, and the final point itself
+    counts = 2 + np.maximum(sizes - 2, 0) // strides
+    group_offsets = np.cumsum(counts) - counts
+    positions = np.arange(counts.sum()) - np.repeat(group_offsets, counts)
+    is_last = positions == np.repeat(counts - 1, counts)
+    positions = np.where(
+        is_last, np.repeat(sizes - 1, counts), positions * np.repeat(strides, counts)
+    )
+
+    return df.iloc[order[np.repeat(starts, counts) + positions]].copy()
+
+
+def _compute_half_cycle_differential(
+    cycle: int, y: np.ndarray, x: np.ndarray, smoothing_parameters: Dict[str, Any]
+) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Compute the differential for a single half cycle, returning the arrays
+    `(x, y', y)`, or `None` if the derivative could not be computed (e.g.,
+    for a rest or voltage hold).
+
+    """
+    try:
+        x, yp, y = ec.dqdv_single_cycle(y, x, **smoothing_parameters)
+    except TypeError as e:
+        LOGGER.debug(
+            f"""Calculating derivative of half_cycle {cycle} failed with the following error (likely it is a rest or voltage hold):
+             {e}
+            Skipping derivative calculation for this half cycle."""
+        )
+        return None
+
+    return np.asarray(x), np.asarray(yp), np.asarray(y)
+
+
+def _read_differential_cache(
+    cache_file: Path,
+) -> Dict[int, Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]]:
+    """Read previously computed differentials for each half cycle from the cache file."""
+    results: Dict[int, Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]] = {}
+    if not cache_file.exists():
+        return results
+
+    try:
+        with np.load(cache_file, allow_pickle=False) as cached:
+            for key in cached.files:
+                if key == "failed":
+                    results.update({int(cycle): None for cycle in cached[key]})
+                else:
+                    x, yp, y = cached[key].astype(np.float64)
+                    results[int(key)] = (x, yp, y)
+    except Exception as exc:
+        LOGGER.warning("Unable to read differential cache at %s: %s", cache_file, exc)
+        return {}
+
+    return results
+
+
+def _write_differential_cache(
+    cache_file: Path, results: Dict[int, Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]]
+) -> None:
+    """Atomically write the computed differentials for each half cycle to the cache file
+    (in full precision, such that cached results are identical to freshly computed ones),
+    removing the oldest cache files for the same source file beyond `DIFFERENTIAL_CACHE_MAX_ENTRIES`.
+
     """
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_name(f"{cache_file.name}.tmp-{os.getpid()}")
+    arrays = {
+        str(cycle): np.vstack(result).astype(np.float64)
+        for cycle, result in results.items()
+        if result is not None
+    }
+    arrays["failed"] = np.array([cycle for cycle, result in results.items() if result is None])
+    with open(tmp_file, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_file, cache_file)
+
+    cache_files = sorted(
+        cache_file.parent.glob("*.npz"), key=lambda f: f.stat().st_mtime, reverse=True
+    )
+    for stale_file in cache_files[DIFFERENTIAL_CACHE_MAX_ENTRIES:]:
+        stale_file.unlink(missing_ok=True)
+
+
+def compute_cycle_summary(raw_df: pd.DataFrame) -> pd.DataFrame:
+    """Compute per-cycle summary statistics from a full navani dataframe.
 
-    return_df = pd.DataFrame([])
+    Extends `navani.echem.cycle_summary` with the duration of each cycle, and
+    renames the retained columns following `CYCLE_SUMMARY_KEYS_WITH_UNITS`.
 
-    for _, half_cycle in df.groupby("half cycle"):
-        return_df = pd.concat([return_df, reduce_df_size(half_cycle, num_samples, endpoint=True)])
+    Args:
+        raw_df: The full parsed dataframe, as returned by navani (including the `"state"` column).
+
+    Returns:
+        A dataframe with one row per full cycle, indexed by `"full cycle"`.
 
-    return return_df
+    """
+    summary_df = ec.cycle_summary(raw_df)
+    if "Time" in raw_df:
+        time_by_cycle = raw_df.groupby("full cycle")["Time"]
+        summary_df["Duration"] = time_by_cycle.max() - time_by_cycle.min()
+
+    summary_df = summary_df.filter(CYCLE_SUMMARY_KEYS_WITH_UNITS.keys())
+    summary_df = summary_df.rename(columns=CYCLE_SUMMARY_KEYS_WITH_UNITS)
+    summary_df.index.name = "full cycle"
+    return summary_df
 
 
 def compute_gpcl_differential(
@@ -41,9 +250,14 @@ def compute_gpcl_differential(
     polyorder_1: int = 5,
     polyorder_2: int = 5,
     use_normalized_capacity: bool = False,
+    cache_dir: Optional[Union[str, Path]] = None,
+    cache_key: Optional[Dict[str, Any]] = None,
 ) -> pd.DataFrame:
     """Compute differential dQ/dV or dV/dQ for the input dataframe.
 
+    Each half cycle is processed independently; for large inputs, the half cycles
+    are distributed across a process pool.
+
     Args:
         df: The input dataframe containing the raw cycling data.
         mode: Either 'dQ/dV' or 'dV/dQ'. Invalid inputs will default to 'dQ/dV'.
@@ -54,6 +268,11 @@ def compute_gpcl_differential(
         window_size_2: The window size for the `savgol` filter when smoothing the final differential.
         polyorder_1: The polynomial order for the `savgol` filter when smoothing the capacity.
         polyorder_2: The polynomial order for the `savgol` filter when smoothing the final differential.
+        cache_dir: An optional directory in which to cache the differential of each half cycle.
+        cache_key: A JSON-serializable description of the input data (e.g., the source file
+            revision); caching is only used if this is provided alongside `cache_dir`.
+            Cached results are reused for any half cycles computed previously with the same
+            key and parameters, so changing the selected cycles only computes the new ones.
 
     Returns:
         A data frame containing the voltages, capacities and requested differential
@@ -85,47 +304,88 @@ def compute_gpcl_differential(
         "final_smooth": smoothing,
     }
 
-    differential_df = pd.DataFrame()
-
-    # Loop over distinct half cycles
-    for cycle in df["half cycle"].unique():
-        # Extract all segments corresponding to this half cycle index
-        df_cycle = df[df["half cycle"] == cycle]
-
-        # Compute the desired derivative
-        try:
-            x, yp, y = ec.dqdv_single_cycle(
-                df_cycle[y_label], df_cycle[x_label], **smoothing_parameters
-            )
-        except TypeError as e:
-            LOGGER.debug(
-                f"""Calculating derivative {mode} of half_cycle {cycle} failed with the following error (likely it is a rest or voltage hold):
-                 {e}
-                Skipping derivative calculation for this half cycle."""
+    # Precompute the row positions of each half cycle in a single pass, in order of appearance
+    half_cycle_rows = df.groupby("half cycle", sort=False).indices
+    y_values = df[y_label].to_numpy()
+    x_values = df[x_label].to_numpy()
+    full_cycles = df["full cycle"].to_numpy()
+
+    cache_file = None
+    results: Dict[int, Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]] = {}
+    if cache_dir is not None and cache_key is not None:
+        key = json.dumps(
+            {
+                "version": ECHEM_CACHE_VERSION,
+                "differential_version": DIFFERENTIAL_CACHE_VERSION,
+                "parser_version": _get_parser_version(),
+                "mode": yp_label,
+                "use_normalized_capacity": use_normalized_capacity,
+                "smoothing_parameters": smoothing_parameters,
+                **cache_key,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        cache_file = Path(cache_dir) / f"{hashlib.sha256(key.encode()).hexdigest()}.npz"
+        results = _read_differential_cache(cache_file)
+
+    pending = [int(cycle) for cycle in half_cycle_rows if int(cycle) not in results]
+
+    if pending:
+        jobs = [
+            (
+                cycle,
+                y_values[half_cycle_rows[cycle]],
+                x_values[half_cycle_rows[cycle]],
+                smoothing_parameters,
             )
+            for cycle in pending
+        ]
+        computed = None
+        if len(df) >= DIFFERENTIAL_PARALLEL_MIN_ROWS and len(pending) > 1:
+            try:
+                executor = _get_differential_executor()
+                computed = list(executor.map(_compute_half_cycle_differential, *zip(*jobs)))
+            except (OSError, BrokenProcessPool) as exc:
+                _reset_differential_executor()
+                LOGGER.warning(
+                    "Unable to compute differentials in parallel, falling back to serial: %s", exc
+                )
+
+        if computed is None:
+            computed = [_compute_half_cycle_differential(*job) for job in jobs]
+
+        results.update(zip(pending, computed))
+
+        if cache_file is not None:
+            try:
+                _write_differential_cache(cache_file, results)
+            except OSError as exc:
+                LOGGER.warning("Unable to write differential cache at %s: %s", cache_file, exc)
+
+    # Assemble all half cycles with a single concatenation
+    columns: Dict[str, List[np.ndarray]] = {
+        x_label: [],
+        y_label: [],
+        yp_label: [],
+        "full cycle": [],
+        "half cycle": [],
+    }
+    for cycle, rows in half_cycle_rows.items():
+        result = results.get(int(cycle))
+        if result is None:
             continue
+        x, yp, y = result
+        columns[x_label].append(x)
+        columns[y_label].append(y)
+        columns[yp_label].append(yp)
+        columns["full cycle"].append(np.full(len(x), int(full_cycles[rows].max()), dtype=int))
+        columns["half cycle"].append(np.full(len(x), int(cycle), dtype=int))
 
-        # Set up an array per cycle segment that stores the cycle and half-cycle index
-        cycle_index = df_cycle["full cycle"].max()
-        cycle_index_array = np.full(len(x), int(cycle_index), dtype=int)
-        half_cycle_index_array = np.full(len(x), int(cycle), dtype=int)
-
-        differential_df = pd.concat(
-            [
-                differential_df,
-                pd.DataFrame(
-                    {
-                        x_label: x,
-                        y_label: y,
-                        yp_label: yp,
-                        "full cycle": cycle_index_array,
-                        "half cycle": half_cycle_index_array,
-                    }
-                ),
-            ]
-        )
+    if not columns["half cycle"]:
+        return pd.DataFrame()
 
-    return differential_df
+    return pd.DataFrame({label: np.concatenate(arrays) for label, arrays in columns.items()})
 
 
 def filter_df_by_cycle_index(
@@ -146,28 +406,308 @@ def filter_df_by_cycle_index(
     if cycle_list is None:
         return df
 
-    cycle_list = sorted(i for i in cycle_list if i > 0)
-
     if "half cycle" not in df.columns:
         if "cycle index" not in df.columns:
             raise ValueError(
                 "Input dataframe must have either 'half cycle' or 'cycle index' column"
             )
 
+        cycle_list = sorted(i for i in cycle_list if i > 0)
         if len(cycle_list) == 1 and max(cycle_list) > df["cycle index"].max():
             cycle_list[0] = df["cycle index"].max()
         return df[df["cycle index"].isin(i for i in cycle_list)]
 
+    half_cycles = get_half_cycles_for_cycle_list(
+        cycle_list, df["half cycle"].min(), df["half cycle"].max()
+    )
+    return df[df["half cycle"].isin(half_cycles)]
+
+
+def get_half_cycles_for_cycle_list(
+    cycle_list: List[int], min_half_cycle: int, max_half_cycle: int
+) -> List[int]:
+    """Convert a list of (full) cycle indices into the corresponding half cycle indices.
+
+    If only a single cycle is requested that is beyond the end of the data,
+    the last full cycle will be used instead.
+
+    Args:
+        cycle_list: The full cycle indices to convert (non-positive values are ignored).
+        min_half_cycle: The smallest half cycle index present in the data.
+        max_half_cycle: The largest half cycle index present in the data.
+
+    Returns:
+        The list of half cycle indices.
+
+    """
+    cycle_list = sorted(i for i in cycle_list if i > 0)
     try:
-        if len(cycle_list) == 1 and 2 * max(cycle_list) > df["half cycle"].max():
-            cycle_list[0] = df["half cycle"].max() // 2
-        half_cycles = [
+        if len(cycle_list) == 1 and 2 * max(cycle_list) > max_half_cycle:
+            cycle_list[0] = max_half_cycle // 2
+        return [
             i
             for item in cycle_list
-            for i in [max((2 * int(item)) - 1, df["half cycle"].min()), 2 * int(item)]
+            for i in [max((2 * int(item)) - 1, min_half_cycle), 2 * int(item)]
         ]
     except ValueError as exc:
         raise ValueError(
             f"Unable to parse `cycle_list` as integers: {cycle_list}. Error: {exc}"
         ) from exc
-    return df[df["half cycle"].isin(half_cycles)]
+
+
+def _get_parser_version() -> str:
+    try:
+        return importlib.metadata.version("navani")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def _get_half_cycle_runs(half_cycles: np.ndarray, offset: int = 0) -> List[List[int]]:
+    """Returns the `[half cycle, start row, stop row]` of each contiguous run of half cycles."""
+    if not len(half_cycles):
+        return []
+    boundaries = np.flatnonzero(np.diff(half_cycles)) + 1
+    starts = np.concatenate(([0], boundaries))
+    stops = np.concatenate((boundaries, [len(half_cycles)]))
+    return [
+        [int(half_cycles[start]), int(start + offset), int(stop + offset)]
+        for start, stop in zip(starts, stops)
+    ]
+
+
+def _write_cache_metadata(cache_dir: Path, metadata: Dict[str, Any]) -> None:
+    tmp_file = cache_dir / f"metadata.json.tmp-{os.getpid()}"
+    with open(tmp_file, "w") as f:
+        json.dump(metadata, f)
+    os.replace(tmp_file, cache_dir / "metadata.json")
+
+
+def read_echem_cache_metadata(
+    cache_dir: Union[str, Path], source_revision: Optional[int] = None
+) -> Optional[Dict[str, Any]]:
+    """Returns the metadata of the cache in the given directory, or `None` if it is
+    missing or was written by a different cache or parser version.
+
+    Args:
+        cache_dir: The cache directory.
+        source_revision: If provided, also return `None` if the cache was not
+            written for this revision of the source file.
+
+    """
+    try:
+        with open(Path(cache_dir) / "metadata.json") as f:
+            metadata = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+    if (
+        metadata.get("version") != ECHEM_CACHE_VERSION
+        or metadata.get("parser_version") != _get_parser_version()
+        or (source_revision is not None and metadata.get("source_revision") != source_revision)
+    ):
+        LOGGER.debug("Discarding stale echem cache at %s", cache_dir)
+        return None
+
+    return metadata
+
+
+def write_echem_cache(
+    df: pd.DataFrame,
+    cache_dir: Union[str, Path],
+    columns: Sequence[str],
+    source_revision: Optional[int] = None,
+    incremental_state: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Write the chosen columns of a parsed echem dataframe to a columnar on-disk
+    cache, with one memory-mappable binary file per column.
+
+    Floating point columns are downcast to single precision (except for those
+    in `FULL_PRECISION_COLUMNS`) and integer columns to the smallest suitable type.
+    The row ranges of each contiguous run of half cycles are stored alongside the data
+    so that individual cycles can later be read without loading the whole file.
+
+    Args:
+        df: The parsed dataframe, as returned by navani.
+        cache_dir: The directory in which to store the cache (will be replaced if it exists).
+        columns: The columns to cache; any missing columns are ignored.
+        source_revision: The revision of the source file, used to invalidate the cache.
+        incremental_state: For append-only formats, the state required to continue
+            parsing the source file from where it was last read (see `append_echem_cache`).
+
+    """
+    cache_dir = Path(cache_dir)
+    tmp_dir = cache_dir.with_name(f"{cache_dir.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    stored_columns: Dict[str, Dict[str, str]] = {}
+    for ind, column in enumerate(c for c in columns if c in df.columns):
+        values = pd.to_numeric(df[column], errors="coerce")
+        if pd.api.types.is_float_dtype(values) and column not in FULL_PRECISION_COLUMNS:
+            values = values.astype(np.float32)
+        elif pd.api.types.is_integer_dtype(values):
+            values = pd.to_numeric(values, downcast="integer")
+        filename = f"column_{ind}.bin"
+        array = np.ascontiguousarray(values.to_numpy())
+        array.tofile(tmp_dir / filename)
+        stored_columns[column] = {"filename": filename, "dtype": array.dtype.str}
+
+    half_cycle_runs: List[List[int]] = []
+    half_cycle_range: List[int] = []
+    if "half cycle" in df.columns and len(df):
+        half_cycles = df["half cycle"].to_numpy()
+        half_cycle_runs = _get_half_cycle_runs(half_cycles)
+        half_cycle_range = [int(half_cycles.min()), int(half_cycles.max())]
+
+    metadata = {
+        "version": ECHEM_CACHE_VERSION,
+        "parser_version": _get_parser_version(),
+        "source_revision": source_revision,
+        "nrows": len(df),
+        "columns": stored_columns,
+        "half_cycle_runs": half_cycle_runs,
+        "half_cycle_range": half_cycle_range,
+        "incremental_state": incremental_state,
+    }
+    _write_cache_metadata(tmp_dir, metadata)
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(tmp_dir, cache_dir)
+
+
+def append_echem_cache(
+    df: pd.DataFrame,
+    cache_dir: Union[str, Path],
+    metadata: Dict[str, Any],
+    source_revision: Optional[int] = None,
+    incremental_state: Optional[Dict[str, Any]] = None,
+) -> bool:
+    """Append newly parsed rows to an existing cache written by `write_echem_cache`,
+    writing only the new data to disk.
+
+    The caller is responsible for preventing concurrent writes to the same cache.
+
+    Args:
+        df: The new rows, with the same columns as the cached data.
+        cache_dir: The cache directory.
+        metadata: The current cache metadata, as returned by `read_echem_cache_metadata`.
+        source_revision: The revision of the source file that the cache now represents.
+        incremental_state: The updated state for continuing to parse the source file.
+
+    Returns:
+        Whether the rows could be appended; if not (e.g., the new values do not fit
+        into the cached data types), the cache is left unchanged and should be rewritten.
+
+    """
+    cache_dir = Path(cache_dir)
+    nrows = metadata["nrows"]
+
+    new_arrays = {}
+    for column, info in metadata["columns"].items():
+        if column not in df.columns:
+            return False
+        dtype = np.dtype(info["dtype"])
+        values = pd.to_numeric(df[column], errors="coerce").to_numpy()
+        if np.issubdtype(dtype, np.integer):
+            if np.isnan(values.astype(float)).any():
+                return False
+            info_range = np.iinfo(dtype)
+            if len(values) and (values.min() < info_range.min or values.max() > info_range.max):
+                return False
+        new_arrays[info["filename"]] = np.ascontiguousarray(values.astype(dtype))
+
+    for filename, array in new_arrays.items():
+        with open(cache_dir / filename, "r+b") as f:
+            # Discard anything beyond the recorded rows, e.g., from an interrupted append
+            f.truncate(nrows * array.dtype.itemsize)
+            f.seek(0, os.SEEK_END)
+            array.tofile(f)
+
+    if "half cycle" in df.columns and len(df):
+        half_cycles = df["half cycle"].to_numpy()
+        runs = _get_half_cycle_runs(half_cycles, offset=nrows)
+        previous_runs = metadata["half_cycle_runs"]
+        if previous_runs and previous_runs[-1][0] == runs[0][0]:
+            previous_runs[-1][2] = runs.pop(0)[2]
+        metadata["half_cycle_runs"] = previous_runs + runs
+        previous_range = metadata["half_cycle_range"] or [half_cycles.min(), half_cycles.max()]
+        metadata["half_cycle_range"] = [
+            int(min(previous_range[0], half_cycles.min())),
+            int(max(previous_range[1], half_cycles.max())),
+        ]
+
+    metadata["nrows"] = nrows + len(df)
+    metadata["source_revision"] = source_revision
+    metadata["incremental_state"] = incremental_state
+    _write_cache_metadata(cache_dir, metadata)
+
+    return True
+
+
+def read_echem_cache(
+    cache_dir: Union[str, Path],
+    source_revision: Optional[int] = None,
+    cycle_list: Optional[List[int]] = None,
+    columns: Optional[Sequence[str]] = None,
+    half_cycles: Optional[Sequence[int]] = None,
+) -> Optional[pd.DataFrame]:
+    """Read a cache written by `write_echem_cache`, reading only the rows
+    corresponding to the requested cycles from disk.
+
+    Args:
+        cache_dir: The cache directory.
+        source_revision: The current revision of the source file; if this does not
+            match the cached revision, the cache is considered stale.
+        cycle_list: The full cycle indices to load (all cycles if `None`), following
+            the conventions of `filter_df_by_cycle_index`.
+        columns: The columns to load (all cached columns if `None`).
+        half_cycles: The half cycle indices to load, as an alternative to `cycle_list`.
+
+    Returns:
+        The cached dataframe, or `None` if the cache is missing, stale or was
+        written by a different cache or parser version.
+
+    """
+    cache_dir = Path(cache_dir)
+    metadata = read_echem_cache_metadata(cache_dir)
+    if metadata is None:
+        return None
+    if metadata.get("source_revision") != source_revision:
+        LOGGER.debug("Discarding stale echem cache at %s", cache_dir)
+        return None
+
+    nrows = metadata["nrows"]
+    arrays = {}
+    for column, info in metadata["columns"].items():
+        if columns is not None and column not in columns:
+            continue
+        dtype = np.dtype(info["dtype"])
+        if nrows:
+            arrays[column] = np.memmap(
+                cache_dir / info["filename"], dtype=dtype, mode="r", shape=(nrows,)
+            )
+        else:
+            arrays[column] = np.empty(0, dtype=dtype)
+
+    if cycle_list is not None and metadata["half_cycle_runs"]:
+        half_cycles = get_half_cycles_for_cycle_list(cycle_list, *metadata["half_cycle_range"])
+
+    row_slices = None
+    if half_cycles is not None and metadata["half_cycle_runs"]:
+        selected_half_cycles = set(half_cycles)
+        row_slices = [
+            slice(start, stop)
+            for half_cycle, start, stop in metadata["half_cycle_runs"]
+            if half_cycle in selected_half_cycles
+        ]
+
+    data = {}
+    for column, array in arrays.items():
+        if row_slices is None:
+            data[column] = np.array(array)
+        elif row_slices:
+            data[column] = np.concatenate([array[s] for s in row_slices])
+        else:
+            data[column] = np.array(array[:0])
+
+    return pd.DataFrame(data)
@@ -1,3 +1,4 @@
+import hashlib
 import os
 from pathlib import Path
 
@@ -43,7 +44,7 @@ class EchemSumBlock(DataBlock):
         doc = flask_mongo.db.items.find_one(
             {"item_id": negative_electrode_id}, {"synthesis_description": 1}
         )
-        synthesis_description = doc.get("synthesis_description", None)
+        synthesis_description = (doc or {}).get("synthesis_description", None)
         return synthesis_description
     
     def _extract_synth_table(self, synthesis_description):
@@ -56,7 +57,25 @@ class EchemSumBlock(DataBlock):
             return None
         synth_table = pd.read_html(StringIO(synthesis_description), header=0)[0]
         return synth_table
-    
+
+    def _render_cache_extras(self):
+        # The summary table includes the synthesis table of the negative electrode item
+        doc = flask_mongo.db.items.find_one(
+            {"item_id": self.data["item_id"]}, {"negative_electrode": 1}
+        )
+        negative_electrode = (doc or {}).get("negative_electrode") or []
+        negative_electrode_id = (
+            negative_electrode[0].get("item", {}).get("item_id") if negative_electrode else None
+        )
+        synthesis_description = None
+        if negative_electrode_id is not None:
+            synthesis_description = self._get_synth_description(negative_electrode_id)
+        return {
+            "negative_electrode_id": negative_electrode_id,
+            "synthesis_description_sha256": hashlib.sha256(
+                (synthesis_description or "").encode("utf-8")
+            ).hexdigest(),
+        }
 
     @property
     def plot_functions(self):
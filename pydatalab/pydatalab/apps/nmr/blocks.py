@@ -20,6 +20,7 @@ class NMRBlock(DataBlock):
     accepted_file_extensions = (".zip",)
     defaults = {"process number": 1}
     _supports_collections = False
+    _render_in_background = True
 
     @property
     def plot_functions(self):
@@ -104,6 +105,7 @@ class NMRBlock(DataBlock):
             ],
             plot_line=True,
             point_size=3,
+            **self._get_downsampling_options(),
         )
         # flip x axis, per NMR convention. Note that the figure is the second element
         # of the layout in the current implementation, but this could be fragile.
@@ -180,6 +180,7 @@ class RamanBlock(DataBlock):
                 plot_line=True,
                 plot_points=True,
                 point_size=3,
+                **self._get_downsampling_options(),
             )
 
             self.data["bokeh_plot_data"] = bokeh.embed.json_item(p, theme=DATALAB_BOKEH_THEME)
@@ -82,6 +82,7 @@ class MassSpecBlock(DataBlock):
                         plot_title=f"Channel name: {species}",
                         plot_index=ind,
                         aspect_ratio=1.5,
+                        **self._get_downsampling_options(),
                     )
                 )
 
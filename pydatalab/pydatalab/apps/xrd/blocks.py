@@ -8,7 +8,7 @@ from scipy.signal import medfilt
 
 from pydatalab.blocks.base import DataBlock
 from pydatalab.bokeh_plots import DATALAB_BOKEH_THEME, selectable_axes_plot
-from pydatalab.file_utils import get_file_info_by_id
+from pydatalab.file_utils import get_file_info_by_id, get_files_info_by_id
 from pydatalab.logger import LOGGER
 from pydatalab.mongo import flask_mongo
 
@@ -104,10 +104,7 @@ class XRDBlock(DataBlock):
 
             all_files = [
                 d
-                for d in [
-                    get_file_info_by_id(f, update_if_live=False)
-                    for f in item_info["file_ObjectIds"]
-                ]
+                for d in get_files_info_by_id(item_info["file_ObjectIds"], update_if_live=True)
                 if any(d["name"].lower().endswith(ext) for ext in self.accepted_file_extensions)
             ]
 
@@ -152,6 +149,7 @@ class XRDBlock(DataBlock):
                 plot_line=True,
                 plot_points=True,
                 point_size=3,
+                **self._get_downsampling_options(),
             )
 
             self.data["bokeh_plot_data"] = bokeh.embed.json_item(p, theme=DATALAB_BOKEH_THEME)
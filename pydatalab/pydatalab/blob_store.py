@@ -0,0 +1,226 @@
+"""This module implements a content-addressed store for the contents of files in
+`CONFIG.FILE_DIRECTORY`, such that identical files (e.g., the same raw data
+uploaded to many items, or re-synced unchanged from a remote) are only stored once.
+
+The contents of each file are stored as a read-only blob named after their
+SHA-256 hash, in hash-sharded directories under `CONFIG.FILE_DIRECTORY/.blobs`
+(e.g., `.blobs/ab/cd/abcd...`). Each file keeps its own path in the file store
+(i.e., `File.location`, as `<file_id>/<filename>`), as the blocks that parse a file
+rely on its extension and on writing caches alongside it; this path is
+materialized as a hard link to the shared blob (or a reflink/copy, where hard
+links are unavailable), so that it resolves to the same data on disk.
+
+Blobs are reference-counted by the `sha256` of the documents in the `files`
+collection. As the per-file paths are links, files must never be modified in
+place: new revisions are written to a new inode and deduplicated again (see
+`revision_path`), after which the blob of the previous revision is removed if it
+is no longer used (see `release_blob`). Any other blobs that are no longer
+referenced by any file are removed by `collect_garbage` (or the
+`admin.collect-garbage-blobs` task).
+
+"""
+
+import os
+import pathlib
+import shutil
+import stat
+from typing import Optional, Tuple, Union
+
+import pymongo.database
+
+from pydatalab.config import CONFIG
+from pydatalab.logger import LOGGER
+from pydatalab.mongo import flask_mongo
+
+__all__ = (
+    "BLOB_DIRECTORY_NAME",
+    "blob_path",
+    "deduplicate_file",
+    "revision_path",
+    "count_blob_references",
+    "release_blob",
+    "collect_garbage",
+)
+
+BLOB_DIRECTORY_NAME = ".blobs"
+
+_FICLONE = 0x40049409
+"""The Linux `ioctl` request number for cloning a file (i.e., a copy-on-write reflink)."""
+
+_READ_ONLY = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+
+
+def _blob_directory() -> pathlib.Path:
+    return pathlib.Path(CONFIG.FILE_DIRECTORY) / BLOB_DIRECTORY_NAME
+
+
+def blob_path(sha256: str) -> pathlib.Path:
+    """Returns the location of the blob with the given SHA-256 hex digest."""
+    return _blob_directory() / sha256[:2] / sha256[2:4] / sha256
+
+
+def _reflink(source: pathlib.Path, destination: pathlib.Path) -> None:
+    import fcntl
+
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+
+
+def _materialize(blob: pathlib.Path, destination: pathlib.Path) -> None:
+    """Create `destination` with the contents of `blob`, as a hard link if possible,
+    otherwise as a reflink (on filesystems that support them) or a full copy.
+
+    """
+    try:
+        os.link(blob, destination)
+        return
+    except OSError as exc:
+        LOGGER.debug("Unable to hard link %s to %s: %s", destination, blob, exc)
+
+    try:
+        _reflink(blob, destination)
+        return
+    except (ImportError, OSError):
+        destination.unlink(missing_ok=True)
+
+    shutil.copyfile(blob, destination)
+
+
+def deduplicate_file(location: Union[str, pathlib.Path], sha256: str) -> pathlib.Path:
+    """Store the contents of the file at `location` in the blob store, replacing the
+    file with a link to the existing blob if its contents have been stored before.
+
+    Parameters:
+        location: The path of a file in the file store.
+        sha256: The SHA-256 hex digest of the contents of the file.
+
+    Returns:
+        The location of the blob.
+
+    """
+    location = pathlib.Path(location)
+    blob = blob_path(sha256)
+
+    if not blob.exists():
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            # The first copy of the contents becomes the blob itself
+            os.link(location, blob)
+        except FileExistsError:
+            # Stored concurrently by another request
+            pass
+        except OSError as exc:
+            LOGGER.warning("Unable to add %s to the blob store: %s", location, exc)
+            return location
+        else:
+            os.chmod(blob, _READ_ONLY)
+            return blob
+
+    if os.path.samefile(blob, location):
+        return blob
+
+    temporary = location.with_name(f".{location.name}.dedup")
+    try:
+        _materialize(blob, temporary)
+        os.replace(temporary, location)
+    except OSError as exc:
+        temporary.unlink(missing_ok=True)
+        LOGGER.warning("Unable to link %s to blob %s: %s", location, blob, exc)
+        return location
+
+    return blob
+
+
+def revision_path(location: Union[str, pathlib.Path]) -> pathlib.Path:
+    """Returns a temporary path alongside `location` to write a new revision of the file to,
+    which should then be moved into place with `os.replace`, such that the blob shared
+    with other files is never modified in place.
+
+    """
+    location = pathlib.Path(location)
+    return location.with_name(f".{location.name}.partial")
+
+
+def count_blob_references(sha256: str, database: Optional[pymongo.database.Database] = None) -> int:
+    """Returns the number of files whose contents are stored in the given blob."""
+    if database is None:
+        database = flask_mongo.db
+    return database.files.count_documents({"sha256": sha256})
+
+
+def release_blob(sha256: str, database: Optional[pymongo.database.Database] = None) -> bool:
+    """Remove the blob with the given hash if it is no longer used, e.g., once the file
+    that held a previous revision has been replaced by a new one, such that repeatedly
+    updated files (e.g., synced live files) do not leave a full copy behind per revision.
+
+    The blob is kept if any file in the database still references its hash, or if it
+    is still linked from elsewhere in the file store.
+
+    Returns:
+        Whether the blob was removed.
+
+    """
+    blob = blob_path(sha256)
+    try:
+        if blob.stat().st_nlink > 1 or count_blob_references(sha256, database=database):
+            return False
+        blob.unlink()
+    except FileNotFoundError:
+        return False
+    except OSError as exc:
+        LOGGER.warning("Unable to remove unused blob %s: %s", blob, exc)
+        return False
+
+    LOGGER.debug("Removed unused blob %s", blob)
+    return True
+
+
+def collect_garbage(
+    database: Optional[pymongo.database.Database] = None, dry_run: bool = False
+) -> Tuple[int, int]:
+    """Remove all blobs that are no longer referenced by any file, e.g., after
+    the files have been deleted or replaced by new revisions.
+
+    Blobs that are still linked from elsewhere in the file store (e.g., by a file
+    whose database entry is being written concurrently) are kept.
+
+    Parameters:
+        database: The database to use, defaulting to the Flask app's database.
+        dry_run: If true, only report the blobs that would be removed.
+
+    Returns:
+        The number of removed blobs and the number of bytes freed.
+
+    """
+    if database is None:
+        database = flask_mongo.db
+
+    directory = _blob_directory()
+    if not directory.is_dir():
+        return 0, 0
+
+    referenced = set(database.files.distinct("sha256", {"sha256": {"$ne": None}}))
+
+    removed = 0
+    freed = 0
+    for blob in directory.glob("*/*/*"):
+        if blob.name in referenced or not blob.is_file():
+            continue
+        stat_result = blob.stat()
+        if stat_result.st_nlink > 1:
+            continue
+        LOGGER.debug("Removing unreferenced blob %s", blob)
+        if not dry_run:
+            blob.unlink()
+        removed += 1
+        freed += stat_result.st_size
+
+    if not dry_run:
+        for shard in sorted(directory.glob("*/*"), reverse=True) + sorted(directory.glob("*")):
+            try:
+                shard.rmdir()
+            except OSError:
+                pass
+
+    LOGGER.info("Removed %s unreferenced blobs (%s bytes)", removed, freed)
+    return removed, freed
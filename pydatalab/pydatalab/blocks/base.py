@@ -1,10 +1,18 @@
+import copy
 import random
 import warnings
 from typing import Any, Callable, Dict, Optional, Sequence
 
 from bson import ObjectId
 
+from pydatalab.blocks.render_cache import (
+    RENDER_CACHE_EXCLUDED_KEYS,
+    get_cached_render,
+    get_render_cache_key,
+    save_render_to_cache,
+)
 from pydatalab.logger import LOGGER
+from pydatalab.utils import DOWNSAMPLING_METHODS
 
 __all__ = ("generate_random_id", "DataBlock")
 
@@ -59,6 +67,13 @@ class DataBlock:
     _supports_collections: bool = False
     """Whether this datablock can operate on collection data, or just individual items"""
 
+    _render_cacheable: bool = True
+    """Whether the rendered output of this block can be cached, provided it is attached to a file."""
+
+    _render_in_background: bool = False
+    """Whether this block is expensive enough to render that it should be deferred to a
+    background job, when enabled (see `pydatalab.blocks.jobs`)."""
+
     def __init__(
         self,
         item_id: Optional[str] = None,
@@ -129,6 +144,8 @@ class DataBlock:
         if "bokeh_plot_data" in self.data:
             self.data.pop("bokeh_plot_data")
 
+        self.data.pop("render_job", None)
+
         if "file_id" in self.data:
             dict_for_db = self.data.copy()  # gross, I know
             dict_for_db["file_id"] = ObjectId(dict_for_db["file_id"])
@@ -143,7 +160,8 @@ class DataBlock:
         new_block = cls(
             item_id=db_entry.get("item_id"),
             collection_id=db_entry.get("collection_id"),
-            dictionary=db_entry,
+            init_data=db_entry,
+            unique_id=db_entry.get("block_id"),
         )
         if "file_id" in new_block.data:
             new_block.data["file_id"] = str(new_block.data["file_id"])
@@ -153,12 +171,71 @@ class DataBlock:
 
         return new_block
 
-    def to_web(self) -> Dict[str, Any]:
-        """Returns a JSON serializable dictionary to render the data block on the web."""
+    def _get_downsampling_options(self) -> Dict[str, Any]:
+        """Returns the plot downsampling options (`downsample_method` and `max_points`)
+        set in the block data, in the form accepted by the plotting functions in
+        `pydatalab.bokeh_plots`. Invalid values are ignored with a warning.
+
+        """
+        method = self.data.get("downsample_method")
+        if method is not None and method not in DOWNSAMPLING_METHODS:
+            LOGGER.warning(
+                "Invalid downsample_method provided: %s. Expected one of %s. Falling back to `None`.",
+                method,
+                DOWNSAMPLING_METHODS,
+            )
+            method = None
+
+        max_points = self.data.get("max_points")
+        try:
+            max_points = int(max_points) if max_points is not None else None
+        except (TypeError, ValueError):
+            max_points = None
+        if max_points is not None and max_points < 3:
+            LOGGER.warning("Invalid max_points provided: %s. Falling back to `None`.", max_points)
+            max_points = None
+
+        return {"downsample_method": method, "max_points": max_points}
+
+    def _render_cache_extras(self) -> Dict[str, Any]:
+        """Returns any additional data, beyond the block data and the attached file,
+        that the rendered output of this block depends on, to be included in the
+        render cache key.
+        """
+        return {}
+
+    def to_web(self, progress_callback: Optional[Callable[[float], None]] = None) -> Dict[str, Any]:
+        """Returns a JSON serializable dictionary to render the data block on the web.
+
+        If the block has previously been rendered with the same parameters and
+        the same revision of its attached file, the cached output will be used
+        rather than calling the plot functions again.
+
+        Parameters:
+            progress_callback: An optional function that will be called with the
+                fraction of plot functions completed after each one has run.
+
+        """
         block_errors = []
         block_warnings = []
+
+        cache_key = None
         if self.plot_functions:
-            for plot in self.plot_functions:
+            cache_key = get_render_cache_key(self)
+            if cache_key is not None:
+                cached_outputs = get_cached_render(cache_key)
+                if cached_outputs is not None:
+                    LOGGER.debug("Render cache hit for block %s", self.block_id)
+                    self.data.pop("errors", None)
+                    self.data.pop("warnings", None)
+                    self.data.update(cached_outputs)
+                    return self.data
+
+                inputs = copy.deepcopy(
+                    {k: v for k, v in self.data.items() if k not in RENDER_CACHE_EXCLUDED_KEYS}
+                )
+
+            for index, plot in enumerate(self.plot_functions):
                 with warnings.catch_warnings(record=True) as captured_warnings:
                     try:
                         plot()
@@ -175,6 +252,8 @@ class DataBlock:
                                     for w in captured_warnings
                                 ]
                             )
+                if progress_callback is not None:
+                    progress_callback((index + 1) / len(self.plot_functions))
 
         # If the last plotting run did not raise any errors or warnings, remove any old ones
         if block_errors:
@@ -186,6 +265,11 @@ class DataBlock:
         else:
             self.data.pop("warnings", None)
 
+        # Only cache successful renders, so that transient errors are retried
+        if cache_key is not None and not block_errors:
+            outputs = {k: v for k, v in self.data.items() if k not in inputs or inputs[k] != v}
+            save_render_to_cache(cache_key, self, outputs)
+
         return self.data
 
     @classmethod
@@ -0,0 +1,423 @@
+"""This submodule implements a job queue for rendering expensive data blocks
+(e.g., those attached to large echem or NMR files) in the background, such that
+web requests can return immediately rather than blocking a server worker until
+the plots have been generated.
+
+Jobs are stored in the `jobs` collection, which acts as the queue (no external
+broker is required), and are executed by a local pool of worker processes. Each
+job document records the block data to render, its status and progress, and,
+once finished, the rendered block data.
+
+"""
+
+import datetime
+import multiprocessing
+import signal
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Any, Dict, Optional, Union
+
+import bson
+import pymongo
+from bson import ObjectId
+from flask import Flask
+from flask_login import current_user
+
+from pydatalab.config import CONFIG
+from pydatalab.logger import LOGGER
+from pydatalab.mongo import flask_mongo
+
+if TYPE_CHECKING:
+    from pydatalab.blocks.base import DataBlock
+
+__all__ = (
+    "JOB_COLLECTION",
+    "JobStatus",
+    "should_render_in_background",
+    "submit_render_job",
+    "defer_render",
+    "run_render_job",
+    "get_job",
+    "get_stale_render",
+)
+
+JOB_COLLECTION = "jobs"
+
+JOB_RETENTION_SECONDS = 24 * 60 * 60
+"""How long finished jobs are kept in the database before they are expired."""
+
+
+class JobStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCESS = "success"
+    ERROR = "error"
+    TIMEOUT = "timeout"
+
+    PENDING = (QUEUED, RUNNING)
+
+
+_EXECUTOR: Optional[ProcessPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+_WORKER_APP: Optional[Flask] = None
+"""The minimal Flask app used to provide a database connection and request
+context inside each worker process."""
+
+
+_TIMED_OUT = threading.Event()
+"""Set inside a worker process when the current render job exceeds its time limit,
+as the resulting exception may be caught and reported by the block itself."""
+
+
+class RenderJobTimeout(TimeoutError):
+    """Raised inside a worker process when a render job exceeds its time limit."""
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(tz=datetime.timezone.utc)
+
+
+def _get_timeout(blocktype: str) -> float:
+    return CONFIG.RENDER_JOB_TIMEOUTS.get(blocktype, CONFIG.RENDER_JOB_DEFAULT_TIMEOUT)
+
+
+def should_render_in_background(block: "DataBlock") -> bool:
+    """Returns whether the given block should be rendered by a background job,
+    i.e., background rendering is enabled, the block type is expensive to render
+    and there is no cached render available for its current state.
+
+    """
+    from pydatalab.blocks.render_cache import get_render_cache_key, has_cached_render
+
+    if not CONFIG.RENDER_JOBS_ENABLED or not block._render_in_background:
+        return False
+
+    if not block.plot_functions or not block.data.get("file_id"):
+        return False
+
+    cache_key = get_render_cache_key(block)
+    return cache_key is None or not has_cached_render(cache_key)
+
+
+def _init_worker(config: Dict[str, Any]) -> None:
+    """Initialise a worker process with the server config and a minimal Flask app."""
+    global _WORKER_APP
+
+    from pydatalab.login import LOGIN_MANAGER
+
+    CONFIG.update(config)
+
+    app = Flask(__name__)
+    app.config.update(CONFIG.dict())
+    flask_mongo.init_app(app)
+    LOGIN_MANAGER.init_app(app)
+    _WORKER_APP = app
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _EXECUTOR
+
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ProcessPoolExecutor(
+                max_workers=CONFIG.RENDER_JOB_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(CONFIG.dict(),),
+            )
+        return _EXECUTOR
+
+
+def _reset_executor() -> None:
+    global _EXECUTOR
+
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is not None:
+            _EXECUTOR.shutdown(wait=False, cancel_futures=True)
+        _EXECUTOR = None
+
+
+def _handle_job_done(job_id: ObjectId, future: Future) -> None:
+    """Marks a job as failed if its worker process exited without updating it,
+    e.g., if it was killed or the pool was broken.
+
+    """
+    exc = future.exception()
+    if exc is None:
+        return
+
+    LOGGER.error("Render job %s failed in worker process: %s", job_id, exc)
+    try:
+        flask_mongo.db[JOB_COLLECTION].update_one(
+            {"_id": job_id, "status": {"$in": JobStatus.PENDING}},
+            {"$set": {"status": JobStatus.ERROR, "error": str(exc), "finished_at": _now()}},
+        )
+    except pymongo.errors.PyMongoError as db_exc:
+        LOGGER.warning("Unable to mark render job %s as failed: %s", job_id, db_exc)
+
+    if isinstance(exc, BrokenProcessPool):
+        _reset_executor()
+
+
+def submit_render_job(block: "DataBlock", save_to_db: bool = False) -> Optional[Dict[str, Any]]:
+    """Queue the given block to be rendered in the background.
+
+    If an identical job is already pending for this block, it will be returned
+    instead of queueing a new one.
+
+    Parameters:
+        block: The block to render.
+        save_to_db: Whether to save the rendered block to its item or collection
+            once the job has finished.
+
+    Returns:
+        The job document, or `None` if the job could not be queued (e.g., the queue
+        is full), in which case the block should be rendered synchronously.
+
+    """
+    collection = flask_mongo.db[JOB_COLLECTION]
+    block_data = {k: v for k, v in block.data.items() if k not in ("bokeh_plot_data", "render_job")}
+
+    existing_job = collection.find_one(
+        {
+            "block_id": block.block_id,
+            "block_data": block_data,
+            "status": {"$in": JobStatus.PENDING},
+        }
+    )
+    if existing_job is not None:
+        return existing_job
+
+    if collection.count_documents({"status": {"$in": JobStatus.PENDING}}) >= (
+        CONFIG.RENDER_JOB_MAX_PENDING
+    ):
+        LOGGER.warning("Render job queue is full, rendering block %s synchronously", block.block_id)
+        return None
+
+    user_id = None
+    creator_ids = []
+    if current_user and current_user.is_authenticated:
+        user_id = current_user.id
+        creator_ids = [current_user.person.immutable_id]
+
+    job = {
+        "_id": ObjectId(),
+        "type": "render",
+        "blocktype": block.blocktype,
+        "block_id": block.block_id,
+        "item_id": block.data.get("item_id"),
+        "collection_id": block.data.get("collection_id"),
+        "block_data": block_data,
+        "save_to_db": save_to_db,
+        "user_id": user_id,
+        "creator_ids": creator_ids,
+        "status": JobStatus.QUEUED,
+        "progress": 0.0,
+        "timeout": _get_timeout(block.blocktype),
+        "created_at": _now(),
+    }
+
+    try:
+        collection.insert_one(job)
+    except bson.errors.InvalidDocument as exc:
+        LOGGER.warning("Unable to queue render job for block %s: %s", block.block_id, exc)
+        return None
+
+    if CONFIG.RENDER_JOB_WORKERS > 0:
+        try:
+            future = _get_executor().submit(_run_render_job_in_worker, str(job["_id"]))
+        except (BrokenProcessPool, RuntimeError) as exc:
+            # The pool may have been broken by a crashed worker, so try again with a new one
+            LOGGER.warning("Restarting render job pool after error: %s", exc)
+            _reset_executor()
+            future = _get_executor().submit(_run_render_job_in_worker, str(job["_id"]))
+        future.add_done_callback(lambda f: _handle_job_done(job["_id"], f))
+    else:
+        run_render_job(job["_id"])
+
+    return collection.find_one({"_id": job["_id"]})
+
+
+def defer_render(block: "DataBlock", save_to_db: bool = False) -> Optional[Dict[str, Any]]:
+    """Queue a background render job for the block, if appropriate, and return
+    the block data to send in place of the rendered block.
+
+    The returned block data includes the plot from the most recent successful
+    render of the block (if any), and a `render_job` entry describing the job,
+    which can be polled via the `/jobs/<job_id>` endpoint.
+
+    Parameters:
+        block: The block to render.
+        save_to_db: Whether to save the rendered block once the job has finished.
+
+    Returns:
+        The block data to return, or `None` if the block should be rendered synchronously.
+
+    """
+    if not should_render_in_background(block):
+        return None
+
+    job = submit_render_job(block, save_to_db=save_to_db)
+    if job is None:
+        return None
+
+    if job["status"] == JobStatus.SUCCESS and job.get("result"):
+        # The job has already finished, e.g., if running jobs synchronously
+        block_data = job["result"]
+    else:
+        block_data = block.data
+        stale_render = get_stale_render(block.block_id)
+        if stale_render and stale_render.get("bokeh_plot_data"):
+            block_data["bokeh_plot_data"] = stale_render["bokeh_plot_data"]
+
+    block_data["render_job"] = {
+        "job_id": str(job["_id"]),
+        "status": job["status"],
+        "progress": job.get("progress"),
+    }
+    return block_data
+
+
+def _run_render_job_in_worker(job_id: str) -> None:
+    """The entrypoint for render jobs in worker processes, which runs the job
+    within a request context for the submitting user, with its configured timeout.
+
+    """
+    from flask_login import login_user
+
+    from pydatalab.login import get_by_id
+
+    if _WORKER_APP is None:
+        raise RuntimeError("Render job worker process has not been initialised")
+
+    with _WORKER_APP.test_request_context():
+        job = flask_mongo.db[JOB_COLLECTION].find_one(
+            {"_id": ObjectId(job_id)}, projection={"user_id": 1, "timeout": 1}
+        )
+        if job is None:
+            return
+
+        if job.get("user_id"):
+            user = get_by_id(job["user_id"])
+            if user is not None:
+                login_user(user)
+
+        def _raise_timeout(signum, frame):
+            _TIMED_OUT.set()
+            raise RenderJobTimeout(f"Rendering took longer than {job['timeout']} seconds")
+
+        _TIMED_OUT.clear()
+        previous_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, job["timeout"])
+        try:
+            run_render_job(job["_id"])
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_handler)
+
+
+def run_render_job(job_id: Union[str, ObjectId]) -> None:
+    """Claim and run the given render job, writing the results back to the job
+    document (and the block's item or collection, if requested).
+
+    Must be called within a request context.
+
+    """
+    from pydatalab.blocks import BLOCK_TYPES
+    from pydatalab.routes.v0_1.blocks import _save_block_to_db
+
+    collection = flask_mongo.db[JOB_COLLECTION]
+    job = collection.find_one_and_update(
+        {"_id": ObjectId(job_id), "status": JobStatus.QUEUED},
+        {"$set": {"status": JobStatus.RUNNING, "started_at": _now()}},
+        return_document=pymongo.ReturnDocument.AFTER,
+    )
+    if job is None:
+        # Already claimed by another worker
+        return
+
+    def _update_progress(progress: float) -> None:
+        collection.update_one({"_id": job["_id"]}, {"$set": {"progress": progress}})
+
+    status = JobStatus.SUCCESS
+    error = None
+    result = None
+    try:
+        block = BLOCK_TYPES.get(job["blocktype"], BLOCK_TYPES["notsupported"]).from_web(
+            job["block_data"]
+        )
+        # Copy the outputs, as saving the block will remove the plot data
+        result = dict(block.to_web(progress_callback=_update_progress))
+        if _TIMED_OUT.is_set():
+            status = JobStatus.TIMEOUT
+            error = f"Rendering took longer than {job['timeout']} seconds"
+        elif job.get("save_to_db") and not _save_block_to_db(block):
+            status = JobStatus.ERROR
+            error = "Unable to save rendered block to the database"
+    except RenderJobTimeout as exc:
+        status = JobStatus.TIMEOUT
+        error = str(exc)
+    except Exception as exc:
+        LOGGER.warning("Render job %s failed: %s", job["_id"], exc)
+        status = JobStatus.ERROR
+        error = str(exc)
+
+    update = {
+        "status": status,
+        "error": error,
+        "result": result,
+        "progress": 1.0,
+        "finished_at": _now(),
+    }
+    try:
+        collection.update_one({"_id": job["_id"]}, {"$set": update})
+    except (bson.errors.InvalidDocument, pymongo.errors.DocumentTooLarge) as exc:
+        LOGGER.warning("Unable to store result of render job %s: %s", job["_id"], exc)
+        update["result"] = None
+        collection.update_one({"_id": job["_id"]}, {"$set": update})
+
+
+def get_job(job_id: Union[str, ObjectId]) -> Optional[Dict[str, Any]]:
+    """Returns the job with the given ID, if it is accessible to the current user,
+    marking it as timed out if it has been running for longer than its time limit
+    (e.g., if the server restarted while it was running).
+
+    """
+    from pydatalab.permissions import get_default_permissions
+
+    collection = flask_mongo.db[JOB_COLLECTION]
+    job = collection.find_one(
+        {"_id": ObjectId(job_id), **get_default_permissions(user_only=False)},
+        projection={"user_id": 0},
+    )
+    if job is None or job["status"] != JobStatus.RUNNING or not job.get("started_at"):
+        return job
+
+    started_at = job["started_at"]
+    if started_at.tzinfo is None:
+        started_at = started_at.replace(tzinfo=datetime.timezone.utc)
+
+    # Allow some leeway for the worker to record the timeout itself
+    if _now() - started_at > datetime.timedelta(seconds=2 * job["timeout"]):
+        collection.update_one(
+            {"_id": job["_id"], "status": JobStatus.RUNNING},
+            {"$set": {"status": JobStatus.TIMEOUT, "finished_at": _now()}},
+        )
+        job["status"] = JobStatus.TIMEOUT
+
+    return job
+
+
+def get_stale_render(block_id: str) -> Optional[Dict[str, Any]]:
+    """Returns the rendered block data from the most recent successful render job
+    for the given block, to display while a new render is pending.
+
+    """
+    job = flask_mongo.db[JOB_COLLECTION].find_one(
+        {"block_id": block_id, "status": JobStatus.SUCCESS, "result": {"$ne": None}},
+        projection={"result": 1},
+        sort=[("finished_at", pymongo.DESCENDING)],
+    )
+    return job["result"] if job else None
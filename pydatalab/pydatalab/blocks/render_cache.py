@@ -0,0 +1,316 @@
+"""This submodule implements a content-addressed cache for the rendered output
+of data blocks (e.g., serialized Bokeh plots), such that blocks attached to
+unchanged files do not need to be re-parsed and re-plotted on every page load.
+
+Cache entries are stored in the `block_render_cache` collection, keyed on a hash
+of the block type, the block's input parameters, the revision of the underlying
+file and the server version. The total size of the cache is tracked in the
+`block_render_cache_totals` collection, and the least recently used entries are
+evicted whenever it exceeds `CONFIG.RENDER_CACHE_MAX_SIZE_BYTES`.
+
+"""
+
+import datetime
+import hashlib
+import json
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional, Union
+
+import bson
+import pymongo
+from bson import ObjectId
+
+from pydatalab import __version__
+from pydatalab.config import CONFIG
+from pydatalab.logger import LOGGER
+from pydatalab.mongo import flask_mongo
+from pydatalab.utils import CustomJSONEncoder
+
+if TYPE_CHECKING:
+    from pydatalab.blocks.base import DataBlock
+
+__all__ = (
+    "RENDER_CACHE_STATS",
+    "get_render_cache_key",
+    "get_cached_render",
+    "has_cached_render",
+    "save_render_to_cache",
+    "invalidate_render_cache",
+)
+
+RENDER_CACHE_COLLECTION = "block_render_cache"
+
+RENDER_CACHE_TOTALS_COLLECTION = "block_render_cache_totals"
+"""A collection holding the running total size of the render cache, such that it
+does not need to be recomputed on every write."""
+
+_TOTAL_SIZE_ID = "total"
+
+RENDER_CACHE_EXCLUDED_KEYS = ("bokeh_plot_data", "errors", "warnings", "render_job")
+"""Block data keys that are outputs of rendering and should not contribute to the cache key."""
+
+RENDER_CACHE_STATS: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+"""Process-local counters describing the usage of the render cache."""
+
+_STATS_LOCK = threading.Lock()
+
+
+def _increment_stat(name: str, value: int = 1) -> None:
+    with _STATS_LOCK:
+        RENDER_CACHE_STATS[name] += value
+
+
+def get_render_cache_key(block: "DataBlock") -> Optional[str]:
+    """Compute the cache key for the current state of the given block.
+
+    Only blocks that are attached to a (non-live) file are cached, as the file
+    revision is used to decide whether the underlying data has changed.
+
+    Parameters:
+        block: The block to compute the key for.
+
+    Returns:
+        The hex digest of the cache key, or `None` if the block should not be cached.
+
+    """
+    from pydatalab.permissions import get_default_permissions
+
+    if not CONFIG.RENDER_CACHE_ENABLED or not block._render_cacheable:
+        return None
+
+    file_id = block.data.get("file_id")
+    if not file_id:
+        return None
+
+    try:
+        file_info = flask_mongo.db.files.find_one(
+            {"_id": ObjectId(file_id), **get_default_permissions(user_only=False)},
+            projection={
+                "revision": 1,
+                "size": 1,
+                "last_modified": 1,
+                "last_modified_remote": 1,
+                "is_live": 1,
+            },
+        )
+    except Exception as exc:
+        LOGGER.warning("Unable to look up file %s for render cache key: %s", file_id, exc)
+        return None
+
+    # Live files may be updated on access, so their renders are never cached
+    if not file_info or file_info.get("is_live"):
+        return None
+
+    inputs = {k: v for k, v in block.data.items() if k not in RENDER_CACHE_EXCLUDED_KEYS}
+
+    key_data = {
+        "blocktype": block.blocktype,
+        "inputs": inputs,
+        "extras": block._render_cache_extras(),
+        "file": {
+            "_id": file_info["_id"],
+            "revision": file_info.get("revision"),
+            "size": file_info.get("size"),
+            "last_modified": file_info.get("last_modified"),
+            "last_modified_remote": file_info.get("last_modified_remote"),
+        },
+        "server_version": __version__,
+    }
+
+    return hashlib.sha256(
+        json.dumps(key_data, sort_keys=True, cls=CustomJSONEncoder).encode("utf-8")
+    ).hexdigest()
+
+
+def get_cached_render(key: str) -> Optional[Dict[str, Any]]:
+    """Return the cached block data outputs for the given key, if present,
+    and mark the entry as recently used.
+
+    """
+    try:
+        entry = flask_mongo.db[RENDER_CACHE_COLLECTION].find_one_and_update(
+            {"_id": key},
+            {"$set": {"last_accessed": datetime.datetime.now()}},
+            projection={"data": 1},
+        )
+    except Exception as exc:
+        LOGGER.warning("Unable to read from render cache: %s", exc)
+        return None
+
+    if entry is None:
+        _increment_stat("misses")
+        return None
+
+    _increment_stat("hits")
+    return entry["data"]
+
+
+def has_cached_render(key: str) -> bool:
+    """Returns whether a cached render exists for the given key, without
+    counting towards the cache statistics or marking the entry as used.
+
+    """
+    try:
+        return flask_mongo.db[RENDER_CACHE_COLLECTION].count_documents({"_id": key}, limit=1) > 0
+    except pymongo.errors.PyMongoError as exc:
+        LOGGER.warning("Unable to read from render cache: %s", exc)
+        return False
+
+
+def _compute_total_size() -> int:
+    """Compute the total size of all entries in the cache from scratch."""
+    totals = list(
+        flask_mongo.db[RENDER_CACHE_COLLECTION].aggregate(
+            [{"$group": {"_id": None, "total": {"$sum": "$size_bytes"}}}]
+        )
+    )
+    return totals[0]["total"] if totals else 0
+
+
+def _update_total_size(delta: int) -> int:
+    """Adjust the running total size of the cache by `delta` bytes, such that the size
+    of the cache does not need to be recomputed on every write.
+
+    The total is computed from the cache entries the first time it is needed.
+
+    Returns:
+        The new total size of the cache in bytes.
+
+    """
+    totals = flask_mongo.db[RENDER_CACHE_TOTALS_COLLECTION]
+    entry = totals.find_one_and_update(
+        {"_id": _TOTAL_SIZE_ID},
+        {"$inc": {"size_bytes": delta}},
+        return_document=pymongo.ReturnDocument.AFTER,
+    )
+    if entry is not None:
+        return entry["size_bytes"]
+
+    total = _compute_total_size()
+    totals.update_one({"_id": _TOTAL_SIZE_ID}, {"$setOnInsert": {"size_bytes": total}}, upsert=True)
+    return total
+
+
+def _delete_entries(query: Dict[str, Any], free_bytes: Optional[int] = None) -> int:
+    """Remove the cache entries matching the query, least recently accessed first,
+    keeping the running total size of the cache up to date.
+
+    Parameters:
+        query: The query selecting the entries to remove.
+        free_bytes: If provided, stop once at least this many bytes have been freed.
+
+    Returns:
+        The number of removed entries.
+
+    """
+    collection = flask_mongo.db[RENDER_CACHE_COLLECTION]
+    deleted = 0
+    freed = 0
+    for entry in collection.find(
+        query, projection={"_id": 1}, sort=[("last_accessed", pymongo.ASCENDING)]
+    ):
+        if free_bytes is not None and freed >= free_bytes:
+            break
+        # Entries are removed one at a time, so that the total only reflects those
+        # actually removed here (and not concurrently by another request)
+        removed = collection.find_one_and_delete(
+            {"_id": entry["_id"]}, projection={"size_bytes": 1}
+        )
+        if removed is not None:
+            deleted += 1
+            freed += removed.get("size_bytes", 0)
+
+    if free_bytes is not None and freed < free_bytes:
+        # Every entry was removed without freeing enough space, so the running total
+        # has drifted from the contents of the cache and is recomputed
+        flask_mongo.db[RENDER_CACHE_TOTALS_COLLECTION].replace_one(
+            {"_id": _TOTAL_SIZE_ID}, {"size_bytes": _compute_total_size()}, upsert=True
+        )
+    elif freed:
+        _update_total_size(-freed)
+    return deleted
+
+
+def save_render_to_cache(key: str, block: "DataBlock", outputs: Dict[str, Any]) -> bool:
+    """Store the rendered outputs of a block under the given key, evicting the least
+    recently used entries if the configured cache size is exceeded.
+
+    Parameters:
+        key: The cache key computed by `get_render_cache_key` before rendering.
+        block: The block that was rendered.
+        outputs: The block data fields that were created or modified by rendering.
+
+    Returns:
+        Whether the entry was successfully stored.
+
+    """
+    try:
+        size_bytes = len(bson.encode(outputs))
+    except (bson.errors.InvalidDocument, OverflowError) as exc:
+        LOGGER.debug("Not caching render of block %s: %s", block.block_id, exc)
+        return False
+
+    if size_bytes > CONFIG.RENDER_CACHE_MAX_SIZE_BYTES:
+        return False
+
+    collection = flask_mongo.db[RENDER_CACHE_COLLECTION]
+    try:
+        previous = collection.find_one_and_replace(
+            {"_id": key},
+            {
+                "_id": key,
+                "blocktype": block.blocktype,
+                "file_ids": [ObjectId(block.data["file_id"])],
+                "data": outputs,
+                "size_bytes": size_bytes,
+                "last_accessed": datetime.datetime.now(),
+            },
+            projection={"size_bytes": 1},
+            upsert=True,
+        )
+    except pymongo.errors.PyMongoError as exc:
+        LOGGER.warning("Unable to save render of block %s to cache: %s", block.block_id, exc)
+        return False
+
+    try:
+        total = _update_total_size(size_bytes - (previous or {}).get("size_bytes", 0))
+        _evict_least_recently_used(total)
+    except pymongo.errors.PyMongoError as exc:
+        LOGGER.warning("Unable to evict entries from render cache: %s", exc)
+
+    return True
+
+
+def _evict_least_recently_used(total: int) -> None:
+    """Remove the least recently accessed entries until the total size of the
+    cache is below the configured maximum.
+
+    Parameters:
+        total: The current total size of the cache in bytes.
+
+    """
+    excess = total - CONFIG.RENDER_CACHE_MAX_SIZE_BYTES
+    if excess <= 0:
+        return
+
+    evicted = _delete_entries({}, free_bytes=excess)
+    _increment_stat("evictions", evicted)
+    LOGGER.debug("Evicted %s entries from the render cache", evicted)
+
+
+def invalidate_render_cache(file_id: Union[str, ObjectId]) -> int:
+    """Remove all cached renders that depend on the given file, e.g., when a new
+    revision of the file has been uploaded or synced.
+
+    Returns:
+        The number of removed cache entries.
+
+    """
+    try:
+        invalidated = _delete_entries({"file_ids": ObjectId(file_id)})
+    except pymongo.errors.PyMongoError as exc:
+        LOGGER.warning("Unable to invalidate render cache for file %s: %s", file_id, exc)
+        return 0
+
+    _increment_stat("invalidations", invalidated)
+    return invalidated
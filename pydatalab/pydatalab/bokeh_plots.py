@@ -22,6 +22,8 @@ from bokeh.plotting import ColumnDataSource, figure
 from bokeh.themes import Theme
 from scipy.signal import find_peaks
 
+from pydatalab.utils import DEFAULT_MAX_POINTS, downsample_df
+
 FONTSIZE = "12pt"
 TYPEFACE = "Helvetica"  # "Lato"
 COLORS = Dark2[8]
@@ -150,6 +152,8 @@ def selectable_axes_plot(
     plot_title: Optional[str] = None,
     plot_index: Optional[int] = None,
     tools: Optional[List] = None,
+    downsample_method: Optional[str] = None,
+    max_points: Optional[int] = None,
     **kwargs,
 ):
     """
@@ -172,6 +176,9 @@ def selectable_axes_plot(
         plot_index: If part of a larger number of plots, use this index for e.g., choosing the correct
             value in the colour cycle.
         tools: A list of Bokeh tools to enable.
+        downsample_method: If provided, reduce each dataframe to at most `max_points` points
+            with this method (see `pydatalab.utils.downsample_df`) before plotting.
+        max_points: The point budget for each dataframe when downsampling.
 
     Returns:
         Bokeh layout
@@ -230,6 +237,15 @@ def selectable_axes_plot(
         else:
             label = df_.index.name if len(df) > 1 else ""
 
+        if downsample_method:
+            df_ = downsample_df(
+                df_,
+                max_points or DEFAULT_MAX_POINTS,
+                method=downsample_method,
+                x=x_default,
+                y=y_default[0] if isinstance(y_default, list) else y_default,
+            )
+
         source = ColumnDataSource(df_)
 
         if color_options:
@@ -346,37 +362,107 @@ def selectable_axes_plot(
     return layout
 
 
+def _final_capacity_plot(
+    cycle_summary: Optional[pd.DataFrame], normalized: bool = False, **common_options
+) -> Optional[gridplot]:
+    """Creates a Bokeh plot of the charge and discharge capacity of each cycle
+    from a cycle summary dataframe.
+
+    """
+    if cycle_summary is None:
+        warnings.warn("Unable to generate cycle summary plot for this dataset.")
+        return None
+
+    palette = Accent[3]
+
+    p3 = figure(
+        x_axis_label="Cycle number",
+        y_axis_label="capacity (mAh/g)" if normalized else "capacity (mAh)",
+        **common_options,
+    )
+
+    p3.line(
+        x="full cycle",
+        y="charge capacity (mAh/g)" if normalized else "charge capacity (mAh)",
+        source=cycle_summary,
+        legend_label="charge",
+        line_width=2,
+        color=palette[0],
+    )
+    p3.circle(
+        x="full cycle",
+        y="charge capacity (mAh/g)" if normalized else "charge capacity (mAh)",
+        source=cycle_summary,
+        fill_color="white",
+        hatch_color=palette[0],
+        legend_label="charge",
+        line_width=2,
+        size=12,
+        color=palette[0],
+    )
+    p3.line(
+        x="full cycle",
+        y="discharge capacity (mAh/g)" if normalized else "discharge capacity (mAh)",
+        source=cycle_summary,
+        legend_label="discharge",
+        line_width=2,
+        color=palette[2],
+    )
+    p3.triangle(
+        x="full cycle",
+        y="discharge capacity (mAh/g)" if normalized else "discharge capacity (mAh)",
+        source=cycle_summary,
+        fill_color="white",
+        hatch_color=palette[2],
+        line_width=2,
+        legend_label="discharge",
+        size=12,
+        color=palette[2],
+    )
+
+    p3.legend.location = "right"
+    p3.y_range.start = 0
+    p3.xaxis.ticker.desired_num_ticks = 5
+
+    save_data = Button(label="Download .csv", button_type="primary", width_policy="min")
+    save_data_callback = CustomJS(
+        args=dict(source=ColumnDataSource(cycle_summary)),
+        code=GENERATE_CSV_CALLBACK,
+    )
+    save_data.js_on_click(save_data_callback)
+
+    return gridplot([[save_data], [p3]], sizing_mode="scale_width", toolbar_location="below")
+
+
 def double_axes_echem_plot(
-    df: pd.DataFrame,
+    df: Optional[pd.DataFrame],
     mode: Optional[str] = None,
-    cycle_summary: pd.DataFrame = None,
+    cycle_summary: Optional[pd.DataFrame] = None,
     x_options: Sequence[str] = [],
     pick_peaks: bool = True,
     normalized: bool = False,
+    downsample_method: Optional[str] = None,
+    max_points: Optional[int] = None,
     **kwargs,
 ) -> gridplot:
     """Creates a Bokeh plot for electrochemistry data.
 
     Args:
         df: The pre-processed dataframe containing capacities and
-            voltages, indexed by half cycle.
-        mode: Either "dQ/dV", "dV/dQ", "normal" or None.
+            voltages, indexed by half cycle (not required in "final capacity" mode).
+        mode: Either "dQ/dV", "dV/dQ", "final capacity", "normal" or None.
+        cycle_summary: The cycle summary dataframe, used in "final capacity" mode.
         x_options: Columns from `df` that can be selected for the
             first plot. The first will be used as the default.
         pick_peaks: Whether or not to pick and plot the peaks in dV/dQ mode.
+        downsample_method: If provided, reduce the data to at most `max_points` points
+            with this method (see `pydatalab.utils.downsample_df`) before plotting,
+            sharing the budget between half cycles.
+        max_points: The total point budget when downsampling.
 
     Returns: The Bokeh layout.
     """
 
-    if not x_options:
-        x_options = (
-            ["capacity (mAh/g)", "voltage (V)", "time (s)", "current (mA/g)"]
-            if normalized
-            else ["capacity (mAh)", "voltage (V)", "time (s)", "current (mA)"]
-        )
-
-    x_options = [opt for opt in x_options if opt in df.columns]
-
     common_options = {"aspect_ratio": 1.5, "tools": TOOLS}
     common_options.update(**kwargs)
 
@@ -387,6 +473,22 @@ def double_axes_echem_plot(
     if mode not in modes:
         raise RuntimeError(f"Mode must be one of {modes} not {mode}.")
 
+    # The capacity plot only requires the cycle summary, not the raw data
+    if mode == "final capacity":
+        return _final_capacity_plot(cycle_summary, normalized=normalized, **common_options)
+
+    if df is None:
+        raise RuntimeError(f"No data provided to plot in mode {mode}.")
+
+    if not x_options:
+        x_options = (
+            ["capacity (mAh/g)", "voltage (V)", "time (s)", "current (mA/g)"]
+            if normalized
+            else ["capacity (mAh)", "voltage (V)", "time (s)", "current (mA)"]
+        )
+
+    x_options = [opt for opt in x_options if opt in df.columns]
+
     x_default = x_options[0]
     y_default = x_options[1]
 
@@ -419,58 +521,22 @@ def double_axes_echem_plot(
             p2.xaxis.ticker.desired_num_ticks = 5
         plots.append(p2)
 
-    elif mode == "final capacity" and cycle_summary is not None:
-        palette = Accent[3]
-
-        p3 = figure(
-            x_axis_label="Cycle number",
-            y_axis_label="capacity (mAh/g)" if normalized else "capacity (mAh)",
-            **common_options,
-        )
-
-        p3.line(
-            x="full cycle",
-            y="charge capacity (mAh/g)" if normalized else "charge capacity (mAh)",
-            source=cycle_summary,
-            legend_label="charge",
-            line_width=2,
-            color=palette[0],
-        )
-        p3.circle(
-            x="full cycle",
-            y="charge capacity (mAh/g)" if normalized else "charge capacity (mAh)",
-            source=cycle_summary,
-            fill_color="white",
-            hatch_color=palette[0],
-            legend_label="charge",
-            line_width=2,
-            size=12,
-            color=palette[0],
-        )
-        p3.line(
-            x="full cycle",
-            y="discharge capacity (mAh/g)" if normalized else "discharge capacity (mAh)",
-            source=cycle_summary,
-            legend_label="discharge",
-            line_width=2,
-            color=palette[2],
-        )
-        p3.triangle(
-            x="full cycle",
-            y="discharge capacity (mAh/g)" if normalized else "discharge capacity (mAh)",
-            source=cycle_summary,
-            fill_color="white",
-            hatch_color=palette[2],
-            line_width=2,
-            legend_label="discharge",
-            size=12,
-            color=palette[2],
+    if downsample_method:
+        if mode == "dQ/dV":
+            x_downsample, y_downsample = "voltage (V)", "dQ/dV (mA/V)"
+        elif mode == "dV/dQ":
+            x_downsample, y_downsample = x_default, "dV/dQ (V/mA)"
+        else:
+            x_downsample, y_downsample = x_default, "voltage (V)"
+        df = downsample_df(
+            df,
+            max_points or DEFAULT_MAX_POINTS,
+            method=downsample_method,
+            x=x_downsample,
+            y=y_downsample,
+            group_by="half cycle",
         )
 
-        p3.legend.location = "right"
-        p3.y_range.start = 0
-        p3.xaxis.ticker.desired_num_ticks = 5
-
     lines = []
     grouped_by_half_cycle = df.groupby("half cycle")
 
@@ -563,18 +629,6 @@ def double_axes_echem_plot(
         grid = [[p1, p2], [xaxis_select]]
     elif mode == "dV/dQ":
         grid = [[p1], [p2]]
-    elif mode == "final capacity":
-        if cycle_summary is not None:
-            save_data = Button(label="Download .csv", button_type="primary", width_policy="min")
-            save_data_callback = CustomJS(
-                args=dict(source=ColumnDataSource(cycle_summary)),
-                code=GENERATE_CSV_CALLBACK,
-            )
-            save_data.js_on_click(save_data_callback)
-            grid = [[save_data], [p3]]
-        else:
-            warnings.warn("Unable to generate cycle summary plot for this dataset.")
-            return None
     else:
         grid = [[p1], [xaxis_select], [yaxis_select]]
 
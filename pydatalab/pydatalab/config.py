@@ -4,7 +4,7 @@ import logging
 import os
 import platform
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Type, Union
+from typing import Any, Dict, List, Literal, Optional, Type, Union
 
 from pydantic import (
     AnyUrl,
@@ -17,7 +17,7 @@ from pydantic import (
 )
 
 from pydatalab.models import Person
-from pydatalab.models.utils import RandomAlphabeticalRefcodeFactory, RefCodeFactory
+from pydatalab.models.utils import PermutedCounterRefcodeFactory, RefCodeFactory
 
 __all__ = ("CONFIG", "ServerConfig", "DeploymentMetadata", "RemoteFilesystem")
 
@@ -104,6 +104,10 @@ class RemoteFilesystem(BaseModel):
     name: str
     hostname: Optional[str]
     path: Path
+    delta_sync: bool = Field(
+        False,
+        description="Whether to update live files from this filesystem by transferring only the bytes appended since they were last synced, when the remote file has only been appended to (e.g., by an instrument during a running experiment), rather than re-copying the whole file.",
+    )
 
 
 class SMTPSettings(BaseModel):
@@ -138,16 +142,71 @@ class ServerConfig(BaseSettings):
         "mongodb://localhost:27017/datalabvue",
         description="The URI for the underlying MongoDB.",
     )
+    MONGO_TIMEOUT_MS: int = Field(
+        1000,
+        description="The connection and server selection timeout, in milliseconds, for MongoDB clients used outside of the Flask app (e.g., for permissions checks and tasks).",
+    )
+
+    MONGO_MAX_POOL_SIZE: int = Field(
+        100,
+        description="The maximum number of connections in each MongoDB client's connection pool (per server process).",
+    )
+
+    MONGO_MIN_POOL_SIZE: int = Field(
+        0,
+        description="The minimum number of connections to keep open in each MongoDB client's connection pool.",
+    )
+
+    MONGO_MAX_IDLE_TIME_MS: Optional[int] = Field(
+        None,
+        description="The maximum time, in milliseconds, that a connection can remain idle in the pool before being closed (`None` for no limit).",
+    )
+
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: Optional[int] = Field(
+        None,
+        description="The maximum time, in milliseconds, to wait for a connection to become available when the pool is exhausted (`None` for no limit).",
+    )
+
     SESSION_LIFETIME: int = Field(
         7 * 24,
         description="The lifetime of each authenticated session, in hours.",
     )
 
+    USER_CACHE_TTL: int = Field(
+        60,
+        description="The time, in seconds, for which authenticated users (and the users associated with API keys) are cached between requests. Changes made in another server process may take this long to apply. Set to 0 to disable caching.",
+    )
+
+    USER_CACHE_MAX_SIZE: int = Field(
+        1024,
+        description="The maximum number of users to cache, after which the least recently used will be evicted.",
+    )
+
+    PERMISSIONS_CACHE_TTL: int = Field(
+        60,
+        description="The time, in seconds, for which the users managed by each user are cached when resolving permissions. Changes made in another server process may take this long to apply. Set to 0 to disable caching across requests.",
+    )
+
     FILE_DIRECTORY: Union[str, Path] = Field(
         Path(__file__).parent.joinpath("../files").resolve(),
         description="The path under which to place stored files uploaded to the server.",
     )
 
+    DEDUPLICATE_FILES: bool = Field(
+        True,
+        description="Whether to store identical files only once, in a content-addressed blob store under `FILE_DIRECTORY/.blobs`, with the path of each file hard-linked to its shared blob. Unreferenced blobs are removed by the `admin.collect-garbage-blobs` task.",
+    )
+
+    FILE_SENDFILE_MODE: Optional[Literal["x-accel-redirect", "x-sendfile"]] = Field(
+        None,
+        description="""If set, files requested via `/files/` are served by the reverse proxy rather than by the API: the API only checks permissions and conditional request headers, then responds with an `X-Accel-Redirect` (nginx) or `X-Sendfile` (Apache, lighttpd) header pointing to the file, so that the proxy can send its contents (and handle range requests) directly from disk.""",
+    )
+
+    FILE_ACCEL_REDIRECT_PREFIX: str = Field(
+        "/protected-files/",
+        description="The URL prefix of the internal nginx location that maps to `FILE_DIRECTORY`, used in the `X-Accel-Redirect` header when `FILE_SENDFILE_MODE` is `'x-accel-redirect'`.",
+    )
+
     LOG_FILE: str | Path | None = Field(
         None,
         description="The path to the log file to use for the server and all associated processes (e.g., invoke tasks)",
@@ -165,7 +224,8 @@ class ServerConfig(BaseSettings):
     )
 
     REFCODE_GENERATOR: Type[RefCodeFactory] = Field(
-        RandomAlphabeticalRefcodeFactory, description="The class to use to generate refcodes."
+        PermutedCounterRefcodeFactory,
+        description="The class to use to generate refcodes. The default allocates refcodes atomically from a counter in the database; `RandomAlphabeticalRefcodeFactory` picks them at random.",
     )
 
     REMOTE_FILESYSTEMS: List[RemoteFilesystem] = Field(
@@ -183,6 +243,31 @@ class ServerConfig(BaseSettings):
         description="The minimum age, in minutes, of the remote filesystem cache, below which the cache will not be invalidated if an update is manually requested.",
     )
 
+    REMOTE_SSH_POOL_SIZE: int = Field(
+        4,
+        description="The maximum number of persistent SSH connections kept open to each remote filesystem host (per server process), used for checking and syncing remote files.",
+    )
+
+    REMOTE_SSH_TIMEOUT: int = Field(
+        20,
+        description="The timeout, in seconds, for opening an SSH connection to a remote filesystem host and for remote commands and transfers to stall.",
+    )
+
+    REMOTE_SSH_IDLE_TIMEOUT: int = Field(
+        300,
+        description="The time, in seconds, after which an idle pooled SSH connection is closed and replaced on next use.",
+    )
+
+    REMOTE_TRANSFER_CONCURRENCY: int = Field(
+        8,
+        description="The maximum number of remote files transferred in parallel when syncing many files at once (e.g., when plotting all of the files attached to an item). Transfers from a single SSH host are further limited to `REMOTE_SSH_POOL_SIZE` at a time, so values above the pool size only help when syncing from several hosts or from locally mounted remote filesystems.",
+    )
+
+    REMOTE_DELTA_CHECK_BYTES: int = Field(
+        64 * 1024,
+        description="The number of bytes at the start and end of a previously synced file that are compared with the remote file (by hash) to detect whether it has only been appended to, for remote filesystems with `delta_sync` enabled.",
+    )
+
     BEHIND_REVERSE_PROXY: bool = Field(
         False,
         description="Whether the Flask app is being deployed behind a reverse proxy. If `True`, the reverse proxy middleware described in the [Flask docs](https://flask.palletsprojects.com/en/2.2.x/deploying/proxy_fix/) will be attached to the app.",
@@ -221,6 +306,91 @@ Warning: this value will overwrite any other values passed to `FLASK_MAX_CONTENT
 its importance when deploying a datalab instance.""",
     )
 
+    UPLOAD_CHUNK_SIZE: int = Field(
+        1024 * 1024,
+        description="The number of bytes read from the request and written to disk at a time when saving uploaded files; the available disk space is checked before each write.",
+    )
+
+    UPLOAD_SESSION_LIFETIME: int = Field(
+        48,
+        description="The number of hours after which incomplete resumable uploads (via `/uploads/`) can be removed by the `admin.prune-uploads` task.",
+    )
+
+    MAX_PAGE_SIZE: int = Field(
+        1000,
+        description="The maximum number of results that can be requested per page (via the `limit` parameter) from paginated listings such as `/samples/`.",
+    )
+
+    STREAM_BATCH_SIZE: int = Field(
+        500,
+        description="The number of documents fetched from the database at a time when streaming NDJSON responses (i.e., for requests with `Accept: application/x-ndjson`).",
+    )
+
+    GRAPH_MAX_DEPTH: int = Field(
+        5,
+        description="The maximum number of relationships that can be traversed from an item when computing its graph (via the `depth` parameter of `/item-graph/<item_id>`).",
+    )
+
+    GRAPH_MAX_NODES: int = Field(
+        2000,
+        description="The maximum number of items included in any graph returned by `/item-graph`; larger graphs are truncated.",
+    )
+
+    GRAPH_CACHE_SIZE: int = Field(
+        128,
+        description="The number of computed item graphs cached by each server process until relationships are next changed; set to 0 to disable caching.",
+    )
+
+    ITEM_SUMMARIES_ENABLED: bool = Field(
+        True,
+        description="Whether to serve item listings (e.g., `/samples/`) from the materialized `item_summaries` collection, rather than aggregating over all items on each request.",
+    )
+
+    RENDER_CACHE_ENABLED: bool = Field(
+        True,
+        description="Whether to cache the rendered output (e.g., plots) of data blocks attached to files, such that unchanged blocks do not need to be recomputed on every page load.",
+    )
+
+    RENDER_CACHE_MAX_SIZE_BYTES: int = Field(
+        250 * 1000 * 1000,
+        description="The maximum total size of the block render cache in bytes, after which the least recently used entries will be evicted.",
+    )
+
+    BLOCK_RENDER_WORKERS: int = Field(
+        4,
+        description="The maximum number of threads to use when rendering the data blocks of a single item concurrently. If set to 1, blocks will be rendered one after another.",
+    )
+
+    BLOCK_RENDER_TIMEOUT: float = Field(
+        60,
+        description="The time limit, in seconds, for rendering a single data block when loading an item, after which the block will be returned without a plot and with an error, so that one slow block cannot stall the page.",
+    )
+
+    RENDER_JOBS_ENABLED: bool = Field(
+        False,
+        description="Whether expensive data blocks (e.g., those attached to large echem or NMR files) can be rendered by background jobs, such that requests return immediately with a job ID rather than waiting for the plots to be generated.",
+    )
+
+    RENDER_JOB_WORKERS: int = Field(
+        2,
+        description="The number of worker processes to use for background render jobs. If set to 0, jobs will be run synchronously within the request that created them.",
+    )
+
+    RENDER_JOB_MAX_PENDING: int = Field(
+        32,
+        description="The maximum number of queued or running render jobs, after which blocks will be rendered synchronously.",
+    )
+
+    RENDER_JOB_DEFAULT_TIMEOUT: float = Field(
+        300,
+        description="The default time limit, in seconds, for a single background render job.",
+    )
+
+    RENDER_JOB_TIMEOUTS: Dict[str, float] = Field(
+        {},
+        description="A mapping from block type (e.g., `'cycle'`) to the time limit, in seconds, for background render jobs of that block type, overriding `RENDER_JOB_DEFAULT_TIMEOUT`.",
+    )
+
     BACKUP_STRATEGIES: Optional[dict[str, BackupStrategy]] = Field(
         {
             "daily-snapshots": BackupStrategy(
@@ -0,0 +1,412 @@
+"""This module maintains the `edges` collection, an index of the relationships
+between items (and between collections and their members) in both directions,
+such that lineage queries (e.g., the parents and children of an item, or its
+neighbourhood in the item graph) are indexed lookups rather than scans over
+the `relationships` embedded in every item.
+
+Each edge is stored in a normalized direction, with its `source` being the
+parent (or collection, or whole) of its `target`, regardless of which of the
+two items declared the relationship:
+
+- `source`: the `item_id` of the source item, or the immutable ID of the collection,
+- `target`: the `item_id` of the target item,
+- `relation`: the relationship type (see `RelationshipType`), with `child`
+  relationships stored as the reverse `parent` relationship,
+- `type`: the type of the source entry (e.g., `samples` or `collections`),
+- `declared_by`: the immutable ID of the item whose `relationships` declared the edge.
+
+Relationships that refer to items by refcode or immutable ID are resolved to
+`item_id`s where possible; references to items that do not exist (yet) are stored
+as given, and are resolved once the referenced item is created (see
+`update_referencing_edges`).
+
+The edges of an item are regenerated whenever it is created, saved or deleted
+and when collections are created or deleted. The `admin.rebuild-edges` task
+regenerates all edges from scratch, e.g., after modifying the database directly.
+
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import pymongo
+import pymongo.database
+from bson import ObjectId
+
+from pydatalab.logger import LOGGER
+from pydatalab.models.relationships import RelationshipType
+from pydatalab.mongo import flask_mongo
+
+__all__ = (
+    "EDGE_COLLECTION",
+    "LINEAGE_RELATIONS",
+    "update_item_edges",
+    "update_referencing_edges",
+    "delete_item_edges",
+    "delete_collection_edges",
+    "rebuild_edges",
+    "ensure_edges",
+    "ancestors",
+    "descendants",
+    "neighbourhood",
+)
+
+EDGE_COLLECTION = "edges"
+
+LINEAGE_RELATIONS: Tuple[str, ...] = (
+    RelationshipType.PARENT.value,
+    RelationshipType.PARTHOOD.value,
+)
+"""The relations followed by lineage queries by default."""
+
+_BATCH_SIZE = 1000
+
+
+def _get_database(
+    database: Optional[pymongo.database.Database] = None,
+) -> pymongo.database.Database:
+    if database is None:
+        database = flask_mongo.db
+    return database
+
+
+def _build_edges(
+    items: List[Dict[str, Any]], database: pymongo.database.Database
+) -> List[Dict[str, Any]]:
+    """Build the edges declared by a batch of items, resolving references by refcode
+    or immutable ID and checking for the existence of collections with a single
+    query each.
+
+    """
+    refcodes: Set[str] = set()
+    immutable_ids: Set[ObjectId] = set()
+    collection_ids: Set[ObjectId] = set()
+    for item in items:
+        for relationship in item.get("relationships") or []:
+            if relationship.get("type") == "collections":
+                if relationship.get("immutable_id"):
+                    collection_ids.add(relationship["immutable_id"])
+            elif not relationship.get("item_id"):
+                if relationship.get("refcode"):
+                    refcodes.add(relationship["refcode"])
+                elif relationship.get("immutable_id"):
+                    immutable_ids.add(relationship["immutable_id"])
+
+    resolved: Dict[Any, str] = {}
+    if refcodes or immutable_ids:
+        for doc in database.items.find(
+            {
+                "$or": [
+                    {"refcode": {"$in": list(refcodes)}},
+                    {"_id": {"$in": list(immutable_ids)}},
+                ]
+            },
+            projection={"item_id": 1, "refcode": 1},
+        ):
+            resolved[doc["_id"]] = doc["item_id"]
+            if doc.get("refcode"):
+                resolved[doc["refcode"]] = doc["item_id"]
+
+    existing_collections: Set[ObjectId] = set()
+    if collection_ids:
+        existing_collections = {
+            doc["_id"]
+            for doc in database.collections.find(
+                {"_id": {"$in": list(collection_ids)}}, projection={"_id": 1}
+            )
+        }
+
+    edges = []
+    for item in items:
+        for relationship in item.get("relationships") or []:
+            relation = relationship.get("relation")
+
+            if relationship.get("type") == "collections":
+                if relationship.get("immutable_id") not in existing_collections:
+                    continue
+                source = relationship["immutable_id"]
+                target = item["item_id"]
+                source_type = "collections"
+
+            else:
+                other = relationship.get("item_id")
+                if not other:
+                    reference = relationship.get("refcode") or relationship.get("immutable_id")
+                    if reference is None:
+                        continue
+                    other = resolved.get(reference, str(reference))
+
+                if relation == RelationshipType.CHILD.value:
+                    source, target, source_type = item["item_id"], other, item.get("type")
+                    relation = RelationshipType.PARENT.value
+                else:
+                    source, target, source_type = other, item["item_id"], relationship.get("type")
+
+            edges.append(
+                {
+                    "source": source,
+                    "target": target,
+                    "relation": relation,
+                    "type": source_type,
+                    "declared_by": item["_id"],
+                }
+            )
+
+    return edges
+
+
+def _write_edges(
+    items: Iterable[Dict[str, Any]], database: pymongo.database.Database, replace: bool = True
+) -> int:
+    """Build and write the edges declared by the given items, in batches, replacing
+    any existing edges declared by the same items.
+
+    """
+    count = 0
+    batch: List[Dict[str, Any]] = []
+
+    def flush():
+        if not batch:
+            return 0
+        edges = _build_edges(batch, database)
+        operations: List[Any] = [pymongo.InsertOne(edge) for edge in edges]
+        if replace:
+            operations.insert(
+                0, pymongo.DeleteMany({"declared_by": {"$in": [item["_id"] for item in batch]}})
+            )
+        if operations:
+            database[EDGE_COLLECTION].bulk_write(operations, ordered=True)
+        batch.clear()
+        return len(edges)
+
+    for item in items:
+        batch.append(item)
+        if len(batch) >= _BATCH_SIZE:
+            count += flush()
+    count += flush()
+
+    return count
+
+
+def update_item_edges(
+    query: Dict[str, Any], database: Optional[pymongo.database.Database] = None
+) -> int:
+    """Regenerate the edges declared by the items matching the given query.
+
+    Failures are logged rather than raised, so that they do not fail the
+    write that triggered the update; the edges can be regenerated with
+    `rebuild_edges`.
+
+    Parameters:
+        query: A MongoDB query on the `items` collection.
+        database: The database to use, defaulting to the Flask app's database.
+
+    Returns:
+        The number of edges that were written.
+
+    """
+    database = _get_database(database)
+    try:
+        items = database.items.find(query, projection={"item_id": 1, "type": 1, "relationships": 1})
+        return _write_edges(items, database)
+    except pymongo.errors.PyMongoError as exc:
+        LOGGER.warning("Unable to update edges for %s: %s", query, exc)
+        return 0
+
+
+def update_referencing_edges(
+    query: Dict[str, Any], database: Optional[pymongo.database.Database] = None
+) -> int:
+    """Regenerate the edges declared by other items that refer to the items matching
+    the given query by refcode or immutable ID, e.g., once the referenced items have
+    been created or imported, such that references that could not previously be
+    resolved to an `item_id` are resolved.
+
+    Parameters:
+        query: A MongoDB query on the `items` collection, selecting the referenced items.
+        database: The database to use, defaulting to the Flask app's database.
+
+    Returns:
+        The number of edges that were written.
+
+    """
+    database = _get_database(database)
+    try:
+        referenced = list(database.items.find(query, projection={"refcode": 1}))
+    except pymongo.errors.PyMongoError as exc:
+        LOGGER.warning("Unable to find items matching %s: %s", query, exc)
+        return 0
+    if not referenced:
+        return 0
+
+    immutable_ids = [doc["_id"] for doc in referenced]
+    references: List[Dict[str, Any]] = [{"relationships.immutable_id": {"$in": immutable_ids}}]
+    refcodes = [doc["refcode"] for doc in referenced if doc.get("refcode")]
+    if refcodes:
+        references.append({"relationships.refcode": {"$in": refcodes}})
+
+    return update_item_edges({"_id": {"$nin": immutable_ids}, "$or": references}, database)
+
+
+def delete_item_edges(
+    immutable_id: ObjectId, database: Optional[pymongo.database.Database] = None
+) -> int:
+    """Remove the edges declared by a deleted item.
+
+    Edges declared by other items that refer to the deleted item are kept,
+    matching the relationships that remain on those items.
+
+    Returns:
+        The number of removed edges.
+
+    """
+    try:
+        result = _get_database(database)[EDGE_COLLECTION].delete_many({"declared_by": immutable_id})
+    except pymongo.errors.PyMongoError as exc:
+        LOGGER.warning("Unable to delete edges declared by %s: %s", immutable_id, exc)
+        return 0
+
+    return result.deleted_count
+
+
+def delete_collection_edges(
+    collection_immutable_id: ObjectId, database: Optional[pymongo.database.Database] = None
+) -> int:
+    """Remove the edges between a deleted collection and its members.
+
+    Returns:
+        The number of removed edges.
+
+    """
+    try:
+        result = _get_database(database)[EDGE_COLLECTION].delete_many(
+            {"source": collection_immutable_id, "type": "collections"}
+        )
+    except pymongo.errors.PyMongoError as exc:
+        LOGGER.warning("Unable to delete edges of collection %s: %s", collection_immutable_id, exc)
+        return 0
+
+    return result.deleted_count
+
+
+def rebuild_edges(database: Optional[pymongo.database.Database] = None) -> int:
+    """Regenerate all edges from the relationships of all items.
+
+    Returns:
+        The number of edges that were written.
+
+    """
+    database = _get_database(database)
+    database[EDGE_COLLECTION].delete_many({})
+    count = _write_edges(
+        database.items.find({}, projection={"item_id": 1, "type": 1, "relationships": 1}),
+        database,
+        replace=False,
+    )
+    LOGGER.info("Rebuilt %s edges", count)
+    return count
+
+
+def ensure_edges(database: Optional[pymongo.database.Database] = None) -> None:
+    """Build the edges if they have never been built, e.g., when the server
+    is first started against an existing database.
+
+    """
+    database = _get_database(database)
+    if database[EDGE_COLLECTION].find_one({}, projection={"_id": 1}) is not None:
+        return
+    if database.items.find_one({"relationships.0": {"$exists": True}}, projection={"_id": 1}):
+        rebuild_edges(database)
+
+
+def _traverse(
+    item_ids: Iterable[str],
+    max_depth: Optional[int],
+    directions: Tuple[str, ...],
+    relations: Optional[Tuple[str, ...]],
+    database: Optional[pymongo.database.Database] = None,
+) -> Dict[str, int]:
+    """Breadth-first traversal of the edges from the given items, with one indexed
+    query per level.
+
+    Parameters:
+        item_ids: The items to start from.
+        max_depth: The maximum number of edges to follow, or `None` for no limit.
+        directions: Whether to follow edges towards their `source` (i.e., ancestors),
+            `target` (i.e., descendants), or both.
+        relations: The relations to follow, or `None` for all relations between items.
+
+    Returns:
+        A dictionary of the `item_id`s that were reached and their distance from the
+        nearest starting item, excluding the starting items themselves.
+
+    """
+    collection = _get_database(database)[EDGE_COLLECTION]
+    relation_filter: Dict[str, Any] = {"type": {"$ne": "collections"}}
+    if relations is not None:
+        relation_filter["relation"] = {"$in": list(relations)}
+
+    visited: Set[str] = set(item_ids)
+    frontier = list(visited)
+    distances: Dict[str, int] = {}
+    depth = 0
+    while frontier and (max_depth is None or depth < max_depth):
+        depth += 1
+        clauses = [
+            {"target" if direction == "source" else "source": {"$in": frontier}}
+            for direction in directions
+        ]
+        query = (
+            {**relation_filter, "$or": clauses}
+            if len(clauses) > 1
+            else {**relation_filter, **clauses[0]}
+        )
+        reached: Set[str] = set()
+        for edge in collection.find(query, projection={"source": 1, "target": 1, "_id": 0}):
+            for direction in directions:
+                reached.add(edge[direction])
+        frontier = [item_id for item_id in reached - visited if isinstance(item_id, str)]
+        visited.update(frontier)
+        distances.update({item_id: depth for item_id in frontier})
+
+    return distances
+
+
+def ancestors(
+    item_id: str,
+    max_depth: Optional[int] = None,
+    relations: Optional[Tuple[str, ...]] = LINEAGE_RELATIONS,
+    database: Optional[pymongo.database.Database] = None,
+) -> Dict[str, int]:
+    """Returns the `item_id`s of the ancestors of the given item (e.g., its parents and
+    their parents), up to `max_depth` generations back, alongside their distance
+    from the item.
+
+    """
+    return _traverse([item_id], max_depth, ("source",), relations, database)
+
+
+def descendants(
+    item_id: str,
+    max_depth: Optional[int] = None,
+    relations: Optional[Tuple[str, ...]] = LINEAGE_RELATIONS,
+    database: Optional[pymongo.database.Database] = None,
+) -> Dict[str, int]:
+    """Returns the `item_id`s of the descendants of the given item (e.g., its children and
+    their children), up to `max_depth` generations forward, alongside their distance
+    from the item.
+
+    """
+    return _traverse([item_id], max_depth, ("target",), relations, database)
+
+
+def neighbourhood(
+    item_id: str,
+    k: int = 1,
+    relations: Optional[Tuple[str, ...]] = None,
+    database: Optional[pymongo.database.Database] = None,
+) -> Dict[str, int]:
+    """Returns the `item_id`s of all items within `k` edges of the given item,
+    following edges in either direction, alongside their distance from the item.
+
+    """
+    return _traverse([item_id], k, ("source", "target"), relations, database)
@@ -1,22 +1,32 @@
 import datetime
+import hashlib
 import os
 import pathlib
-import re
 import shutil
-import subprocess
-from typing import Any, Dict, Union
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Tuple, Union
 
 from bson.objectid import ObjectId
 from pymongo import ReturnDocument
 from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 
+from pydatalab.blob_store import deduplicate_file, release_blob, revision_path
 from pydatalab.config import CONFIG, RemoteFilesystem
+from pydatalab.errors import InsufficientStorage
 from pydatalab.logger import LOGGER, logged_route
 from pydatalab.models import File
 from pydatalab.models.utils import PyObjectId
-from pydatalab.mongo import _get_active_mongo_client, flask_mongo
+from pydatalab.mongo import flask_mongo
 from pydatalab.permissions import get_default_permissions
+from pydatalab.remote_transfer import (
+    Transfer,
+    TransferResult,
+    fetch_remote_file,
+    fetch_remote_files,
+    split_remote_path,
+    stat_remote_files,
+)
 
 LIVE_FILE_CUTOFF = datetime.timedelta(days=31)
 
@@ -35,87 +45,308 @@ def get_space_available_bytes() -> int:
     return stats.f_bsize * stats.f_bavail
 
 
-def _escape_spaces_scp_path(remote_path: str) -> str:
-    r"""Takes a remote path prefixed by 'ssh://' and encloses
-    the filename in quotes and escapes spaces to allow for
-    scp'ing of files with spaces in the name, e.g., "ssh://hostname:/path to file"
-    becomes 'ssh://hostname:"/path\ to\ file"'.
+def check_space_available(size_bytes: int) -> None:
+    """Check that the given number of bytes can be stored in the file store.
+
+    Raises:
+        InsufficientStorage: If there is not enough space available on disk.
+
+    """
+    if get_space_available_bytes() < size_bytes:
+        raise InsufficientStorage(
+            f"Cannot store file: insufficient space available on disk (required: {size_bytes // 1024**2} MB). Please contact your datalab administrator."
+        )
+
+
+def stream_to_file(
+    stream: BinaryIO,
+    location: Union[str, pathlib.Path],
+    offset: int = 0,
+    hasher: Optional[Any] = None,
+    max_bytes: Optional[int] = None,
+) -> Tuple[int, Any]:
+    """Write the contents of a stream (e.g., the body of a request) to the given location,
+    in chunks of `CONFIG.UPLOAD_CHUNK_SIZE` bytes, such that no more than one chunk is
+    held in memory at a time.
+
+    The SHA-256 hash of the written data is computed as it is written, and the available
+    disk space is checked before each chunk, so that an upload that would fill the disk
+    is stopped as soon as possible, regardless of whether its size was known in advance.
+
+    Parameters:
+        stream: The stream to read from.
+        location: The file to write to.
+        offset: The position in the file at which to start writing; any existing data
+            after this position is discarded.
+        hasher: A `hashlib` hash object that has already been updated with the first
+            `offset` bytes of the file, to be continued.
+        max_bytes: The maximum number of bytes that can be written.
+
+    Raises:
+        InsufficientStorage: If the disk is full (or nearly so).
+        RequestEntityTooLarge: If the stream contains more than `max_bytes` bytes.
+
+    Returns:
+        The number of bytes written and the hash object.
+
+    """
+    if hasher is None:
+        hasher = hashlib.sha256()
+
+    written = 0
+    with open(location, "r+b" if offset else "wb") as f:
+        f.seek(offset)
+        f.truncate()
+        while chunk := stream.read(CONFIG.UPLOAD_CHUNK_SIZE):
+            if max_bytes is not None and written + len(chunk) > max_bytes:
+                raise RequestEntityTooLarge(
+                    f"Received more than the expected {max_bytes} bytes for {location}."
+                )
+            check_space_available(len(chunk))
+            f.write(chunk)
+            hasher.update(chunk)
+            written += len(chunk)
+
+    return written, hasher
+
+
+class UploadTarget:
+    """A new file in the file store that an uploaded file is streamed straight into by
+    the multipart form parser (see `upload_stream_factory`), rather than being spooled
+    to a temporary file first and then copied into the file store.
+
+    As for `stream_to_file`, the SHA-256 hash of the data is computed as it is written,
+    and the available disk space is checked before each `CONFIG.UPLOAD_CHUNK_SIZE` bytes.
+
+    The file is written to a new directory `<file_id>/<filename>` in the file store;
+    it is then either registered as a new file (see `save_uploaded_file`) or moved into
+    place as a new revision of an existing file (see `update_uploaded_file`), and
+    otherwise removed with `discard`.
+
+    """
+
+    def __init__(self, filename: Optional[str]):
+        self.filename = filename
+        self.file_id = ObjectId()
+        self.directory = pathlib.Path(CONFIG.FILE_DIRECTORY) / str(self.file_id)
+        self.location = self.directory / (secure_filename(filename or "") or "upload")
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.stored = False
+        self._unchecked = 0
+        self.directory.mkdir(exist_ok=False)
+        self._file = open(self.location, "w+b")
+
+    def write(self, data: bytes) -> int:
+        self._unchecked += len(data)
+        if self._unchecked >= CONFIG.UPLOAD_CHUNK_SIZE:
+            check_space_available(self._unchecked)
+            self._unchecked = 0
+        self.hasher.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._file, name)
+
+    def discard(self) -> None:
+        """Remove the file, unless it has been stored."""
+        self._file.close()
+        if not self.stored:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def upload_stream_factory(targets: List[UploadTarget]):
+    """Returns a `stream_factory` for `werkzeug.formparser.FormDataParser` that streams
+    each uploaded file into a new `UploadTarget`, appending it to `targets` (such that
+    any that are not stored can be discarded by the caller).
+
+    """
+
+    def stream_factory(
+        total_content_length: Optional[int],
+        content_type: Optional[str],
+        filename: Optional[str],
+        content_length: Optional[int] = None,
+    ) -> UploadTarget:
+        target = UploadTarget(filename)
+        targets.append(target)
+        return target
+
+    return stream_factory
 
-    Leaves paths without spaces unaltered.
+
+def hash_file(location: Union[str, pathlib.Path], size: Optional[int] = None) -> Any:
+    """Returns the SHA-256 hash object of the first `size` bytes (by default, all)
+    of the given file.
 
     """
-    protocol, host, path = remote_path.split(":")
-    if " " not in path:
-        return remote_path
+    hasher = hashlib.sha256()
+    remaining = size
+    with open(location, "rb") as f:
+        while remaining is None or remaining > 0:
+            chunk = f.read(
+                CONFIG.UPLOAD_CHUNK_SIZE
+                if remaining is None
+                else min(remaining, CONFIG.UPLOAD_CHUNK_SIZE)
+            )
+            if not chunk:
+                break
+            hasher.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+
+    return hasher
+
+
+def _store_contents(location: Union[str, pathlib.Path], sha256: str) -> None:
+    """Deduplicate the contents of a newly written file in the blob store, if enabled."""
+    if CONFIG.DEDUPLICATE_FILES:
+        deduplicate_file(location, sha256)
+
 
-    # Escape all spaces, but make sure not to double-escape
-    path = path.replace(r"\ ", " ").replace(" ", r"\ ")
+def _release_previous_contents(previous_sha256: Optional[str], sha256: Optional[str]) -> None:
+    """Remove the blob holding the previous revision of a file from the blob store, once the
+    database no longer references it, if it is not shared with any other file."""
+    if CONFIG.DEDUPLICATE_FILES and previous_sha256 and previous_sha256 != sha256:
+        release_blob(previous_sha256)
 
-    return f'{protocol}:{host}:"{path}"'
+
+def _remote_transfer(remote_path: str, src: str, delta: bool = False) -> Transfer:
+    """Describe the transfer of a file from a mounted volume or ssh-able remote to a
+    temporary path alongside its local location, such that a failed sync leaves the
+    previous version intact and the blob that the previous version may share with
+    other files is not modified.
+
+    """
+    previous = src if delta and os.path.isfile(src) else None
+    destination = revision_path(src)
+    if remote_path.startswith("ssh://"):
+        return Transfer(*split_remote_path(remote_path), destination, previous)
+    return Transfer(None, remote_path, destination, previous)
 
 
 @logged_route
-def _sync_file_with_remote(remote_path: str, src: str) -> None:
+def _sync_file_with_remote(remote_path: str, src: str, delta: bool = False) -> TransferResult:
     """Copy a file from a mounted volume or ssh-able remote to the
     local file store.
 
     Arguments:
         remote_path: The original location of the file.
         src: The local location of the file.
+        delta: Whether to only transfer the bytes appended to the remote file since
+            the local copy was made, if it has only been appended to.
+
+    Returns:
+        The number of bytes transferred, and whether only appended bytes were transferred.
+
     """
-    if os.path.isfile(remote_path):
-        shutil.copy(remote_path, src)
-    elif remote_path.startswith("ssh://"):
-        # Unescape spaces are we are now quoting the whole path
-        remote_path = _escape_spaces_scp_path(remote_path)
-        scp_command = f"scp {re.sub('^ssh://', '', remote_path)} {src}"
+    pathlib.Path(src).parent.mkdir(parents=False, exist_ok=True)
+    transfer = _remote_transfer(remote_path, src, delta=delta)
+    try:
+        result = fetch_remote_file(*transfer)
+    except Exception:
+        pathlib.Path(transfer.destination).unlink(missing_ok=True)
+        raise
+
+    os.replace(transfer.destination, src)
+    return result
+
+
+def _sync_files_with_remotes(transfers: List[Tuple[str, str, bool]]) -> Dict[str, TransferResult]:
+    """Copy many files from mounted volumes or ssh-able remotes to the local file store,
+    as for `_sync_file_with_remote`, in parallel.
+
+    Arguments:
+        transfers: Tuples of the original location, the local location and whether
+            to transfer only appended bytes (i.e., `delta`) for each file.
 
+    Returns:
+        A dictionary of the result of the transfer to each local location, including
+        the error raised if the file could not be synced.
+
+    """
+    pending: Dict[str, Tuple[str, Transfer]] = {}
+    for remote_path, src, delta in transfers:
         pathlib.Path(src).parent.mkdir(parents=False, exist_ok=True)
+        transfer = _remote_transfer(remote_path, src, delta=delta)
+        pending[str(transfer.destination)] = (src, transfer)
 
-        LOGGER.debug("Syncing file with '%s'", scp_command)
-        proc = subprocess.Popen(
-            scp_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-        )
-        _, stderr = proc.communicate()
-        if stderr:
-            raise RuntimeError(
-                f"scp command {scp_command} raised the the following errors: {stderr!r}"
-            )
+    results: Dict[str, TransferResult] = {}
+    for destination, result in fetch_remote_files(
+        transfer for _, transfer in pending.values()
+    ).items():
+        src = pending[destination][0]
+        if result.error is None:
+            os.replace(destination, src)
+        else:
+            pathlib.Path(destination).unlink(missing_ok=True)
+        results[src] = result
 
-    if not os.path.isfile(src):
-        raise RuntimeError("Something went wrong copying {remote_path} to {src}.")
+    return results
 
 
-@logged_route
-def _call_remote_stat(path: str):
-    """Call `stat` on a remote file.
+def _get_remote_timestamps(
+    remote_paths: Iterable[str],
+) -> Dict[str, Optional[datetime.datetime]]:
+    """Get the last modified times of many files on mounted volumes or ssh-able remotes,
+    with a single `stat` call for all of the files on each remote host.
 
     Args:
-        path: The full remote path.
+        remote_paths: The full remote paths.
 
     Returns:
-        A dictionary of the `tree` output.
+        A dictionary of the last modified time of each remote path, or `None` if the
+        file could not be accessed.
 
     """
+    timestamps: Dict[str, Optional[datetime.datetime]] = {}
+    by_host: Dict[str, Dict[str, str]] = {}
+    for remote_path in remote_paths:
+        if remote_path.startswith("ssh://"):
+            hostname, path = split_remote_path(remote_path)
+            by_host.setdefault(hostname, {})[path] = remote_path
+            continue
+        try:
+            timestamps[remote_path] = datetime.datetime.fromtimestamp(os.stat(remote_path).st_mtime)
+        except FileNotFoundError:
+            timestamps[remote_path] = None
 
-    path = path.strip("ssh://")
-    path = path.replace(r"\ ", " ").replace(" ", r"\ ")
-    hostname, file_path = path.split(":", 1)
-    command = f"ssh {hostname} 'stat -c %Y {file_path}'"
-    process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    LOGGER.debug(f"Calling {command}")
-    try:
-        stdout, stderr = process.communicate(timeout=20)
-        timestamp = int(stdout.decode("utf-8"))
-    except Exception as exc:
-        raise RuntimeError(f"Remote stat process {command!r} returned: {exc!r}")
-    if stderr:
-        raise RuntimeError(f"Remote statprocess {command!r} returned: {stderr!r}")
+    for hostname, paths in by_host.items():
+        try:
+            host_timestamps = stat_remote_files(hostname, paths)
+        except RuntimeError as exc:
+            LOGGER.warning("Unable to check for updated files on %s: %s", hostname, exc)
+            host_timestamps = {}
+        for path, remote_path in paths.items():
+            timestamps[remote_path] = host_timestamps.get(path)
 
-    return datetime.datetime.fromtimestamp(timestamp)
+    return timestamps
 
 
 @logged_route
+def _refresh_derived_file_data(file_info: Dict[str, Any]) -> None:
+    """After a new revision of a file has been stored, invalidate any cached
+    block renders of the file and, for cycler data files, parse the file and
+    store its cycle summary.
+
+    Parameters:
+        file_info: The file document from the database, including its `_id`.
+
+    """
+    from pydatalab.apps.echem.summary import ECHEM_INGEST_EXTENSIONS, ingest_echem_file
+    from pydatalab.blocks.render_cache import invalidate_render_cache
+
+    invalidate_render_cache(file_info["_id"])
+
+    extension = (file_info.get("extension") or "").lower()
+    if file_info.get("location") and extension in ECHEM_INGEST_EXTENSIONS:
+        try:
+            ingest_echem_file(file_info)
+        except Exception as exc:
+            LOGGER.warning("Unable to summarise cycling data in %s: %s", file_info["location"], exc)
+
+
 def _check_and_sync_file(file_info: File, file_id: ObjectId) -> File:
     """For a given file, check if the remote version is newer
     than the stored version and sync them if so.
@@ -129,87 +360,137 @@ def _check_and_sync_file(file_info: File, file_id: ObjectId) -> File:
         The updated file info, if an update was required,
         otherwise the old file info.
 
+    """
+    return _check_and_sync_files([(file_info, file_id)])[0]
+
+
+def _check_and_sync_files(files: List[Tuple[File, ObjectId]]) -> List[File]:
+    """For many files, check if the remote versions are newer than the
+    stored versions and sync them if so.
+
+    The last modified times of all files on the same remote host are checked with
+    a single call, and all files that need updating are then transferred in parallel.
+
+    Args:
+        files: Tuples of the `File` metadata object and the `bson.ObjectId` of each file.
+
+    Returns:
+        The updated file info of each file, if an update was required,
+        otherwise the old file info.
+
     """
     directories_dict = {fs.name: fs for fs in CONFIG.REMOTE_FILESYSTEMS}
     file_collection = flask_mongo.db.files
-    if not file_info.source_server_name or not file_info.source_path:
-        raise RuntimeError("Attempted to sync file %s with no known remote", file_info)
+    results = [file_info for file_info, _ in files]
 
-    if not file_info.last_modified_remote:
-        LOGGER.warning(
-            "Unable to sync file %s, no last modified timestamp. Will use saved version.",
-            file_info.source_path,
-        )
-        return file_info
+    remote_paths: Dict[int, str] = {}
+    delta_sync: Dict[int, bool] = {}
+    for index, (file_info, _) in enumerate(files):
+        if not file_info.source_server_name or not file_info.source_path:
+            raise RuntimeError("Attempted to sync file %s with no known remote", file_info)
 
-    cached_timestamp = file_info.last_modified_remote
-    remote: RemoteFilesystem | None = directories_dict.get(file_info.source_server_name, None)
-    if not remote:
-        LOGGER.warning(
-            f"Could not find desired remote for {file_info.source_server_name!r} in {directories_dict}, cannot sync file"
-        )
-        return file_info
+        if not file_info.last_modified_remote:
+            LOGGER.warning(
+                "Unable to sync file %s, no last modified timestamp. Will use saved version.",
+                file_info.source_path,
+            )
+            continue
 
-    full_remote_path = os.path.join(remote.path, file_info.source_path)
-    if remote.hostname:
-        full_remote_path = f"{remote.hostname}:{full_remote_path}"
+        remote: RemoteFilesystem | None = directories_dict.get(file_info.source_server_name, None)
+        if not remote:
+            LOGGER.warning(
+                f"Could not find desired remote for {file_info.source_server_name!r} in {directories_dict}, cannot sync file"
+            )
+            continue
 
-    if full_remote_path.startswith("ssh://"):
-        # For ssh-able remotes, check age of the local file, rather than the last time the remote file was modified
-        remote_timestamp = _call_remote_stat(full_remote_path)
-        LOGGER.debug(
-            "File %s was last edited at timestamp %s, %s ago",
-            full_remote_path,
-            remote_timestamp,
-            datetime.datetime.today() - remote_timestamp,
-        )
+        full_remote_path = os.path.join(remote.path, file_info.source_path)
+        if remote.hostname:
+            full_remote_path = f"{remote.hostname}:{full_remote_path}"
+        remote_paths[index] = full_remote_path
+        delta_sync[index] = remote.delta_sync
 
-    else:
-        try:
-            stat_results = os.stat(full_remote_path)
-            remote_timestamp = datetime.datetime.fromtimestamp(stat_results.st_mtime)
-        except FileNotFoundError:
+    remote_timestamps = _get_remote_timestamps(remote_paths.values())
+
+    to_sync: Dict[int, str] = {}
+    for index, full_remote_path in list(remote_paths.items()):
+        file_info = files[index][0]
+        remote_timestamp = remote_timestamps.get(full_remote_path)
+        if remote_timestamp is None:
             LOGGER.debug(
                 "Could not access remote file when checking for latest version: %s",
                 full_remote_path,
             )
-            return file_info
-
-    if remote_timestamp > cached_timestamp + datetime.timedelta(
-        minutes=CONFIG.REMOTE_CACHE_MAX_AGE
-    ):
-        LOGGER.debug("Updating file %s to latest version", file_info.source_path)
+            del remote_paths[index]
+            continue
 
-        try:
-            _sync_file_with_remote(full_remote_path, file_info.location)
-        except RuntimeError:
-            LOGGER.warning(
-                "Unable to sync file %s with %s on server.", file_info.location, full_remote_path
-            )
-            return file_info
+        LOGGER.debug(
+            "File %s was last edited at timestamp %s, %s ago",
+            full_remote_path,
+            remote_timestamp,
+            datetime.datetime.today() - remote_timestamp,
+        )
+        if file_info.location is not None and remote_timestamp > (
+            file_info.last_modified_remote + datetime.timedelta(minutes=CONFIG.REMOTE_CACHE_MAX_AGE)
+        ):
+            LOGGER.debug("Updating file %s to latest version", file_info.source_path)
+            to_sync[index] = full_remote_path
+        else:
+            LOGGER.debug("File %s is recent enough, not updating", file_info.source_path)
+
+    sync_results = _sync_files_with_remotes(
+        [
+            (full_remote_path, files[index][0].location, delta_sync[index])
+            for index, full_remote_path in to_sync.items()
+        ]
+    )
 
-    else:
-        LOGGER.debug("File %s is recent enough, not updating", file_info.source_path)
+    for index, full_remote_path in remote_paths.items():
+        file_info, file_id = files[index]
+        if file_info.location is None:
+            continue
 
-    if file_info.location is not None:
-        local_stat_results = os.stat(file_info.location)
+        remote_timestamp = remote_timestamps[full_remote_path]
 
         # If the file has not been updated in the last cutoff period, do not redownload on every access
         is_live = True
         if datetime.datetime.now() - remote_timestamp > LIVE_FILE_CUTOFF:
             is_live = False
 
+        updates: Dict[str, Any] = {"last_modified_remote": remote_timestamp, "is_live": is_live}
+        increments: Dict[str, int] = {}
+        if index in to_sync:
+            sync_result = sync_results[file_info.location]
+            if sync_result.error is not None:
+                LOGGER.warning(
+                    "Unable to sync file %s with %s on server: %s",
+                    file_info.location,
+                    full_remote_path,
+                    sync_result.error,
+                )
+                continue
+            LOGGER.info(
+                "Synced %s from %s: transferred %s bytes%s",
+                file_info.location,
+                full_remote_path,
+                sync_result.bytes_transferred,
+                " (appended)" if sync_result.delta else "",
+            )
+            local_stat_results = os.stat(file_info.location)
+            updates["size"] = local_stat_results.st_size
+            updates["last_modified"] = datetime.datetime.fromtimestamp(local_stat_results.st_mtime)
+            updates["sha256"] = hash_file(file_info.location).hexdigest()
+            _store_contents(file_info.location, updates["sha256"])
+            increments = {"revision": 1, "bytes_transferred": sync_result.bytes_transferred}
+
+        # Only a new revision of the file invalidates its cached renders and cycle summary,
+        # so unchanged live files are not reparsed on every access
+        update: Dict[str, Any] = {"$set": updates}
+        if increments:
+            update["$inc"] = increments
+
         updated_file_info = file_collection.find_one_and_update(
             {"_id": file_id, **get_default_permissions(user_only=False)},
-            {
-                "$set": {
-                    "size": local_stat_results.st_size,
-                    "last_modified": datetime.datetime.fromtimestamp(local_stat_results.st_mtime),
-                    "last_modified_remote": remote_timestamp,
-                    "is_live": is_live,
-                },
-                "$inc": {"revision": 1},
-            },
+            update,
             return_document=ReturnDocument.AFTER,
         )
 
@@ -219,11 +500,15 @@ def _check_and_sync_file(file_info: File, file_id: ObjectId) -> File:
                 file_info.source_path,
                 updated_file_info,
             )
-            return file_info
+            continue
+
+        if index in to_sync:
+            _release_previous_contents(file_info.sha256, updates["sha256"])
+            _refresh_derived_file_data(updated_file_info)
 
-        return File(**updated_file_info)
+        results[index] = File(**updated_file_info)
 
-    return file_info
+    return results
 
 
 @logged_route
@@ -266,22 +551,97 @@ def get_file_info_by_id(
     return file_info.dict()
 
 
+@logged_route
+def get_files_info_by_id(
+    file_ids: List[Union[str, ObjectId]], update_if_live: bool = True
+) -> List[Dict[str, Any]]:
+    """Query the files collection for many IDs at once, as for `get_file_info_by_id`,
+    checking and syncing any live files together (see `_check_and_sync_files`).
+
+    Arguments:
+        file_ids: The string or ObjectID representations of the file IDs.
+        update_if_live: Whether or not to update the stored files to their
+            newer versions, if they exist.
+
+    Raises:
+        IOError: If any of the given file IDs do not exist in the database.
+
+    Returns:
+        The stored file information of each file, in the order of `file_ids`.
+
+    """
+    object_ids = [ObjectId(file_id) for file_id in file_ids]
+    documents = {
+        document["_id"]: document
+        for document in flask_mongo.db.files.find(
+            {"_id": {"$in": object_ids}, **get_default_permissions(user_only=False)}
+        )
+    }
+    missing = [str(file_id) for file_id in object_ids if file_id not in documents]
+    if missing:
+        raise OSError(f"could not find files with ids: {missing} in db")
+
+    files_info = [File(**documents[file_id]) for file_id in object_ids]
+
+    if update_if_live:
+        live = [
+            (index, (file_info, object_ids[index]))
+            for index, file_info in enumerate(files_info)
+            if file_info.is_live
+        ]
+        if live:
+            synced = _check_and_sync_files([entry for _, entry in live])
+            for (index, _), file_info in zip(live, synced):
+                files_info[index] = file_info
+
+    return [file_info.dict() for file_info in files_info]
+
+
 @logged_route
 def update_uploaded_file(file, file_id, last_modified=None, size_bytes=None):
     """file is a file object from a flask request.
     last_modified should be an isodate format. if None, the current time will be inserted
     By default, only changes the last_modified, and size_bytes, increments version, and verifies source=remote and is_live=false. (converts )
     additional_updates can be used to pass other fields to change in (NOT IMPLEMENTED YET)"""
-
     last_modified = datetime.datetime.now().isoformat()
     file_collection = flask_mongo.db.files
 
+    existing_file_entry = file_collection.find_one(
+        {"_id": file_id}, projection={"location": 1, "sha256": 1}
+    )
+    if not existing_file_entry:
+        raise OSError(f"Issue with db update uploaded file {file.name} id {file_id}")
+
+    if size_bytes is not None:
+        check_space_available(size_bytes)
+
+    # write the new revision alongside the old file and then replace it, rather than
+    # overwriting the old file in place, as its contents may be shared with other files
+    location = existing_file_entry["location"]
+    if isinstance(file.stream, UploadTarget):
+        # already streamed into the file store by the form parser, so just move it into place
+        upload = file.stream
+        upload.close()
+        size, hasher = upload.size, upload.hasher
+        os.replace(upload.location, location)
+        upload.discard()
+    else:
+        new_revision = revision_path(location)
+        try:
+            size, hasher = stream_to_file(file.stream, new_revision)
+        except Exception:
+            new_revision.unlink(missing_ok=True)
+            raise
+        os.replace(new_revision, location)
+    _store_contents(location, hasher.hexdigest())
+
     updated_file_entry = file_collection.find_one_and_update(
         {"_id": file_id},  # Note, needs to be ObjectID()
         {
             "$set": {
                 "last_modified": last_modified,
-                "size": size_bytes,
+                "size": size,
+                "sha256": hasher.hexdigest(),
                 "source": "remote",
                 "is_live": False,
             },
@@ -293,13 +653,15 @@ def update_uploaded_file(file, file_id, last_modified=None, size_bytes=None):
     if not updated_file_entry:
         raise OSError(f"Issue with db update uploaded file {file.name} id {file_id}")
 
-    updated_file_entry = File(**updated_file_entry)
+    _release_previous_contents(existing_file_entry.get("sha256"), hasher.hexdigest())
 
-    # overwrite the old file with the new location
-    file.save(updated_file_entry.location)
+    updated_file_entry = File(**updated_file_entry)
 
     ret = updated_file_entry.dict()
     ret.update({"_id": file_id})
+
+    _refresh_derived_file_data(ret)
+
     return ret
 
 
@@ -349,24 +711,94 @@ def save_uploaded_file(
         raise RuntimeError("Filename is missing.")
 
     filename = secure_filename(file.filename)
-    extension = os.path.splitext(filename)[1]
 
+    if size_bytes is not None:
+        check_space_available(size_bytes)
+
+    if isinstance(file.stream, UploadTarget):
+        # Already streamed into its final location in the file store by the form parser
+        upload = file.stream
+        upload.close()
+        file_id, file_location = upload.file_id, str(upload.location)
+        size, hasher = upload.size, upload.hasher
+        upload.stored = True
+    else:
+        # Stream the upload directly into its final location in the file store,
+        # before registering it in the database
+        file_id = ObjectId()
+        new_directory = os.path.join(CONFIG.FILE_DIRECTORY, str(file_id))
+        file_location = os.path.join(new_directory, filename)
+        pathlib.Path(new_directory).mkdir(exist_ok=False)
+        try:
+            size, hasher = stream_to_file(file.stream, file_location)
+        except Exception:
+            shutil.rmtree(new_directory, ignore_errors=True)
+            raise
+
+    return register_uploaded_file(
+        file_id,
+        file_location,
+        size=size,
+        sha256=hasher.hexdigest(),
+        original_name=file.filename,
+        item_ids=item_ids,
+        block_ids=block_ids,
+        last_modified=last_modified,
+        creator_ids=creator_ids,
+    )
+
+
+def register_uploaded_file(
+    file_id: ObjectId,
+    file_location: str,
+    size: int,
+    sha256: str,
+    original_name: str,
+    item_ids: list[str],
+    block_ids: list[str] | None = None,
+    last_modified: datetime.datetime | str | None = None,
+    creator_ids: list[PyObjectId | str] | None = None,
+) -> dict:
+    """Add the metadata of an uploaded file that has been written to the file store
+    to the database, and attach it to the given items.
+
+    Parameters:
+        file_id: The ID of the file, i.e., the name of its directory in the file store.
+        file_location: The location of the file in the file store.
+        size: The size of the file in bytes.
+        sha256: The hex digest of the SHA-256 hash of the file contents.
+        original_name: The raw filename as uploaded.
+        item_ids: The item IDs to attach the file to.
+        block_ids: The block IDs to attach the file to.
+        last_modified: An isoformat datetime for to track as the last time the filed was modified
+            (otherwise use the current datetime).
+        creator_ids: A list of IDs for users who will be registered as the creator of this file.
+
+    Returns:
+        A dictionary containing the saved metadata for the file.
+
+    """
     if isinstance(last_modified, datetime.datetime):
         last_modified = last_modified.isoformat()
 
     if not last_modified:
         last_modified = datetime.datetime.now().isoformat()
 
+    _store_contents(file_location, sha256)
+
+    filename = os.path.basename(file_location)
+
     new_file_document = File(
         name=filename,
-        original_name=file.filename,  # not escaped
-        location=None,  # file storage location in datalab. Important! will be filled in below
-        url_path=None,  # the url used to access this file. Important! will be filled in below
-        extension=extension,
+        original_name=original_name,  # not escaped
+        location=file_location,  # file storage location in datalab
+        url_path=None,
+        extension=os.path.splitext(filename)[1],
         source="uploaded",
-        size=size_bytes,
+        size=size,
+        sha256=sha256,
         item_ids=item_ids,
-        blocks=block_ids,
+        blocks=block_ids or [],
         last_modified=last_modified,
         time_added=last_modified,
         metadata={},
@@ -379,41 +811,13 @@ def save_uploaded_file(
         creator_ids=creator_ids if creator_ids is not None else [],
     )
 
-    # In one transaction, check if we can save the file, insert it into the database
-    # and save it, then release the lock
-    client = _get_active_mongo_client()
-    with client.start_session(causal_consistency=True) as session:
-        space = get_space_available_bytes()
-        if size_bytes is not None and space < size_bytes:
-            raise RuntimeError(
-                f"Cannot store file: insufficient space available on disk (required: {size_bytes // 1024 ** 3} GB). Please contact your datalab administrator."
-            )
-        file_collection = client.get_database().files
-        result = file_collection.insert_one(new_file_document.dict(), session=session)
-        if not result.acknowledged:
-            raise RuntimeError(
-                f"db operation failed when trying to insert new file. Result: {result}"
-            )
-
-        inserted_id = result.inserted_id
-
-        new_directory = os.path.join(CONFIG.FILE_DIRECTORY, str(inserted_id))
-        file_location = os.path.join(new_directory, filename)
-        pathlib.Path(new_directory).mkdir(exist_ok=False)
-        file.save(file_location)
-
-    updated_file_entry = flask_mongo.db.files.find_one_and_update(
-        {"_id": inserted_id, **get_default_permissions(user_only=False)},
-        {
-            "$set": {
-                "location": file_location,
-                "size": os.path.getsize(file_location),
-            }
-        },
-        return_document=ReturnDocument.AFTER,
-    )
+    file_document = new_file_document.dict()
+    file_document["_id"] = file_id
+    result = flask_mongo.db.files.insert_one(file_document)
+    if not result.acknowledged:
+        raise RuntimeError(f"db operation failed when trying to insert new file. Result: {result}")
 
-    updated_file_entry = File(**updated_file_entry)
+    inserted_id = result.inserted_id
 
     # update any referenced item_ids
     for item_id in item_ids:
@@ -426,8 +830,11 @@ def save_uploaded_file(
                 f"db operation failed when trying to insert new file ObjectId into sample: {item_id}"
             )
 
-    ret = updated_file_entry.dict()
+    ret = new_file_document.dict()
     ret.update({"_id": inserted_id})
+
+    _refresh_derived_file_data(ret)
+
     return ret
 
 
@@ -503,7 +910,9 @@ def add_file_from_remote_directory(
     new_directory = os.path.join(CONFIG.FILE_DIRECTORY, str(inserted_id))
     new_file_location = os.path.join(new_directory, filename)
     pathlib.Path(new_directory).mkdir(exist_ok=True)
-    _sync_file_with_remote(full_remote_path, new_file_location)
+    sync_result = _sync_file_with_remote(full_remote_path, new_file_location)
+    sha256 = hash_file(new_file_location).hexdigest()
+    _store_contents(new_file_location, sha256)
 
     updated_file_entry = file_collection.find_one_and_update(
         {"_id": inserted_id, **get_default_permissions(user_only=False)},
@@ -511,6 +920,8 @@ def add_file_from_remote_directory(
             "$set": {
                 "location": new_file_location,
                 "url_path": new_file_location,
+                "sha256": sha256,
+                "bytes_transferred": sync_result.bytes_transferred,
             }
         },
         return_document=ReturnDocument.AFTER,
@@ -525,6 +936,8 @@ def add_file_from_remote_directory(
             f"db operation failed when trying to insert new file ObjectId into sample: {item_id}"
         )
 
+    _refresh_derived_file_data(updated_file_entry)
+
     return updated_file_entry
 
 
@@ -0,0 +1,268 @@
+"""This module computes the graph of relationships between items (and the
+collections that they belong to), in the format used by Cytoscape on the
+frontend.
+
+Graphs around a single item are found by traversing the edge index (see
+`pydatalab.edges`) in both directions up to a configurable depth, and the number
+of items in any graph is limited to a configurable node budget, such that
+graphs of whole deployments and large collections can be computed in bounded
+time. Computed graphs are cached in each server process until relationships
+are changed in any process (see `invalidate_graph_cache`).
+
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from pydatalab.config import CONFIG
+from pydatalab.edges import EDGE_COLLECTION, LINEAGE_RELATIONS, ancestors, descendants
+from pydatalab.mongo import flask_mongo
+from pydatalab.permissions import get_default_permissions
+
+__all__ = ("get_item_graph", "invalidate_graph_cache")
+
+GRAPH_VERSION_ID = "item_graph"
+"""The ID of the document in the `counters` collection that is incremented whenever
+relationships change, invalidating the cached graphs of all server processes."""
+
+_GRAPH_CACHE: "OrderedDict[Tuple, Tuple[int, Dict[str, Any]]]" = OrderedDict()
+"""A process-local LRU cache of computed graphs, alongside the graph version they were computed at."""
+
+_GRAPH_CACHE_LOCK = threading.Lock()
+
+_NODE_PROJECTION = {"item_id": 1, "name": 1, "type": 1}
+
+
+def invalidate_graph_cache() -> None:
+    """Mark all cached graphs as stale, e.g., when the relationships or collections
+    of any item have changed.
+
+    """
+    flask_mongo.db.counters.update_one(
+        {"_id": GRAPH_VERSION_ID}, {"$inc": {"value": 1}}, upsert=True
+    )
+    with _GRAPH_CACHE_LOCK:
+        _GRAPH_CACHE.clear()
+
+
+def _get_graph_version() -> int:
+    version = flask_mongo.db.counters.find_one({"_id": GRAPH_VERSION_ID})
+    return version["value"] if version else 0
+
+
+def _traverse(item_id: str, depth: int, permissions: Dict) -> List[Dict]:
+    """Returns the given item and all items connected to it by lineage relationships
+    within the given number of generations (in either direction), ordered by distance
+    from the item.
+
+    """
+    distances = ancestors(item_id, max_depth=depth)
+    for other, distance in descendants(item_id, max_depth=depth).items():
+        distances[other] = min(distance, distances.get(other, distance))
+    distances[item_id] = 0
+
+    documents = sorted(
+        flask_mongo.db.items.find(
+            {"item_id": {"$in": list(distances)}, **permissions}, projection=_NODE_PROJECTION
+        ),
+        key=lambda doc: (distances[doc["item_id"]], doc["item_id"]),
+    )
+    if not documents or documents[0]["item_id"] != item_id:
+        return []
+
+    return documents
+
+
+def _build_graph(
+    documents: List[Dict], item_id: Optional[str], include_collections: bool
+) -> Dict[str, List[Dict]]:
+    """Build the Cytoscape nodes and edges for the given item documents from the
+    edge index, looking up all of their collections with a single query.
+
+    """
+    node_ids: Set[str] = {document["item_id"] for document in documents}
+
+    clauses: List[Dict[str, Any]] = [
+        {"relation": {"$in": list(LINEAGE_RELATIONS)}, "source": {"$in": list(node_ids)}}
+    ]
+    if include_collections:
+        clauses.append({"type": "collections"})
+    incoming: Dict[str, List[Dict]] = {}
+    for edge in flask_mongo.db[EDGE_COLLECTION].find(
+        {"target": {"$in": list(node_ids)}, "$or": clauses},
+        projection={"source": 1, "target": 1, "type": 1, "_id": 0},
+    ):
+        incoming.setdefault(edge["target"], []).append(edge)
+
+    collections: Dict[Any, Dict] = {}
+    collection_ids = {
+        edge["source"]
+        for edges in incoming.values()
+        for edge in edges
+        if edge["type"] == "collections"
+    }
+    if collection_ids:
+        collections = {
+            collection["_id"]: collection
+            for collection in flask_mongo.db.collections.find(
+                {
+                    "_id": {"$in": list(collection_ids)},
+                    **get_default_permissions(user_only=False),
+                },
+                projection={"collection_id": 1, "title": 1, "type": 1},
+            )
+        }
+
+    nodes = []
+    edges = []
+
+    # Collect the elements that have already been added to the graph, to avoid duplication
+    drawn_elements = set()
+    for document in documents:
+        target = document["item_id"]
+        for edge in incoming.get(target, []):
+            if edge["type"] == "collections":
+                collection_data = collections.get(edge["source"])
+                if not collection_data:
+                    continue
+                source = f'Collection: {collection_data["collection_id"]}'
+                if source not in drawn_elements:
+                    drawn_elements.add(source)
+                    nodes.append(
+                        {
+                            "data": {
+                                "id": source,
+                                "name": collection_data.get("title"),
+                                "type": collection_data.get("type"),
+                                "shape": "triangle",
+                            }
+                        }
+                    )
+            else:
+                source = edge["source"]
+
+            edge_id = f"{source}->{target}"
+            if edge_id not in drawn_elements:
+                drawn_elements.add(edge_id)
+                edges.append(
+                    {
+                        "data": {
+                            "id": edge_id,
+                            "source": source,
+                            "target": target,
+                            "value": 1,
+                        }
+                    }
+                )
+
+        if target not in drawn_elements:
+            drawn_elements.add(target)
+            nodes.append(
+                {
+                    "data": {
+                        "id": target,
+                        "name": document.get("name"),
+                        "type": document["type"],
+                        "special": target == item_id,
+                    }
+                }
+            )
+
+    # We want to filter out all the starting materials that don't have relationships since there are so many of them:
+    whitelist = {edge["data"]["source"] for edge in edges}
+
+    nodes = [
+        node
+        for node in nodes
+        if node["data"]["type"] in ("samples", "cells") or node["data"]["id"] in whitelist
+    ]
+
+    return {"nodes": nodes, "edges": edges}
+
+
+def get_item_graph(
+    item_id: Optional[str] = None,
+    collection_id: Optional[str] = None,
+    depth: int = 1,
+    max_nodes: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Compute the relationship graph visible to the current user.
+
+    Parameters:
+        item_id: If provided, only include items connected to this item.
+        collection_id: If provided (and `item_id` is not), only include items in this collection.
+        depth: The maximum number of relationships between `item_id` and any included item.
+        max_nodes: The maximum number of items to include, defaulting to `CONFIG.GRAPH_MAX_NODES`.
+
+    Raises:
+        ValueError: If the requested collection does not exist.
+
+    Returns:
+        A dictionary of the graph `nodes` and `edges`, and whether the graph
+        was `truncated` to the node budget.
+
+    """
+    if max_nodes is None:
+        max_nodes = CONFIG.GRAPH_MAX_NODES
+    max_nodes = min(max_nodes, CONFIG.GRAPH_MAX_NODES)
+    depth = max(1, min(depth, CONFIG.GRAPH_MAX_DEPTH))
+
+    permissions = get_default_permissions(user_only=False)
+    cache_key = (
+        item_id,
+        collection_id,
+        depth,
+        max_nodes,
+        json.dumps(permissions, sort_keys=True, default=str),
+    )
+    version = None
+    if CONFIG.GRAPH_CACHE_SIZE > 0:
+        version = _get_graph_version()
+        with _GRAPH_CACHE_LOCK:
+            cached = _GRAPH_CACHE.get(cache_key)
+            if cached is not None and cached[0] == version:
+                _GRAPH_CACHE.move_to_end(cache_key)
+                return cached[1]
+
+    if item_id is not None:
+        documents = _traverse(item_id, depth, permissions)
+
+    else:
+        query: Dict[str, Any] = {}
+        if collection_id is not None:
+            collection = flask_mongo.db.collections.find_one(
+                {"collection_id": collection_id}, projection={"_id": 1}
+            )
+            if not collection:
+                raise ValueError(f"No collection {collection_id=} found.")
+            query = {
+                "relationships": {
+                    "$elemMatch": {"type": "collections", "immutable_id": collection["_id"]}
+                }
+            }
+        documents = list(
+            flask_mongo.db.items.find(
+                {**query, **permissions},
+                projection=_NODE_PROJECTION,
+                sort=[("_id", -1)],
+                limit=max_nodes + 1,
+            )
+        )
+
+    truncated = len(documents) > max_nodes
+    graph: Dict[str, Any] = _build_graph(
+        documents[:max_nodes],
+        item_id,
+        include_collections=item_id is not None or collection_id is None,
+    )
+    graph["truncated"] = truncated
+
+    if version is not None:
+        with _GRAPH_CACHE_LOCK:
+            _GRAPH_CACHE[cache_key] = (version, graph)
+            while len(_GRAPH_CACHE) > CONFIG.GRAPH_CACHE_SIZE:
+                _GRAPH_CACHE.popitem(last=False)
+
+    return graph
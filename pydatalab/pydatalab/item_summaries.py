@@ -0,0 +1,252 @@
+"""This module maintains a materialized summary of each sample and cell in the
+`item_summaries` collection, such that item listings (e.g., `/samples/`) can be
+served by an indexed, projected query instead of an aggregation over the full
+`items` collection with joins on users and collections.
+
+Summaries are updated whenever an item is created, saved or deleted, when blocks
+are added or removed, when the membership of a collection changes and when a user
+changes their name. The `admin.rebuild-item-summaries` task regenerates all summaries
+from scratch, e.g., after modifying the database directly.
+
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+import pymongo
+import pymongo.database
+from bson import ObjectId
+
+from pydatalab.logger import LOGGER
+from pydatalab.mongo import flask_mongo
+
+__all__ = (
+    "ITEM_SUMMARY_COLLECTION",
+    "ITEM_SUMMARY_TYPES",
+    "update_item_summaries",
+    "delete_item_summaries",
+    "update_collection_member_summaries",
+    "rebuild_item_summaries",
+    "ensure_item_summaries",
+)
+
+ITEM_SUMMARY_COLLECTION = "item_summaries"
+
+ITEM_SUMMARY_TYPES = ("samples", "cells")
+"""The item types that are summarised."""
+
+_SUMMARY_FIELDS = (
+    "item_id",
+    "refcode",
+    "name",
+    "chemform",
+    "characteristic_chemical_formula",
+    "type",
+    "date",
+    "creator_ids",
+)
+"""The item fields that are copied directly into each summary."""
+
+_BATCH_SIZE = 1000
+
+
+def _get_database(
+    database: Optional[pymongo.database.Database] = None,
+) -> pymongo.database.Database:
+    if database is None:
+        database = flask_mongo.db
+    return database
+
+
+def _build_summaries(
+    items: List[Dict[str, Any]], database: pymongo.database.Database
+) -> List[Dict[str, Any]]:
+    """Build the summaries of a batch of items, resolving their creators and
+    collections with a single query each.
+
+    """
+    creator_ids = {_id for item in items for _id in item.get("creator_ids") or []}
+    creators = {
+        user.pop("_id"): user
+        for user in database.users.find(
+            {"_id": {"$in": list(creator_ids)}},
+            projection={"display_name": 1, "contact_email": 1},
+        )
+    }
+
+    collection_ids = {
+        relationship.get("immutable_id")
+        for item in items
+        for relationship in item.get("relationships") or []
+        if relationship.get("type") == "collections"
+    }
+    collections = {
+        collection["_id"]: collection
+        for collection in database.collections.find(
+            {"_id": {"$in": list(collection_ids - {None})}, "type": "collections"},
+            projection={"collection_id": 1},
+        )
+    }
+
+    summaries = []
+    for item in items:
+        summary = {field: item.get(field) for field in _SUMMARY_FIELDS}
+        summary["_id"] = item["_id"]
+        summary["creator_ids"] = summary["creator_ids"] or []
+        summary["nblocks"] = len(item.get("display_order") or [])
+        summary["creators"] = [creators[_id] for _id in summary["creator_ids"] if _id in creators]
+
+        # Only relationships to existing collections are kept, so that collection
+        # membership can be queried in the same way as for the items themselves
+        item_collections = [
+            collections[relationship["immutable_id"]]
+            for relationship in item.get("relationships") or []
+            if relationship.get("type") == "collections"
+            and relationship.get("immutable_id") in collections
+        ]
+        summary["relationships"] = [
+            {"type": "collections", "immutable_id": collection["_id"]}
+            for collection in item_collections
+        ]
+        summary["collections"] = [
+            {"collection_id": collection["collection_id"]} for collection in item_collections
+        ]
+        summaries.append(summary)
+
+    return summaries
+
+
+def _write_summaries(items: Iterable[Dict[str, Any]], database: pymongo.database.Database) -> int:
+    """Build and upsert the summaries of the given items, in batches."""
+    count = 0
+    batch: List[Dict[str, Any]] = []
+
+    def flush():
+        if not batch:
+            return 0
+        database[ITEM_SUMMARY_COLLECTION].bulk_write(
+            [
+                pymongo.ReplaceOne({"_id": summary["_id"]}, summary, upsert=True)
+                for summary in _build_summaries(batch, database)
+            ],
+            ordered=False,
+        )
+        written = len(batch)
+        batch.clear()
+        return written
+
+    for item in items:
+        batch.append(item)
+        if len(batch) >= _BATCH_SIZE:
+            count += flush()
+    count += flush()
+
+    return count
+
+
+def update_item_summaries(
+    query: Dict[str, Any], database: Optional[pymongo.database.Database] = None
+) -> int:
+    """Recompute the summaries of the items matching the given query.
+
+    Failures are logged rather than raised, so that they do not fail the
+    write that triggered the update; the summaries can be regenerated with
+    `rebuild_item_summaries`.
+
+    Parameters:
+        query: A MongoDB query on the `items` collection.
+        database: The database to use, defaulting to the Flask app's database.
+
+    Returns:
+        The number of summaries that were written.
+
+    """
+    database = _get_database(database)
+    try:
+        items = list(
+            database.items.find(
+                {**query, "type": {"$in": list(ITEM_SUMMARY_TYPES)}},
+                projection=[*_SUMMARY_FIELDS, "display_order", "relationships"],
+            )
+        )
+        count = _write_summaries(items, database)
+    except pymongo.errors.PyMongoError as exc:
+        LOGGER.warning("Unable to update item summaries for %s: %s", query, exc)
+        return 0
+
+    return count
+
+
+def delete_item_summaries(
+    query: Dict[str, Any], database: Optional[pymongo.database.Database] = None
+) -> int:
+    """Remove the summaries matching the given query, e.g., for deleted items.
+
+    Returns:
+        The number of removed summaries.
+
+    """
+    try:
+        result = _get_database(database)[ITEM_SUMMARY_COLLECTION].delete_many(query)
+    except pymongo.errors.PyMongoError as exc:
+        LOGGER.warning("Unable to delete item summaries for %s: %s", query, exc)
+        return 0
+
+    return result.deleted_count
+
+
+def update_collection_member_summaries(
+    collection_immutable_id: ObjectId, database: Optional[pymongo.database.Database] = None
+) -> int:
+    """Recompute the summaries of all items that belong to the given collection,
+    e.g., after the collection has been created or deleted.
+
+    """
+    return update_item_summaries(
+        {
+            "relationships": {
+                "$elemMatch": {"type": "collections", "immutable_id": collection_immutable_id}
+            }
+        },
+        database=database,
+    )
+
+
+def rebuild_item_summaries(database: Optional[pymongo.database.Database] = None) -> int:
+    """Regenerate the summaries of all items, removing any stale summaries.
+
+    Returns:
+        The number of summaries that were written.
+
+    """
+    database = _get_database(database)
+    count = _write_summaries(
+        database.items.find(
+            {"type": {"$in": list(ITEM_SUMMARY_TYPES)}},
+            projection=[*_SUMMARY_FIELDS, "display_order", "relationships"],
+        ),
+        database,
+    )
+
+    existing_ids = set(database.items.distinct("_id", {"type": {"$in": list(ITEM_SUMMARY_TYPES)}}))
+    stale_ids = [
+        summary["_id"]
+        for summary in database[ITEM_SUMMARY_COLLECTION].find({}, projection={"_id": 1})
+        if summary["_id"] not in existing_ids
+    ]
+    if stale_ids:
+        database[ITEM_SUMMARY_COLLECTION].delete_many({"_id": {"$in": stale_ids}})
+
+    LOGGER.info("Rebuilt %s item summaries, removed %s stale summaries", count, len(stale_ids))
+    return count
+
+
+def ensure_item_summaries(database: Optional[pymongo.database.Database] = None) -> None:
+    """Build the item summaries if they have never been built, e.g., when the server
+    is first started against an existing database.
+
+    """
+    database = _get_database(database)
+    if database[ITEM_SUMMARY_COLLECTION].find_one({}, projection={"_id": 1}) is not None:
+        return
+    if database.items.find_one({"type": {"$in": list(ITEM_SUMMARY_TYPES)}}, projection={"_id": 1}):
+        rebuild_item_summaries(database)
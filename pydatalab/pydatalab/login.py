@@ -3,18 +3,22 @@ for retrieving the authenticated user for a session and their identities.
 
 """
 
+import threading
+import time
+from collections import OrderedDict
 from hashlib import sha512
-from typing import List, Optional
+from typing import Any, Callable, Generic, Hashable, List, Optional, TypeVar
 
 from bson import ObjectId
 from flask_login import LoginManager, UserMixin
 
+from pydatalab.config import CONFIG
 from pydatalab.models import Person
 from pydatalab.models.people import AccountStatus, Identity, IdentityType
 from pydatalab.models.utils import UserRole
 from pydatalab.mongo import flask_mongo
 
-__all__ = ("LOGIN_MANAGER",)
+__all__ = ("LOGIN_MANAGER", "invalidate_user_cache")
 
 
 class LoginUser(UserMixin):
@@ -83,9 +87,98 @@ class LoginUser(UserMixin):
             self.role = user.role
 
 
+T = TypeVar("T")
+
+
+class _TTLCache(Generic[T]):
+    """A thread-safe cache with a maximum number of entries, evicted in least
+    recently used order, and a maximum age for each entry.
+
+    """
+
+    def __init__(self, max_size: Callable[[], int], ttl: Callable[[], float]):
+        # Settings are read from the config on access, so that they can be changed at runtime
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, T]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[T]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: Hashable, value: T) -> None:
+        ttl = self._ttl()
+        max_size = self._max_size()
+        if ttl <= 0 or max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def remove(self, predicate: Callable[[Hashable, T], bool]) -> None:
+        with self._lock:
+            for key in [k for k, (_, v) in self._entries.items() if predicate(k, v)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_USER_CACHE: _TTLCache[LoginUser] = _TTLCache(
+    max_size=lambda: CONFIG.USER_CACHE_MAX_SIZE, ttl=lambda: CONFIG.USER_CACHE_TTL
+)
+"""A cache of `LoginUser` objects keyed by user ID."""
+
+_API_KEY_CACHE: _TTLCache[str] = _TTLCache(
+    max_size=lambda: CONFIG.USER_CACHE_MAX_SIZE, ttl=lambda: CONFIG.USER_CACHE_TTL
+)
+"""A cache of user IDs keyed by the hash of their API key."""
+
+
+def invalidate_user_cache(user_id: Optional[Any] = None) -> None:
+    """Remove the given user (or all users, if `None`) from the user and API key caches,
+    e.g., when their details, role, identities or API key have changed.
+
+    Only the caches of the current process are cleared; other server processes
+    will pick up the change once their entries expire (see `CONFIG.USER_CACHE_TTL`).
+
+    Parameters:
+        user_id: The database ID of the user, as a string or `ObjectId`.
+
+    """
+    if user_id is None:
+        _USER_CACHE.clear()
+        _API_KEY_CACHE.clear()
+        return
+
+    user_id = str(user_id)
+    _USER_CACHE.remove(lambda key, _: key == user_id)
+    _API_KEY_CACHE.remove(lambda _, cached_user_id: cached_user_id == user_id)
+
+
 def get_by_id_cached(user_id):
-    """Cached version of get_by_id."""
-    return get_by_id(user_id)
+    """Cached version of get_by_id, returning a `LoginUser` from the cache if it
+    was looked up within the last `CONFIG.USER_CACHE_TTL` seconds.
+
+    """
+    user_id = str(user_id)
+    user = _USER_CACHE.get(user_id)
+    if user is None:
+        user = get_by_id(user_id)
+        if user is not None:
+            _USER_CACHE.set(user_id, user)
+    return user
 
 
 def get_by_id(user_id: str) -> Optional[LoginUser]:
@@ -121,9 +214,15 @@ def get_by_api_key(key: str):
     """
 
     hash = sha512(key.encode("utf-8")).hexdigest()
-    user = flask_mongo.db.api_keys.find_one({"hash": hash}, projection={"hash": 0})
-    if user:
-        return get_by_id_cached(str(user["_id"]))
+    user_id = _API_KEY_CACHE.get(hash)
+    if user_id is None:
+        user = flask_mongo.db.api_keys.find_one({"hash": hash}, projection={"hash": 0})
+        if not user:
+            return None
+        user_id = str(user["_id"])
+        _API_KEY_CACHE.set(hash, user_id)
+
+    return get_by_id_cached(user_id)
 
 
 LOGIN_MANAGER: LoginManager = LoginManager()
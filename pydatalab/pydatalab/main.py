@@ -12,6 +12,8 @@ from werkzeug.middleware.proxy_fix import ProxyFix
 
 import pydatalab.mongo
 from pydatalab.config import CONFIG
+from pydatalab.edges import ensure_edges
+from pydatalab.item_summaries import ensure_item_summaries
 from pydatalab.logger import LOGGER, setup_log
 from pydatalab.login import LOGIN_MANAGER
 from pydatalab.send_email import MAIL
@@ -150,12 +152,19 @@ def create_app(
 
     # Must use the full path so that this object can be mocked for testing
     flask_mongo = pydatalab.mongo.flask_mongo
-    flask_mongo.init_app(app, connectTimeoutMS=100, serverSelectionTimeoutMS=100)
+    flask_mongo.init_app(
+        app,
+        connectTimeoutMS=100,
+        serverSelectionTimeoutMS=100,
+        **pydatalab.mongo.get_mongo_client_options(),
+    )
 
     for extension in (LOGIN_MANAGER, MAIL, COMPRESS):
         extension.init_app(app)
 
     pydatalab.mongo.create_default_indices()
+    ensure_item_summaries(pydatalab.mongo.get_database())
+    ensure_edges(pydatalab.mongo.get_database())
 
     if CONFIG.FILE_DIRECTORY is not None:
         pathlib.Path(CONFIG.FILE_DIRECTORY).mkdir(parents=False, exist_ok=True)
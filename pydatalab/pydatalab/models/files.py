@@ -15,6 +15,10 @@ class File(Entry, HasOwner, HasRevisionControl):
 
     size: Optional[int] = Field(description="The size of the file on disk in bytes.")
 
+    sha256: Optional[str] = Field(
+        description="The hex digest of the SHA-256 hash of the file contents, if known."
+    )
+
     last_modified_remote: Optional[IsoformatDateTime] = Field(
         description="The last date/time at which the remote file was modified."
     )
@@ -52,3 +56,8 @@ class File(Entry, HasOwner, HasRevisionControl):
     is_live: bool = Field(
         description="Whether or not the file should be watched for future updates."
     )
+
+    bytes_transferred: int = Field(
+        0,
+        description="The total number of bytes transferred from the remote when syncing the file.",
+    )
@@ -1,9 +1,10 @@
 import datetime
+import hashlib
 import random
 import string
 from enum import Enum
 from functools import partial
-from typing import Callable, Optional, Union
+from typing import Callable, List, Optional, Union
 
 import pint
 from bson.objectid import ObjectId
@@ -181,6 +182,11 @@ class RefCodeFactory:
 
         return f"{CONFIG.IDENTIFIER_PREFIX}:{self.refcode_generator()}"
 
+    @classmethod
+    def generate_batch(cls, number: int) -> List[str]:
+        """Generates the given number of refcodes, which may not be unique."""
+        return [cls.generate() for _ in range(number)]
+
 
 def random_uppercase(length: int = 6):
     return "".join(random.choices(string.ascii_uppercase, k=length))
@@ -190,19 +196,112 @@ class RandomAlphabeticalRefcodeFactory(RefCodeFactory):
     refcode_generator = partial(random_uppercase, length=6)
 
 
+REFCODE_COUNTER_ID = "refcodes"
+"""The ID of the document in the `counters` collection used to allocate refcodes."""
+
+
+def _permute_index(index: int, half_size: int, rounds: int = 4) -> int:
+    """A bijection on `range(half_size**2)`, implemented as a Feistel network with
+    modular addition over the two base-`half_size` digits of the index, such
+    that consecutive indices are mapped to unrelated values.
+
+    The round function is a fixed hash, as the permutation is only used to make
+    refcodes appear random rather than to hide the underlying counter.
+
+    """
+    left, right = divmod(index, half_size)
+    for round in range(rounds):
+        digest = hashlib.blake2b(f"{round}:{right}".encode(), digest_size=8).digest()
+        left, right = right, (left + int.from_bytes(digest, "big")) % half_size
+    return left * half_size + right
+
+
+class PermutedCounterRefcodeFactory(RefCodeFactory):
+    """Allocates 6-letter refcodes from an atomically-incremented counter in the
+    database, mapped through a fixed permutation onto all possible codes.
+
+    Each allocation is a single `$inc` of the counter, regardless of the number of
+    refcodes requested or the number already allocated, and concurrent allocations
+    can never be given the same code.
+
+    """
+
+    length: int = 6
+
+    @classmethod
+    def _encode(cls, index: int) -> str:
+        letters = []
+        for _ in range(cls.length):
+            index, digit = divmod(index, len(string.ascii_uppercase))
+            letters.append(string.ascii_uppercase[digit])
+        return "".join(reversed(letters))
+
+    @classmethod
+    def generate(cls):
+        return cls.generate_batch(1)[0]
+
+    @classmethod
+    def generate_batch(cls, number: int) -> List[str]:
+        from pymongo import ReturnDocument
+
+        from pydatalab.config import CONFIG
+        from pydatalab.mongo import get_database
+
+        if number < 1:
+            return []
+
+        half_size = len(string.ascii_uppercase) ** (cls.length // 2)
+        counter = get_database().counters.find_one_and_update(
+            {"_id": REFCODE_COUNTER_ID},
+            {"$inc": {"value": number}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        end = counter["value"]
+        if end > half_size**2:
+            raise RuntimeError("All possible refcodes have been allocated.")
+
+        return [
+            f"{CONFIG.IDENTIFIER_PREFIX}:{cls._encode(_permute_index(index, half_size))}"
+            for index in range(end - number, end)
+        ]
+
+
 def generate_unique_refcode():
     """Generates a unique refcode for an item using the configured convention."""
+    return generate_unique_refcodes(1)[0]
+
+
+def generate_unique_refcodes(number: int) -> List[str]:
+    """Generates a batch of unique refcodes for new items using the configured convention,
+    checking all candidates against existing items with a single query per attempt
+    (e.g., to skip codes that were previously assigned randomly).
+
+    """
     from pydatalab.config import CONFIG
     from pydatalab.mongo import get_database
 
-    refcode = f"{CONFIG.REFCODE_GENERATOR.generate()}"
+    refcodes: List[str] = []
     try:
-        while get_database().items.find_one({"refcode": refcode}):
-            refcode = f"{CONFIG.IDENTIFIER_PREFIX}:{CONFIG.REFCODE_GENERATOR.generate()}"
+        while len(refcodes) < number:
+            candidates = [
+                refcode
+                for refcode in dict.fromkeys(
+                    CONFIG.REFCODE_GENERATOR.generate_batch(number - len(refcodes))
+                )
+                if refcode not in refcodes
+            ]
+            taken = {
+                doc["refcode"]
+                for doc in get_database().items.find(
+                    {"refcode": {"$in": candidates}}, projection={"refcode": 1}
+                )
+            }
+            refcodes += [refcode for refcode in candidates if refcode not in taken]
     except Exception as exc:
-        raise RuntimeError(f"Cannot check refcode for uniqueness: {exc}")
+        raise RuntimeError(f"Cannot check refcodes for uniqueness: {exc}")
 
-    return refcode
+    return refcodes
 
 
 class InlineSubstance(BaseModel):
@@ -1,7 +1,11 @@
-from typing import List, Optional
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
 # Must be imported in this way to allow for easy patching with mongomock
 import pymongo
+import pymongo.monitoring
 from flask_pymongo import PyMongo
 from pydantic import BaseModel
 from pymongo.errors import ConnectionFailure
@@ -11,12 +15,128 @@ __all__ = (
     "check_mongo_connection",
     "create_default_indices",
     "_get_active_mongo_client",
+    "get_mongo_client_options",
     "insert_pydantic_model_fork_safe",
+    "MONGO_POOL_STATS",
 )
 
 flask_mongo = PyMongo()
 """This is the primary database interface used by the Flask app."""
 
+MONGO_POOL_STATS: Dict[str, float] = {
+    "checkouts": 0,
+    "checkout_failures": 0,
+    "checkout_wait_total_ms": 0.0,
+    "checkout_wait_max_ms": 0.0,
+    "connections_checked_out": 0,
+    "connections_created": 0,
+    "connections_closed": 0,
+    "pools_cleared": 0,
+}
+"""Process-local counters describing the usage of the MongoDB connection pools,
+including the time spent waiting to check out a connection."""
+
+_STATS_LOCK = threading.Lock()
+
+_CLIENTS: Dict[Tuple[str, int], pymongo.MongoClient] = {}
+"""The `MongoClient`s created in this process, keyed by URI and timeout."""
+
+_CLIENTS_LOCK = threading.Lock()
+
+
+class _ConnectionPoolMetrics(pymongo.monitoring.ConnectionPoolListener):
+    """Records connection pool events into `MONGO_POOL_STATS`.
+
+    Connections are checked out on the thread that runs the operation, so the
+    checkout wait is timed with a thread-local start time.
+
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _increment(self, name: str, value: float = 1) -> None:
+        with _STATS_LOCK:
+            MONGO_POOL_STATS[name] += value
+
+    def connection_check_out_started(self, event):
+        self._local.start = time.monotonic()
+
+    def connection_checked_out(self, event):
+        start = getattr(self._local, "start", None)
+        wait_ms = (time.monotonic() - start) * 1000 if start is not None else 0.0
+        with _STATS_LOCK:
+            MONGO_POOL_STATS["checkouts"] += 1
+            MONGO_POOL_STATS["connections_checked_out"] += 1
+            MONGO_POOL_STATS["checkout_wait_total_ms"] += wait_ms
+            MONGO_POOL_STATS["checkout_wait_max_ms"] = max(
+                MONGO_POOL_STATS["checkout_wait_max_ms"], wait_ms
+            )
+
+    def connection_check_out_failed(self, event):
+        self._increment("checkout_failures")
+
+    def connection_checked_in(self, event):
+        self._increment("connections_checked_out", -1)
+
+    def connection_created(self, event):
+        self._increment("connections_created")
+
+    def connection_closed(self, event):
+        self._increment("connections_closed")
+
+    def pool_cleared(self, event):
+        self._increment("pools_cleared")
+
+    def pool_created(self, event): ...
+
+    def pool_ready(self, event): ...
+
+    def pool_closed(self, event): ...
+
+    def connection_ready(self, event): ...
+
+
+_POOL_METRICS = _ConnectionPoolMetrics()
+
+
+def _reset_after_fork() -> None:
+    """Discard the clients and statistics inherited from the parent process,
+    as `MongoClient`s are not fork-safe and must be recreated in the child.
+
+    """
+    global _CLIENTS_LOCK, _STATS_LOCK
+
+    _CLIENTS_LOCK = threading.Lock()
+    _STATS_LOCK = threading.Lock()
+    _CLIENTS.clear()
+    for key in MONGO_POOL_STATS:
+        MONGO_POOL_STATS[key] = 0
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_mongo_client_options() -> Dict[str, Any]:
+    """Returns the connection pool options for `MongoClient`s from the server config,
+    including a listener that records pool usage in `MONGO_POOL_STATS`.
+
+    """
+    from pydatalab.config import CONFIG
+
+    options: Dict[str, Any] = {
+        "maxPoolSize": CONFIG.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": CONFIG.MONGO_MIN_POOL_SIZE,
+        "event_listeners": [_POOL_METRICS],
+    }
+    if CONFIG.MONGO_MAX_IDLE_TIME_MS is not None:
+        options["maxIdleTimeMS"] = CONFIG.MONGO_MAX_IDLE_TIME_MS
+    if CONFIG.MONGO_WAIT_QUEUE_TIMEOUT_MS is not None:
+        options["waitQueueTimeoutMS"] = CONFIG.MONGO_WAIT_QUEUE_TIMEOUT_MS
+
+    return options
+
 
 def insert_pydantic_model_fork_safe(model: BaseModel, collection: str) -> str:
     """Inserts a Pydantic model into chosen collection, returning the inserted ID."""
@@ -27,13 +147,17 @@ def insert_pydantic_model_fork_safe(model: BaseModel, collection: str) -> str:
     )
 
 
-def _get_active_mongo_client(timeoutMS: int = 1000) -> pymongo.MongoClient:
+def _get_active_mongo_client(timeoutMS: Optional[int] = None) -> pymongo.MongoClient:
     """Returns a `MongoClient` for the configured `MONGO_URI`,
     raising a `RuntimeError` if not available.
 
+    A single pooled client is created per process (and per timeout) and reused
+    by subsequent calls; it will be recreated in any forked child processes.
+    The returned client is shared, so should not be closed by the caller.
+
     Parameters:
         timeoutMS: Value to use for the MongoDB timeouts (connect and server select)
-            in milliseconds
+            in milliseconds, defaulting to `CONFIG.MONGO_TIMEOUT_MS`.
 
     Returns:
         The active MongoClient, already connected.
@@ -42,16 +166,33 @@ def _get_active_mongo_client(timeoutMS: int = 1000) -> pymongo.MongoClient:
     from pydatalab.config import CONFIG
     from pydatalab.logger import LOGGER
 
-    try:
-        return pymongo.MongoClient(
-            CONFIG.MONGO_URI,
-            connectTimeoutMS=timeoutMS,
-            serverSelectionTimeoutMS=timeoutMS,
-            connect=True,
-        )
-    except ConnectionFailure as exc:
-        LOGGER.critical(f"Unable to connect to MongoDB at {CONFIG.MONGO_URI}")
-        raise RuntimeError from exc
+    if timeoutMS is None:
+        timeoutMS = CONFIG.MONGO_TIMEOUT_MS
+
+    key = (CONFIG.MONGO_URI, timeoutMS)
+    client = _CLIENTS.get(key)
+    if client is not None:
+        return client
+
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is not None:
+            return client
+
+        try:
+            client = pymongo.MongoClient(
+                CONFIG.MONGO_URI,
+                connectTimeoutMS=timeoutMS,
+                serverSelectionTimeoutMS=timeoutMS,
+                connect=True,
+                **get_mongo_client_options(),
+            )
+        except ConnectionFailure as exc:
+            LOGGER.critical(f"Unable to connect to MongoDB at {CONFIG.MONGO_URI}")
+            raise RuntimeError from exc
+
+        _CLIENTS[key] = client
+        return client
 
 
 def get_database() -> pymongo.database.Database:
@@ -85,6 +226,15 @@ def create_default_indices(
         - A text index over all string fields in item models,
         - An index over item type,
         - A unique index over `item_id` and `refcode`.
+        - Multikey indexes over the `refcode` and `immutable_id` of item relationships.
+        - Compound indexes over item type, date (or last modified) and `_id`, for paginated listings.
+        - Indexes over the item ID, creators, collections and date of item summaries.
+        - Compound indexes over the source and target of relationship edges, in both directions.
+        - An index over the content hash of files, for reference counting of stored blobs.
+        - Compound indexes over the creators and last modified date of collections.
+        - Indexes over the file IDs and access times of the block render cache.
+        - A unique index over the file ID of cycle summaries, and an index over their item IDs.
+        - Indexes over the status and block ID of render jobs, and a TTL index to expire finished jobs.
         - A text index over user names and identities.
 
     Parameters:
@@ -94,6 +244,7 @@ def create_default_indices(
         A list of messages returned by each `create_index` call.
 
     """
+    from pydatalab.blocks.jobs import JOB_RETENTION_SECONDS
     from pydatalab.models import ITEM_MODELS
 
     if client is None:
@@ -145,6 +296,106 @@ def create_default_indices(
         "refcode", unique=True, name="unique refcode", background=background
     )
     ret += db.items.create_index("last_modified", name="last modified", background=background)
+    for field in ("date", "last_modified"):
+        ret += db.items.create_index(
+            [
+                ("type", pymongo.ASCENDING),
+                (field, pymongo.DESCENDING),
+                ("_id", pymongo.DESCENDING),
+            ],
+            name=f"item type and {field.replace('_', ' ')} listing",
+            background=background,
+        )
+
+    for field in ("refcode", "immutable_id"):
+        ret += db.items.create_index(
+            f"relationships.{field}",
+            name=f"relationships {field.replace('_', ' ')}",
+            background=background,
+        )
+
+    ret += db.item_summaries.create_index(
+        "item_id", unique=True, name="unique item summary ID", background=background
+    )
+    ret += db.item_summaries.create_index(
+        [("type", pymongo.ASCENDING), ("date", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)],
+        name="item summary type and date",
+        background=background,
+    )
+    ret += db.item_summaries.create_index(
+        [
+            ("creator_ids", pymongo.ASCENDING),
+            ("date", pymongo.DESCENDING),
+            ("_id", pymongo.DESCENDING),
+        ],
+        name="item summary creators and date",
+        background=background,
+    )
+    ret += db.item_summaries.create_index(
+        "relationships.immutable_id",
+        name="item summary collections",
+        background=background,
+    )
+
+    ret += db.edges.create_index(
+        [("source", pymongo.ASCENDING), ("relation", pymongo.ASCENDING)],
+        name="edge source",
+        background=background,
+    )
+    ret += db.edges.create_index(
+        [("target", pymongo.ASCENDING), ("relation", pymongo.ASCENDING)],
+        name="edge target",
+        background=background,
+    )
+    ret += db.edges.create_index("declared_by", name="edge declared by", background=background)
+
+    ret += db.files.create_index("sha256", name="file content hash", background=background)
+
+    ret += db.collections.create_index(
+        [("last_modified", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)],
+        name="collection last modified listing",
+        background=background,
+    )
+    ret += db.collections.create_index(
+        [
+            ("creator_ids", pymongo.ASCENDING),
+            ("last_modified", pymongo.DESCENDING),
+            ("_id", pymongo.DESCENDING),
+        ],
+        name="collection creators and last modified",
+        background=background,
+    )
+
+    ret += db.block_render_cache.create_index(
+        "file_ids", name="render cache file IDs", background=background
+    )
+    ret += db.block_render_cache.create_index(
+        "last_accessed", name="render cache last accessed", background=background
+    )
+
+    ret += db.cycle_summaries.create_index(
+        "file_id", unique=True, name="unique cycle summary file ID", background=background
+    )
+    ret += db.cycle_summaries.create_index(
+        "item_ids", name="cycle summary item IDs", background=background
+    )
+
+    ret += db.jobs.create_index(
+        [("status", pymongo.ASCENDING), ("created_at", pymongo.ASCENDING)],
+        name="job status",
+        background=background,
+    )
+    ret += db.jobs.create_index(
+        [("block_id", pymongo.ASCENDING), ("finished_at", pymongo.DESCENDING)],
+        name="job block ID",
+        background=background,
+    )
+    ret += db.jobs.create_index(
+        "finished_at",
+        expireAfterSeconds=JOB_RETENTION_SECONDS,
+        name="job expiry",
+        background=background,
+    )
 
     user_fts_fields = {"identities.name", "display_name"}
 
@@ -0,0 +1,255 @@
+"""This module implements keyset (cursor) pagination, sorting, filtering and
+field projection for the listing endpoints (e.g., `/samples/`, `/collections`),
+driven by the query parameters of the request.
+
+Listings are ordered by a sort field and then by `_id`, so that the order is
+stable even when many documents share the same sort value. When a `limit` is
+requested, each page is returned alongside an opaque `next_cursor` that encodes
+the sort value and `_id` of its last document; passing this back as the `cursor`
+parameter returns the following page via an indexed range query, rather than
+by skipping over all of the previous documents.
+
+Supported query parameters (where enabled for a given route):
+    - `limit`: the maximum number of results to return (by default, all results),
+    - `cursor`: the `next_cursor` returned with the previous page,
+    - `sort`: the field to sort by, from those supported by the route,
+    - `order`: the sort order, either `desc` (default) or `asc`,
+    - `fields`: a comma-separated list of fields to return,
+    - `type`: only return items of this type,
+    - `creator`: only return entries created by the user with this immutable ID,
+    - `collection`: only return items in the collection with this `collection_id`,
+    - `date_from`, `date_to`: only return entries whose date field (e.g., `date` for
+      items) is within this (inclusive) range, given as ISO 8601 datetimes.
+
+"""
+
+import base64
+import binascii
+import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pymongo
+from bson import ObjectId, json_util
+from bson.errors import InvalidId
+from flask import request
+from pydantic import BaseModel
+
+from pydatalab.config import CONFIG
+from pydatalab.mongo import flask_mongo
+
+__all__ = ("ListingParameters", "get_listing_parameters")
+
+
+def _encode_cursor(value: Any, _id: Any) -> str:
+    return base64.urlsafe_b64encode(json_util.dumps({"v": value, "id": _id}).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[Any, Any]:
+    try:
+        data = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return data["v"], data["id"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise ValueError(f"Invalid pagination cursor {cursor!r}.")
+
+
+class ListingParameters(BaseModel):
+    """The parsed pagination, sorting, filtering and projection options of a listing request."""
+
+    sort: str
+    """The field to sort by (before `_id`)."""
+
+    direction: int = pymongo.DESCENDING
+    """The sort direction, as `pymongo.ASCENDING` or `pymongo.DESCENDING`."""
+
+    limit: Optional[int] = None
+    """The maximum number of results to return, if any."""
+
+    after: Optional[Tuple[Any, Any]] = None
+    """The sort value and `_id` of the last document of the previous page, if any."""
+
+    fields: Optional[List[str]] = None
+    """The fields to return, if restricted."""
+
+    match: Dict[str, Any] = {}
+    """The MongoDB query terms for the requested filters."""
+
+    @property
+    def sort_spec(self) -> List[Tuple[str, int]]:
+        """The sort specification, for use in `find` (or as a `$sort` stage via `dict`)."""
+        return [(self.sort, self.direction), ("_id", self.direction)]
+
+    def query(self) -> Dict[str, Any]:
+        """Returns the MongoDB query terms for the requested filters and the position of
+        the current page.
+
+        Documents with a missing or null sort value are ordered first when ascending
+        and last when descending, following MongoDB's sort order.
+
+        """
+        if self.after is None:
+            return dict(self.match)
+
+        value, _id = self.after
+        op = "$gt" if self.direction == pymongo.ASCENDING else "$lt"
+        null = {self.sort: None}
+        if value is None:
+            clauses = [{**null, "_id": {op: _id}}]
+            if self.direction == pymongo.ASCENDING:
+                clauses.append({self.sort: {"$ne": None}})
+        else:
+            clauses = [{self.sort: {op: value}}, {self.sort: value, "_id": {op: _id}}]
+            if self.direction == pymongo.DESCENDING:
+                clauses.append(null)
+
+        keyset = {"$or": clauses}
+        if not self.match:
+            return keyset
+        return {"$and": [self.match, keyset]}
+
+    def project(self, projection: Dict[str, Any]) -> Dict[str, Any]:
+        """Restrict the given default projection to the requested fields, always
+        including the `_id` and sort field required to compute the next cursor.
+
+        """
+        if self.fields is not None:
+            projection = {k: v for k, v in projection.items() if k in self.fields}
+        projection["_id"] = 1
+        if self.sort not in projection:
+            projection[self.sort] = 1
+        return projection
+
+    def _strip(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Remove the fields that were only needed to compute the next cursor."""
+        doc.pop("_id", None)
+        if self.fields is not None and self.sort not in self.fields:
+            doc.pop(self.sort, None)
+        return doc
+
+    def paginate(self, documents: Iterable[Dict[str, Any]]) -> Tuple[List[Dict], Optional[str]]:
+        """Collect a page of results from the given documents, which should have been
+        queried with at least `limit + 1` results so that the presence of a following page
+        can be detected.
+
+        Returns:
+            The page of results, with any fields that were only needed for pagination
+            removed, and the cursor for the next page, if there is one.
+
+        """
+        results = []
+        next_cursor = None
+        for doc in documents:
+            if self.limit is not None and len(results) == self.limit:
+                last = results[-1]
+                next_cursor = _encode_cursor(last.get(self.sort), last["_id"])
+                break
+            results.append(doc)
+
+        return [self._strip(doc) for doc in results], next_cursor
+
+    def iter_page(self, documents: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Lazily yield a page of results from the given documents, as for `paginate`,
+        followed by a final `{"next_cursor": ...}` document if there is a following page.
+
+        """
+        count = 0
+        last_key = None
+        for doc in documents:
+            if self.limit is not None and count == self.limit:
+                yield {"next_cursor": _encode_cursor(*last_key)}
+                return
+            last_key = (doc.get(self.sort), doc["_id"])
+            count += 1
+            yield self._strip(doc)
+
+
+def get_listing_parameters(
+    sort_fields: Tuple[str, ...],
+    fields: Iterable[str],
+    date_field: Optional[str] = None,
+    types: Optional[Tuple[str, ...]] = None,
+    creator_filter: bool = False,
+    collection_filter: bool = False,
+) -> ListingParameters:
+    """Parse the listing options from the query parameters of the current request.
+
+    Parameters:
+        sort_fields: The fields that can be sorted by, the first of which is the default.
+        fields: The fields that can be requested via the `fields` parameter.
+        date_field: The field filtered by `date_from` and `date_to`, if supported.
+        types: The item types that can be filtered by via `type`, if supported.
+        creator_filter: Whether to support filtering by creator.
+        collection_filter: Whether to support filtering by collection.
+
+    Raises:
+        ValueError: If any of the parameters are invalid.
+
+    """
+    args = request.args
+
+    sort = args.get("sort", default=sort_fields[0], type=str)
+    if sort not in sort_fields:
+        raise ValueError(f"Cannot sort by {sort!r}, must be one of {list(sort_fields)}.")
+
+    order = args.get("order", default="desc", type=str)
+    if order not in ("asc", "desc"):
+        raise ValueError(f"Invalid sort order {order!r}, must be 'asc' or 'desc'.")
+
+    limit = args.get("limit", default=None, type=int)
+    if "limit" in args and (limit is None or limit < 1):
+        raise ValueError("The page limit must be a positive integer.")
+    if limit is not None:
+        limit = min(limit, CONFIG.MAX_PAGE_SIZE)
+
+    after = None
+    if args.get("cursor"):
+        after = _decode_cursor(args["cursor"])
+
+    requested_fields = None
+    if args.get("fields"):
+        requested_fields = [f.strip() for f in args["fields"].split(",") if f.strip()]
+        unknown = set(requested_fields) - set(fields)
+        if unknown:
+            raise ValueError(f"Unknown fields {sorted(unknown)}, must be from {sorted(fields)}.")
+
+    match: Dict[str, Any] = {}
+
+    if types and args.get("type"):
+        if args["type"] not in types:
+            raise ValueError(f"Invalid type {args['type']!r}, must be one of {list(types)}.")
+        match["type"] = args["type"]
+
+    if creator_filter and args.get("creator"):
+        try:
+            match["creator_ids"] = ObjectId(args["creator"])
+        except InvalidId:
+            raise ValueError(f"Invalid creator ID {args['creator']!r}.")
+
+    if collection_filter and args.get("collection"):
+        collection = flask_mongo.db.collections.find_one(
+            {"collection_id": args["collection"]}, projection={"_id": 1}
+        )
+        if collection is None:
+            raise ValueError(f"No collection found with ID {args['collection']!r}.")
+        match["relationships"] = {
+            "$elemMatch": {"type": "collections", "immutable_id": collection["_id"]}
+        }
+
+    if date_field:
+        date_range = {}
+        for param, op in (("date_from", "$gte"), ("date_to", "$lte")):
+            if args.get(param):
+                try:
+                    date_range[op] = datetime.datetime.fromisoformat(args[param])
+                except ValueError:
+                    raise ValueError(f"Invalid {param} {args[param]!r}, must be an ISO 8601 date.")
+        if date_range:
+            match[date_field] = date_range
+
+    return ListingParameters(
+        sort=sort,
+        direction=pymongo.ASCENDING if order == "asc" else pymongo.DESCENDING,
+        limit=limit,
+        after=after,
+        fields=requested_fields,
+        match=match,
+    )
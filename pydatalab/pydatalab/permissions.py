@@ -1,7 +1,10 @@
+import threading
+import time
 from functools import wraps
-from typing import Any, Dict
+from typing import Any, Dict, List, Tuple
 
-from flask import request
+from bson import ObjectId
+from flask import g, has_app_context, request
 from flask_login import current_user
 
 from pydatalab.config import CONFIG
@@ -10,6 +13,65 @@ from pydatalab.login import UserRole
 from pydatalab.models.people import AccountStatus
 from pydatalab.mongo import get_database
 
+_MANAGED_USERS_CACHE: Dict[ObjectId, Tuple[float, List[ObjectId]]] = {}
+"""A process-local cache of the IDs of the users managed by each user,
+alongside the time at which each entry expires."""
+
+_MANAGED_USERS_CACHE_LOCK = threading.Lock()
+
+
+def invalidate_permissions_cache() -> None:
+    """Clear the cached managed users for all users, e.g., when the managers
+    of any user have been changed.
+
+    Only the cache of the current process is cleared; other server processes
+    will pick up the change once their entries expire (see `CONFIG.PERMISSIONS_CACHE_TTL`).
+
+    """
+    with _MANAGED_USERS_CACHE_LOCK:
+        _MANAGED_USERS_CACHE.clear()
+
+
+def _get_managed_users(immutable_id: ObjectId) -> List[ObjectId]:
+    """Returns the IDs of the users managed by the given user.
+
+    Results are memoized for the duration of the current request (via `flask.g`),
+    and cached across requests for `CONFIG.PERMISSIONS_CACHE_TTL` seconds.
+
+    """
+    request_cache: Dict[ObjectId, List[ObjectId]] = {}
+    if has_app_context():
+        request_cache = g.setdefault("_managed_users", {})
+    if immutable_id in request_cache:
+        return request_cache[immutable_id]
+
+    managed_users = None
+    now = time.monotonic()
+    if CONFIG.PERMISSIONS_CACHE_TTL > 0:
+        with _MANAGED_USERS_CACHE_LOCK:
+            cached = _MANAGED_USERS_CACHE.get(immutable_id)
+        if cached is not None and cached[0] > now:
+            managed_users = cached[1]
+
+    if managed_users is None:
+        managed_users = [
+            u["_id"]
+            for u in get_database().users.find(
+                {"managers": {"$in": [immutable_id]}}, projection={"_id": 1}
+            )
+        ]
+        if managed_users:
+            LOGGER.debug("Found managed users %s for user %s", managed_users, immutable_id)
+        if CONFIG.PERMISSIONS_CACHE_TTL > 0:
+            with _MANAGED_USERS_CACHE_LOCK:
+                _MANAGED_USERS_CACHE[immutable_id] = (
+                    now + CONFIG.PERMISSIONS_CACHE_TTL,
+                    managed_users,
+                )
+
+    request_cache[immutable_id] = managed_users
+    return managed_users
+
 
 def active_users_or_get_only(func):
     """Decorator to ensure that only active user accounts can access a non-GET route."""
@@ -75,14 +137,7 @@ def get_default_permissions(user_only: bool = True) -> Dict[str, Any]:
     null_perm = {"$or": [{"creator_ids": {"$size": 0}}, {"creator_ids": {"$exists": False}}]}
     if current_user.is_authenticated and current_user.person is not None:
         # find managed users under the given user (can later be expanded to groups)
-        managed_users = list(
-            get_database().users.find(
-                {"managers": {"$in": [current_user.person.immutable_id]}}, projection={"_id": 1}
-            )
-        )
-        if managed_users:
-            managed_users = [u["_id"] for u in managed_users]
-            LOGGER.debug("Found managed users %s for user %s", managed_users, current_user.person)
+        managed_users = _get_managed_users(current_user.person.immutable_id)
 
         user_perm = {"creator_ids": {"$in": [current_user.person.immutable_id] + managed_users}}
         if user_only:
@@ -0,0 +1,485 @@
+"""This module transfers files from SSH-accessible remote filesystems (see
+`CONFIG.REMOTE_FILESYSTEMS`) over pools of persistent SSH connections, such that
+checking and syncing many files (or the same live file repeatedly) does not pay
+for a new SSH process and handshake each time.
+
+Connections are opened with paramiko on first use, with the settings for the host
+in `~/.ssh/config` and the system's known host keys, and are kept open in a pool
+per host of at most `CONFIG.REMOTE_SSH_POOL_SIZE` connections. Each connection
+multiplexes its SFTP session and remote commands as channels over the same SSH
+transport. Connections that have been idle for longer than
+`CONFIG.REMOTE_SSH_IDLE_TIMEOUT` seconds (or have been dropped by the remote) are
+replaced on next use.
+
+The modification times of many files on the same host are fetched with a single
+remote `stat` command (see `stat_remote_files`), and batches of files are
+transferred in parallel by up to `CONFIG.REMOTE_TRANSFER_CONCURRENCY` threads
+(see `fetch_remote_files`). For remote filesystems with `delta_sync` enabled, files
+that have only been appended to since they were last synced (e.g., the data files of
+running experiments) are updated by transferring just the appended bytes.
+
+"""
+
+import atexit
+import contextlib
+import datetime
+import hashlib
+import os
+import shlex
+import shutil
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from pydatalab.config import CONFIG
+from pydatalab.logger import LOGGER
+
+__all__ = (
+    "SSHConnectionPool",
+    "get_pool",
+    "close_pools",
+    "split_remote_path",
+    "stat_remote_files",
+    "Transfer",
+    "TransferResult",
+    "fetch_remote_file",
+    "fetch_remote_files",
+)
+
+_STAT_BATCH_SIZE = 200
+"""The maximum number of paths passed to a single remote `stat` command."""
+
+
+def split_remote_path(remote_path: str) -> Tuple[str, str]:
+    r"""Split a remote path of the form `ssh://[user@]host:path` into the host and
+    the path on that host, unescaping any spaces escaped in the directory listing
+    (e.g., `"ssh://host:/path\ to\ file"` becomes `("ssh://host", "/path to file")`).
+
+    Raises:
+        ValueError: If the path is not an SSH remote path.
+
+    """
+    if not remote_path.startswith("ssh://") or ":" not in remote_path[len("ssh://") :]:
+        raise ValueError(f"Not a remote path of the form 'ssh://host:path': {remote_path!r}")
+    hostname, path = remote_path[len("ssh://") :].split(":", 1)
+    return f"ssh://{hostname}", path.replace(r"\ ", " ")
+
+
+def _resolve_host(hostname: str) -> Dict[str, Any]:
+    """Returns the connection arguments for the given host, as configured in `~/.ssh/config`."""
+    from paramiko.config import SSHConfig
+
+    url = urllib.parse.urlsplit(hostname if "://" in hostname else f"ssh://{hostname}")
+    alias = url.hostname or hostname
+
+    ssh_cfg: Dict[str, Any] = {}
+    ssh_config_path = Path.home() / ".ssh" / "config"
+    if ssh_config_path.exists():
+        ssh_cfg = dict(SSHConfig.from_path(str(ssh_config_path.resolve())).lookup(alias))
+
+    return {
+        "hostname": ssh_cfg.get("hostname", alias),
+        "port": url.port or int(ssh_cfg.get("port", 22)),
+        "username": url.username or ssh_cfg.get("user", None),
+        "key_filename": ssh_cfg.get("identityfile", None),
+    }
+
+
+class _PooledConnection:
+    """An open SSH connection, alongside its (lazily opened) SFTP session."""
+
+    def __init__(self, client: Any):
+        self.client = client
+        self.last_used = time.monotonic()
+        self._sftp: Any = None
+
+    @property
+    def is_active(self) -> bool:
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def sftp(self) -> Any:
+        if self._sftp is None:
+            self._sftp = self.client.open_sftp()
+            self._sftp.get_channel().settimeout(CONFIG.REMOTE_SSH_TIMEOUT)
+        return self._sftp
+
+    def run(self, command: str) -> Tuple[int, str, str]:
+        """Run a command on the remote, returning its exit status, stdout and stderr."""
+        _, stdout, stderr = self.client.exec_command(command, timeout=CONFIG.REMOTE_SSH_TIMEOUT)
+        output = stdout.read().decode("utf-8", errors="replace")
+        errors = stderr.read().decode("utf-8", errors="replace")
+        return stdout.channel.recv_exit_status(), output, errors
+
+    def close(self) -> None:
+        with contextlib.suppress(Exception):
+            if self._sftp is not None:
+                self._sftp.close()
+            self.client.close()
+
+
+class SSHConnectionPool:
+    """A pool of persistent SSH connections to a single host, shared between threads.
+
+    At most `CONFIG.REMOTE_SSH_POOL_SIZE` connections are open (or being opened) at a
+    time; further requests for a connection wait until one is returned to the pool.
+    Each lease lasts for a single remote command or transfer, and stalled operations
+    time out after `CONFIG.REMOTE_SSH_TIMEOUT` seconds, so waiting requests are not
+    blocked indefinitely.
+
+    """
+
+    def __init__(self, hostname: str):
+        self.hostname = hostname
+        self._idle: List[_PooledConnection] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(CONFIG.REMOTE_SSH_POOL_SIZE, 1))
+
+    def _connect(self) -> _PooledConnection:
+        from paramiko.client import SSHClient
+
+        LOGGER.debug("Opening SSH connection to %s", self.hostname)
+        client = SSHClient()
+        client.load_system_host_keys()
+        client.connect(
+            **_resolve_host(self.hostname),
+            timeout=CONFIG.REMOTE_SSH_TIMEOUT,
+            banner_timeout=CONFIG.REMOTE_SSH_TIMEOUT,
+            auth_timeout=CONFIG.REMOTE_SSH_TIMEOUT,
+        )
+        return _PooledConnection(client)
+
+    def _checkout(self) -> _PooledConnection:
+        """Returns the most recently used idle connection that is still usable,
+        closing any stale connections, or opens a new one.
+
+        """
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection = self._idle.pop()
+            if (
+                time.monotonic() - connection.last_used < CONFIG.REMOTE_SSH_IDLE_TIMEOUT
+                and connection.is_active
+            ):
+                return connection
+            connection.close()
+
+        return self._connect()
+
+    @contextlib.contextmanager
+    def connection(self) -> Iterator[_PooledConnection]:
+        """Lease a connection from the pool for the duration of the context, waiting
+        for one to become available if all are in use.
+
+        """
+        self._slots.acquire()
+        connection = None
+        try:
+            connection = self._checkout()
+            yield connection
+        finally:
+            if connection is not None:
+                if connection.is_active:
+                    connection.last_used = time.monotonic()
+                    with self._lock:
+                        self._idle.append(connection)
+                else:
+                    connection.close()
+            self._slots.release()
+
+    def close(self) -> None:
+        """Close all idle connections in the pool."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+
+_POOLS: Dict[str, SSHConnectionPool] = {}
+_POOLS_PID: Optional[int] = None
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(hostname: str) -> SSHConnectionPool:
+    """Returns the connection pool for the given host in this process, creating it if required.
+
+    Pools are not shared with forked processes (e.g., server workers), as
+    their connections cannot be used safely from more than one process.
+
+    """
+    global _POOLS_PID
+    with _POOLS_LOCK:
+        if _POOLS_PID != os.getpid():
+            _POOLS.clear()
+            _POOLS_PID = os.getpid()
+        if hostname not in _POOLS:
+            _POOLS[hostname] = SSHConnectionPool(hostname)
+        return _POOLS[hostname]
+
+
+@atexit.register
+def close_pools() -> None:
+    """Close the connections of all pools in this process."""
+    with _POOLS_LOCK:
+        if _POOLS_PID != os.getpid():
+            return
+        pools = list(_POOLS.values())
+    for pool in pools:
+        pool.close()
+
+
+def stat_remote_files(
+    hostname: str, paths: Iterable[str]
+) -> Dict[str, Optional[datetime.datetime]]:
+    """Returns the last modified time of each of the given files on the host, fetched
+    with a single remote `stat` command per batch of `_STAT_BATCH_SIZE` paths.
+
+    Parameters:
+        hostname: The remote host, e.g., `ssh://host`.
+        paths: The (unescaped) paths of the files on the host.
+
+    Raises:
+        RuntimeError: If the host cannot be reached.
+
+    Returns:
+        A dictionary of the last modified time of each path, or `None` for paths
+        that could not be accessed.
+
+    """
+    results: Dict[str, Optional[datetime.datetime]] = {path: None for path in paths}
+    batches = [
+        list(results)[i : i + _STAT_BATCH_SIZE] for i in range(0, len(results), _STAT_BATCH_SIZE)
+    ]
+    try:
+        with get_pool(hostname).connection() as connection:
+            for batch in batches:
+                command = "stat -c '%Y %n' -- " + " ".join(shlex.quote(path) for path in batch)
+                LOGGER.debug("Calling remote stat on %s paths on %s", len(batch), hostname)
+                _, stdout, stderr = connection.run(command)
+                if stderr:
+                    LOGGER.debug("Remote stat on %s returned errors: %s", hostname, stderr)
+                for line in stdout.splitlines():
+                    timestamp, _, path = line.partition(" ")
+                    if path in results and timestamp.isdigit():
+                        results[path] = datetime.datetime.fromtimestamp(int(timestamp))
+    except RuntimeError:
+        raise
+    except Exception as exc:
+        raise RuntimeError(f"Unable to stat files on {hostname}: {exc!r}") from exc
+
+    return results
+
+
+class Transfer(NamedTuple):
+    """A file to copy from a remote host (or a locally mounted filesystem)."""
+
+    hostname: Optional[str]
+    """The remote host, e.g., `ssh://host`, or `None` for a locally mounted filesystem."""
+
+    path: str
+    """The (unescaped) path of the file on the host."""
+
+    destination: Union[str, Path]
+    """The local path to copy the file to."""
+
+    previous: Optional[Union[str, Path]] = None
+    """The local path of a previously synced copy of the file, if only the bytes appended
+    since that copy was made should be transferred (see `fetch_remote_file`)."""
+
+
+class TransferResult(NamedTuple):
+    """The outcome of a `Transfer`."""
+
+    bytes_transferred: int = 0
+    """The number of bytes of file contents read from the host."""
+
+    delta: bool = False
+    """Whether only the bytes appended since the previous copy were transferred."""
+
+    error: Optional[Exception] = None
+    """The error raised by a failed transfer, if any."""
+
+
+def _hash_range(f: IO[bytes], offset: int, length: int) -> str:
+    """Returns the SHA-256 hex digest of `length` bytes of the open file from `offset`."""
+    hasher = hashlib.sha256()
+    f.seek(offset)
+    while length > 0:
+        chunk = f.read(min(length, CONFIG.UPLOAD_CHUNK_SIZE))
+        if not chunk:
+            break
+        hasher.update(chunk)
+        length -= len(chunk)
+    return hasher.hexdigest()
+
+
+def _check_windows(size: int) -> List[Tuple[int, int]]:
+    """Returns the offsets and lengths of the head and tail of a file of the given size
+    that are compared to detect whether it has only been appended to.
+
+    """
+    length = min(size, CONFIG.REMOTE_DELTA_CHECK_BYTES)
+    return [(0, length), (size - length, length)]
+
+
+def _remote_digests(
+    connection: _PooledConnection, path: str, windows: List[Tuple[int, int]]
+) -> Optional[List[str]]:
+    """Hash the given byte ranges of a remote file on the remote itself, such that
+    they need not be transferred, returning `None` if this is not possible.
+
+    """
+    quoted = shlex.quote(path)
+    command = "; ".join(
+        f"tail -c +{offset + 1} -- {quoted} | head -c {length} | sha256sum"
+        for offset, length in windows
+    )
+    try:
+        status, stdout, _ = connection.run(command)
+    except Exception as exc:
+        LOGGER.debug("Unable to hash %s remotely: %s", path, exc)
+        return None
+    digests = [line.split()[0] for line in stdout.splitlines() if line.strip()]
+    if status != 0 or len(digests) != len(windows):
+        return None
+    return digests
+
+
+def _is_appended(
+    source: IO[bytes],
+    previous: Path,
+    previous_size: int,
+    connection: Optional[_PooledConnection],
+    path: str,
+) -> bool:
+    """Returns whether the source file starts with the contents of the previous copy,
+    judging by the hashes of the head and tail of the previous copy.
+
+    """
+    windows = _check_windows(previous_size)
+    with open(previous, "rb") as f:
+        local_digests = [_hash_range(f, offset, length) for offset, length in windows]
+
+    remote_digests = None
+    if connection is not None:
+        remote_digests = _remote_digests(connection, path, windows)
+    if remote_digests is None:
+        remote_digests = [_hash_range(source, offset, length) for offset, length in windows]
+
+    return local_digests == remote_digests
+
+
+def fetch_remote_file(
+    hostname: Optional[str],
+    path: str,
+    destination: Union[str, Path],
+    previous: Optional[Union[str, Path]] = None,
+) -> TransferResult:
+    """Copy a single file from the host (over SFTP) or from a locally mounted filesystem
+    to the local destination.
+
+    If a `previous` copy of the file is given, and the file has only grown since that copy
+    was made (e.g., an instrument is appending to a data file), then only the appended bytes
+    are transferred: the previous copy is copied locally to the destination and the new
+    bytes are appended to it. Appending is detected by comparing the hashes of the first and
+    last `CONFIG.REMOTE_DELTA_CHECK_BYTES` bytes of the previous copy with the same ranges
+    of the file on the host (hashed on the host, where possible); otherwise, the whole file
+    is transferred.
+
+    Raises:
+        RuntimeError: If the file could not be copied.
+
+    """
+    LOGGER.debug("Fetching %s from %s to %s", path, hostname or "local filesystem", destination)
+    try:
+        with contextlib.ExitStack() as stack:
+            connection: Optional[_PooledConnection] = None
+            if hostname:
+                connection = stack.enter_context(get_pool(hostname).connection())
+                source: IO[bytes] = stack.enter_context(connection.sftp().open(path, "rb"))
+                size = source.stat().st_size
+            else:
+                source = stack.enter_context(open(path, "rb"))
+                size = os.fstat(source.fileno()).st_size
+
+            offset = 0
+            previous_size = (
+                os.path.getsize(previous) if previous and os.path.isfile(previous) else 0
+            )
+            if (
+                previous
+                and 0 < previous_size < size
+                and _is_appended(source, Path(previous), previous_size, connection, path)
+            ):
+                shutil.copyfile(previous, destination)
+                offset = previous_size
+
+            source.seek(offset)
+            if connection is not None:
+                source.prefetch(size)  # type: ignore[attr-defined]
+
+            transferred = 0
+            with open(destination, "ab" if offset else "wb") as f:
+                while transferred < size - offset:
+                    chunk = source.read(min(CONFIG.UPLOAD_CHUNK_SIZE, size - offset - transferred))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    transferred += len(chunk)
+
+    except RuntimeError:
+        raise
+    except Exception as exc:
+        raise RuntimeError(
+            f"Unable to copy {path!r} from {hostname or 'local filesystem'}: {exc!r}"
+        ) from exc
+
+    if offset:
+        LOGGER.debug("Appended %s bytes to the previous %s bytes of %s", transferred, offset, path)
+
+    return TransferResult(bytes_transferred=transferred, delta=bool(offset))
+
+
+def fetch_remote_files(transfers: Iterable[Transfer]) -> Dict[str, TransferResult]:
+    """Copy many files from their hosts in parallel, as for `fetch_remote_file`, with at
+    most `CONFIG.REMOTE_TRANSFER_CONCURRENCY` transfers in progress at a time.
+
+    Transfers from the same SSH host share its pool of `CONFIG.REMOTE_SSH_POOL_SIZE`
+    connections, so no more workers are started than can make progress at once;
+    transfers from locally mounted filesystems are limited only by the concurrency.
+
+    Parameters:
+        transfers: The files to copy.
+
+    Returns:
+        A dictionary of the result of the transfer to each destination, including the
+        error raised for any failed transfers.
+
+    """
+    transfers = [Transfer(*transfer) for transfer in transfers]
+    if not transfers:
+        return {}
+
+    def transfer(args: Transfer) -> TransferResult:
+        try:
+            return fetch_remote_file(*args)
+        except RuntimeError as exc:
+            return TransferResult(error=exc)
+
+    per_host: Dict[Optional[str], int] = {}
+    for args in transfers:
+        per_host[args.hostname] = per_host.get(args.hostname, 0) + 1
+    useful_workers = sum(
+        count if hostname is None else min(count, max(CONFIG.REMOTE_SSH_POOL_SIZE, 1))
+        for hostname, count in per_host.items()
+    )
+    workers = max(1, min(CONFIG.REMOTE_TRANSFER_CONCURRENCY, useful_workers))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(transfer, transfers))
+
+    return {str(args.destination): result for args, result in zip(transfers, results)}
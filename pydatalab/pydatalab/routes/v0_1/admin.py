@@ -3,8 +3,10 @@ from flask import Blueprint, jsonify, request
 from flask_login import current_user
 
 from pydatalab.config import CONFIG
+from pydatalab.login import invalidate_user_cache
 from pydatalab.mongo import flask_mongo
 from pydatalab.permissions import admin_only, get_default_permissions
+from pydatalab.streaming import stream_ndjson, wants_ndjson
 
 ADMIN = Blueprint("admins", __name__)
 
@@ -41,6 +43,9 @@ def get_users():
         ]
     )
 
+    if wants_ndjson():
+        return stream_ndjson(users)
+
     return jsonify({"status": "success", "data": list(users)})
 
 
@@ -73,10 +78,12 @@ def save_role(user_id):
 
         new_user_role = {"_id": ObjectId(user_id), **user_role}
         flask_mongo.db.roles.insert_one(new_user_role)
+        invalidate_user_cache(user_id)
 
         return (jsonify({"status": "success", "message": "New user's role created."}), 201)
 
     update_result = flask_mongo.db.roles.update_one({"_id": ObjectId(user_id)}, {"$set": user_role})
+    invalidate_user_cache(user_id)
 
     if update_result.matched_count != 1:
         return (jsonify({"status": "error", "message": "Unable to update user."}), 400)
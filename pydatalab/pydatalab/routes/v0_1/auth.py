@@ -25,7 +25,7 @@ from flask_login.utils import LocalProxy
 from pydatalab.config import CONFIG
 from pydatalab.errors import UserRegistrationForbidden
 from pydatalab.logger import LOGGER, logged_route
-from pydatalab.login import get_by_id
+from pydatalab.login import get_by_id, invalidate_user_cache
 from pydatalab.models.people import AccountStatus, Identity, IdentityType, Person
 from pydatalab.mongo import flask_mongo, insert_pydantic_model_fork_safe
 from pydatalab.send_email import send_mail
@@ -136,6 +136,7 @@ def find_user_with_identity(
                 {"_id": person.immutable_id},
                 {"$set": {f"identities.{identity_index}.verified": True}},
             )
+            invalidate_user_cache(person.immutable_id)
 
         return person
 
@@ -197,6 +198,7 @@ def find_create_or_modify_user(
             {"_id": ObjectId(user_id)},
             update,
         )
+        invalidate_user_cache(user_id)
 
         if result.matched_count != 1:
             raise RuntimeError(
@@ -498,6 +500,8 @@ def generate_user_api_key():
             {"$set": {"hash": sha512(new_key.encode("utf-8")).hexdigest()}},
             upsert=True,
         )
+        # Make sure that any previous key for this user stops working immediately
+        invalidate_user_cache(current_user.id)
         return jsonify({"key": new_key}), 200
     else:
         return (
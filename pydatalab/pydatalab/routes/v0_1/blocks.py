@@ -1,8 +1,11 @@
+import bson.errors
 import pymongo.errors
 from flask import Blueprint, jsonify, request
 
 from pydatalab.blocks import BLOCK_TYPES
 from pydatalab.blocks.base import DataBlock
+from pydatalab.blocks.jobs import defer_render, get_job
+from pydatalab.item_summaries import update_item_summaries
 from pydatalab.logger import LOGGER
 from pydatalab.mongo import flask_mongo
 from pydatalab.permissions import active_users_or_get_only, get_default_permissions
@@ -60,6 +63,8 @@ def add_data_block():
             400,
         )
 
+    update_item_summaries({"item_id": item_id})
+
     # get the new display_order:
     display_order_result = flask_mongo.db.items.find_one(
         {"item_id": item_id, **get_default_permissions(user_only=True)}, {"display_order": 1}
@@ -181,12 +186,18 @@ def update_block():
     out updated data. May be used, for example, when the user
     changes plot parameters and the server needs to generate a new
     plot.
+
+    If `background` is requested and the block is expensive to render, the
+    block will be rendered by a background job and the response will contain
+    the previous plot (if any) and the job details under `render_job`, with
+    status code 202.
     """
 
     request_json = request.get_json()
     block_data = request_json["block_data"]
     blocktype = block_data["blocktype"]
     save_to_db = request_json.get("save_to_db", False)
+    background = request_json.get("background", False)
 
     block = BLOCK_TYPES[blocktype].from_web(block_data)
 
@@ -194,6 +205,18 @@ def update_block():
     if save_to_db:
         saved_successfully = _save_block_to_db(block)
 
+    if background:
+        deferred_block_data = defer_render(block, save_to_db=save_to_db)
+        if deferred_block_data is not None:
+            return (
+                jsonify(
+                    status="success",
+                    saved_successfully=saved_successfully,
+                    new_block_data=deferred_block_data,
+                ),
+                202,
+            )
+
     return (
         jsonify(
             status="success", saved_successfully=saved_successfully, new_block_data=block.to_web()
@@ -202,6 +225,23 @@ def update_block():
     )
 
 
+@BLOCKS.route("/jobs/<job_id>", methods=["GET"])
+def get_render_job(job_id):
+    """Returns the status and progress of a background render job, along with
+    the rendered block data once it has finished.
+
+    """
+    try:
+        job = get_job(job_id)
+    except bson.errors.InvalidId:
+        job = None
+
+    if job is None:
+        return jsonify(status="error", message=f"No job found with ID {job_id!r}."), 404
+
+    return jsonify(status="success", job=job), 200
+
+
 @BLOCKS.route("/delete-block/", methods=["POST"])
 def delete_block():
     """Completely delete a data block from the database. In the future,
@@ -232,6 +272,9 @@ def delete_block():
             ),
             400,
         )
+
+    update_item_summaries({"item_id": item_id})
+
     return (
         jsonify({"status": "success"}),
         200,
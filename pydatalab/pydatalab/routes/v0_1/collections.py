@@ -7,9 +7,16 @@ from pydantic import ValidationError
 from pymongo.results import InsertOneResult, UpdateResult
 
 from pydatalab.config import CONFIG
+from pydatalab.edges import delete_collection_edges, update_item_edges
+from pydatalab.item_graph import invalidate_graph_cache
+from pydatalab.item_summaries import (
+    update_collection_member_summaries,
+    update_item_summaries,
+)
 from pydatalab.logger import logged_route
 from pydatalab.models.collections import Collection
 from pydatalab.mongo import flask_mongo
+from pydatalab.pagination import get_listing_parameters
 from pydatalab.permissions import active_users_or_get_only, get_default_permissions
 from pydatalab.routes.v0_1.items import creators_lookup, get_samples_summary
 
@@ -21,18 +28,45 @@ COLLECTIONS = Blueprint("collections", __name__)
 def _(): ...
 
 
+COLLECTION_LISTING_FIELDS = (
+    "collection_id",
+    "title",
+    "description",
+    "last_modified",
+    "creator_ids",
+    "creators",
+)
+"""The fields of collections that can be requested from `/collections`."""
+
+
 @COLLECTIONS.route("/collections")
 def get_collections():
-    collections = flask_mongo.db.collections.aggregate(
-        [
-            {"$match": get_default_permissions(user_only=True)},
-            {"$lookup": creators_lookup()},
-            {"$project": {"_id": 0}},
-            {"$sort": {"_id": -1}},
-        ]
-    )
+    try:
+        listing = get_listing_parameters(
+            sort_fields=("last_modified",),
+            fields=COLLECTION_LISTING_FIELDS,
+            date_field="last_modified",
+            creator_filter=True,
+        )
+    except ValueError as exc:
+        return jsonify(status="error", message=str(exc)), 400
+
+    pipeline = [
+        {"$match": {"$and": [get_default_permissions(user_only=True), listing.query()]}},
+        {"$sort": dict(listing.sort_spec)},
+    ]
+    if listing.limit is not None:
+        pipeline.append({"$limit": listing.limit + 1})
+    pipeline.append({"$lookup": creators_lookup()})
+    if listing.fields is not None:
+        pipeline.append({"$project": listing.project({k: 1 for k in COLLECTION_LISTING_FIELDS})})
+
+    collections, next_cursor = listing.paginate(flask_mongo.db.collections.aggregate(pipeline))
 
-    return jsonify({"status": "success", "data": list(collections)})
+    response = {"status": "success", "data": collections}
+    if listing.limit is not None:
+        response["next_cursor"] = next_cursor
+    return jsonify(response)
 
 
 @COLLECTIONS.route("/collections/<collection_id>", methods=["GET"])
@@ -182,6 +216,9 @@ def create_collection():
         )
 
         data_model.num_items = results.modified_count
+        update_item_summaries({"item_id": {"$in": list(item_ids)}})
+        update_item_edges({"item_id": {"$in": list(item_ids)}})
+        invalidate_graph_cache()
 
         if results.modified_count < len(starting_members):
             errors = [
@@ -273,16 +310,20 @@ def save_collection(collection_id):
             400,
         )
 
+    # Collection titles are shown in item graphs
+    invalidate_graph_cache()
+
     return jsonify(status="success"), 200
 
 
 @COLLECTIONS.route("/collections/<collection_id>", methods=["DELETE"])
 def delete_collection(collection_id: str):
-    result = flask_mongo.db.collections.delete_one(
-        {"collection_id": collection_id, **get_default_permissions(user_only=True)}
+    result = flask_mongo.db.collections.find_one_and_delete(
+        {"collection_id": collection_id, **get_default_permissions(user_only=True)},
+        projection={"_id": 1},
     )
 
-    if result.deleted_count != 1:
+    if result is None:
         return (
             jsonify(
                 {
@@ -292,6 +333,11 @@ def delete_collection(collection_id: str):
             ),
             401,
         )
+
+    update_collection_member_summaries(result["_id"])
+    delete_collection_edges(result["_id"])
+    invalidate_graph_cache()
+
     return (
         jsonify(
             {
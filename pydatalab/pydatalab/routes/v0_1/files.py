@@ -1,16 +1,23 @@
+import mimetypes
 import os
+import pathlib
+from urllib.parse import quote
 
 from bson import ObjectId
 from bson.errors import InvalidId
-from flask import Blueprint, jsonify, request, send_from_directory
+from flask import Blueprint, Response, current_app, jsonify, request, send_file, url_for
 from flask_login import current_user
 from pymongo import ReturnDocument
+from werkzeug.exceptions import NotFound
+from werkzeug.formparser import FormDataParser
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
 
 import pydatalab.mongo
 from pydatalab import file_utils
 from pydatalab.config import CONFIG
 from pydatalab.permissions import active_users_or_get_only, get_default_permissions
+from pydatalab.uploads import abort_upload, append_to_upload, create_upload, get_upload
 
 FILES = Blueprint("files", __name__)
 
@@ -20,17 +27,54 @@ FILES = Blueprint("files", __name__)
 def _(): ...
 
 
+def _offload_file(path: str, etag: str, stat_result: os.stat_result) -> Response:
+    """Returns an empty response that instructs the reverse proxy to send the file at `path`
+    (see `CONFIG.FILE_SENDFILE_MODE`), or a `304 Not Modified` response if the client's
+    cached copy is still valid.
+
+    """
+    response = current_app.response_class(
+        mimetype=mimetypes.guess_type(path)[0] or "application/octet-stream"
+    )
+    response.set_etag(etag)
+    response.last_modified = stat_result.st_mtime  # type: ignore
+    response.cache_control.no_cache = True
+    response.cache_control.private = True
+    response.make_conditional(request)
+    if response.status_code == 304:
+        return response
+
+    if CONFIG.FILE_SENDFILE_MODE == "x-accel-redirect":
+        relative_path = pathlib.Path(path).relative_to(CONFIG.FILE_DIRECTORY).as_posix()
+        response.headers["X-Accel-Redirect"] = quote(
+            f"{CONFIG.FILE_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{relative_path}"
+        )
+    else:
+        response.headers["X-Sendfile"] = path
+
+    return response
+
+
 @FILES.route("/files/<string:file_id>/<string:filename>", methods=["GET"])
 def get_file(file_id: str, filename: str):
+    """Serve a stored file (or a file derived from it, in the same directory).
+
+    Responses carry a strong `ETag`, derived from the SHA-256 hash of the file (or from
+    its revision, size and modification time, for files without a recorded hash), and
+    support conditional (`If-None-Match`, `If-Modified-Since`) and range requests.
+
+    """
     try:
         _file_id = ObjectId(file_id)
     except InvalidId:
         # If the ID is invalid, then there will be no results in the database anyway,
         # so just 401
         _file_id = file_id
-    if not pydatalab.mongo.flask_mongo.db.files.find_one(
-        {"_id": _file_id, **get_default_permissions(user_only=False)}
-    ):
+    file_info = pydatalab.mongo.flask_mongo.db.files.find_one(
+        {"_id": _file_id, **get_default_permissions(user_only=False)},
+        projection={"name": 1, "sha256": 1, "revision": 1},
+    )
+    if not file_info:
         return (
             jsonify(
                 {
@@ -41,8 +85,61 @@ def get_file(file_id: str, filename: str):
             ),
             401,
         )
-    path = os.path.join(CONFIG.FILE_DIRECTORY, secure_filename(file_id))
-    return send_from_directory(path, filename)
+
+    path = safe_join(os.path.join(CONFIG.FILE_DIRECTORY, secure_filename(file_id)), filename)
+    if path is None or not os.path.isfile(path):
+        raise NotFound()
+
+    stat_result = os.stat(path)
+    if filename == file_info.get("name") and file_info.get("sha256"):
+        etag = file_info["sha256"]
+    else:
+        etag = f"{file_id}-{file_info.get('revision') or 1}-{stat_result.st_size}-{stat_result.st_mtime_ns}"
+
+    if CONFIG.FILE_SENDFILE_MODE:
+        return _offload_file(path, etag, stat_result)
+
+    response = send_file(path, etag=etag, last_modified=stat_result.st_mtime, conditional=True)
+    response.cache_control.private = True
+    return response
+
+
+@FILES.route("/files/<string:file_id>/cycle-summary", methods=["GET"])
+def get_file_cycle_summary(file_id: str):
+    """Returns the stored summary of each cycle for the current revision of an
+    electrochemical cycling file, if it has been computed.
+
+    """
+    from pydatalab.apps.echem.summary import get_cycle_summary
+
+    try:
+        _file_id = ObjectId(file_id)
+    except InvalidId:
+        return jsonify({"status": "error", "detail": f"Invalid file ID {file_id!r}"}), 400
+
+    file_info = pydatalab.mongo.flask_mongo.db.files.find_one(
+        {"_id": _file_id, **get_default_permissions(user_only=False)}, projection={"revision": 1}
+    )
+    if not file_info:
+        return (
+            jsonify(
+                {
+                    "status": "error",
+                    "title": "Not Authorized",
+                    "detail": "Authorization required to access file",
+                }
+            ),
+            401,
+        )
+
+    summary = get_cycle_summary(_file_id, revision=file_info.get("revision"))
+    if not summary:
+        return (
+            jsonify({"status": "error", "detail": "No cycle summary available for this file"}),
+            404,
+        )
+
+    return jsonify({"status": "success", "cycle_summary": summary}), 200
 
 
 @FILES.route("/upload-file/", methods=["POST"])
@@ -63,43 +160,218 @@ def upload():
             401,
         )
 
-    if len(request.files) == 0:
-        return jsonify(error="No file in request"), 400
-    if "item_id" not in request.form:
-        return jsonify(error="No item id provided in form"), 400
-    item_id = request.form["item_id"]
-    replace_file_id = request.form["replace_file"]
+    # Check the (upper bound) request size against the available space before the
+    # request body is read
+    if request.content_length:
+        file_utils.check_space_available(request.content_length)
+
+    # Parse the multipart body ourselves, so that uploaded files are streamed straight
+    # into the file store rather than being spooled to a temporary file by werkzeug
+    # and then copied
+    targets: list[file_utils.UploadTarget] = []
+    parser = FormDataParser(
+        file_utils.upload_stream_factory(targets),
+        max_form_memory_size=request.max_form_memory_size,
+        max_content_length=request.max_content_length,
+        max_form_parts=request.max_form_parts,
+        cls=request.parameter_storage_class,
+    )
+    try:
+        _, form, files = parser.parse(
+            request.stream, request.mimetype, request.content_length, request.mimetype_params
+        )
+
+        if len(files) == 0:
+            return jsonify(error="No file in request"), 400
+        if "item_id" not in form:
+            return jsonify(error="No item id provided in form"), 400
+        item_id = form["item_id"]
+        replace_file_id = form["replace_file"]
+
+        if not CONFIG.TESTING:
+            creator_id = current_user.person.immutable_id
+        else:
+            creator_id = ObjectId(24 * "0")
+
+        is_update = replace_file_id and replace_file_id != "null"
+        for filekey in files:  # pretty sure there is just 1 per request
+            file = files[
+                filekey
+            ]  # just a weird thing about the request that comes from uppy. The key is "files[]"
+            if is_update:
+                file_information = file_utils.update_uploaded_file(file, ObjectId(replace_file_id))
+            else:
+                file_information = file_utils.save_uploaded_file(
+                    file, item_ids=[item_id], creator_ids=[creator_id]
+                )
+    finally:
+        for target in targets:
+            target.discard()
+
+    return (
+        jsonify(
+            {
+                "status": "success",
+                "file_id": str(file_information["_id"]),
+                "file_information": file_information,
+                "is_update": is_update,  # true if update, false if new file
+            }
+        ),
+        201,
+    )
+
+
+def _upload_headers(upload: dict) -> dict:
+    return {
+        "Upload-Offset": str(upload["offset"]),
+        "Upload-Length": str(upload["size"]),
+        "Cache-Control": "no-store",
+    }
+
+
+def _get_upload_id(upload_id: str) -> ObjectId | None:
+    try:
+        return ObjectId(upload_id)
+    except InvalidId:
+        return None
+
+
+@FILES.route("/uploads/", methods=["POST"])
+def create_resumable_upload():
+    """Start a resumable upload of a new file, to be attached to the given item.
+
+    The JSON body must provide the `item_id`, `filename` and total `size` (in bytes)
+    of the file. The bytes of the file are then sent to the returned upload URL by
+    one or more `PATCH` requests, each starting at the `Upload-Offset` of the upload.
+
+    """
+    if not current_user.is_authenticated and not CONFIG.TESTING:
+        return (
+            jsonify(
+                {
+                    "status": "error",
+                    "title": "Not Authorized",
+                    "detail": "File upload requires login.",
+                }
+            ),
+            401,
+        )
+
+    request_json = request.get_json()
+    item_id = request_json.get("item_id")
+    filename = request_json.get("filename")
+    size = request_json.get("size")
+    if not item_id or not filename or not isinstance(size, int):
+        return (
+            jsonify(
+                status="error",
+                message="An `item_id`, `filename` and integer `size` must be provided.",
+            ),
+            400,
+        )
 
     if not CONFIG.TESTING:
         creator_id = current_user.person.immutable_id
     else:
         creator_id = ObjectId(24 * "0")
 
-    is_update = replace_file_id and replace_file_id != "null"
-    for filekey in request.files:  # pretty sure there is just 1 per request
-        file = request.files[
-            filekey
-        ]  # just a weird thing about the request that comes from uppy. The key is "files[]"
-        if is_update:
-            file_information = file_utils.update_uploaded_file(file, ObjectId(replace_file_id))
-        else:
-            file_information = file_utils.save_uploaded_file(
-                file, item_ids=[item_id], creator_ids=[creator_id]
-            )
+    try:
+        upload = create_upload(
+            filename,
+            size,
+            item_ids=[item_id],
+            creator_ids=[creator_id],
+            last_modified=request_json.get("last_modified"),
+        )
+    except ValueError as exc:
+        return jsonify(status="error", message=str(exc)), 400
+
+    upload_id = str(upload["_id"])
+    headers = _upload_headers(upload)
+    headers["Location"] = url_for(".upload_status", upload_id=upload_id)
+    return (
+        jsonify(status="success", upload_id=upload_id, offset=upload["offset"], size=size),
+        201,
+        headers,
+    )
+
+
+@FILES.route("/uploads/<string:upload_id>", methods=["GET"])
+def upload_status(upload_id: str):
+    """Returns the current offset of a resumable upload (also available via `HEAD`
+    in the `Upload-Offset` header), from which it should be resumed.
+
+    """
+    upload = get_upload(_get_upload_id(upload_id))
+    if not upload:
+        return jsonify(status="error", message=f"No upload found with ID {upload_id!r}."), 404
+
+    return (
+        jsonify(
+            status="success", upload_id=upload_id, offset=upload["offset"], size=upload["size"]
+        ),
+        200,
+        _upload_headers(upload),
+    )
+
+
+@FILES.route("/uploads/<string:upload_id>", methods=["PATCH"])
+def append_upload(upload_id: str):
+    """Append the bytes in the request body to a resumable upload, at the offset given
+    by the `Upload-Offset` header.
+
+    Returns the new offset if more bytes are expected, or the metadata of the new file
+    once the upload is complete.
+
+    """
+    _upload_id = _get_upload_id(upload_id)
+    upload = get_upload(_upload_id)
+    if not upload:
+        return jsonify(status="error", message=f"No upload found with ID {upload_id!r}."), 404
+
+    offset = request.headers.get("Upload-Offset", type=int)
+    if offset is None:
+        return jsonify(status="error", message="An `Upload-Offset` header is required."), 400
+    if offset != upload["offset"]:
+        return (
+            jsonify(
+                status="error",
+                message=f"Upload {upload_id!r} is at offset {upload['offset']}, not {offset}.",
+            ),
+            409,
+            _upload_headers(upload),
+        )
+
+    upload, file_information = append_to_upload(_upload_id, offset, request.stream)
+
+    if file_information is None:
+        return "", 204, _upload_headers(upload)
 
     return (
         jsonify(
             {
                 "status": "success",
-                "file_id": str(file_information["_id"]),
+                "file_id": upload_id,
                 "file_information": file_information,
-                "is_update": is_update,  # true if update, false if new file
+                "is_update": False,
             }
         ),
         201,
+        _upload_headers(upload),
     )
 
 
+@FILES.route("/uploads/<string:upload_id>", methods=["DELETE"])
+def delete_upload(upload_id: str):
+    """Cancel an incomplete resumable upload, removing any bytes that were received."""
+    upload = get_upload(_get_upload_id(upload_id))
+    if not upload:
+        return jsonify(status="error", message=f"No upload found with ID {upload_id!r}."), 404
+
+    abort_upload(upload)
+    return jsonify(status="success"), 200
+
+
 @FILES.route("/add-remote-file-to-sample/", methods=["POST"])
 def add_remote_file_to_sample():
     if not current_user.is_authenticated and not CONFIG.TESTING:
@@ -187,6 +459,10 @@ def delete_file_from_sample():
             400,
         )
 
+    pydatalab.mongo.flask_mongo.db.cycle_summaries.update_one(
+        {"file_id": file_id}, {"$pull": {"item_ids": item_id}}
+    )
+
     return (
         jsonify(
             {
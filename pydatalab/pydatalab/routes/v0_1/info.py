@@ -10,8 +10,9 @@ from pydantic import AnyUrl, BaseModel, Field, validator
 
 from pydatalab import __version__
 from pydatalab.blocks import BLOCK_TYPES
+from pydatalab.blocks.render_cache import RENDER_CACHE_STATS
 from pydatalab.models import Person
-from pydatalab.mongo import flask_mongo
+from pydatalab.mongo import MONGO_POOL_STATS, flask_mongo
 
 from ._version import __api_version__
 
@@ -102,14 +103,22 @@ def get_info():
 
 @INFO.route("/info/stats", methods=["GET"])
 def get_stats():
-    """Returns a dictionary of counts of each entry type in the deployment"""
+    """Returns a dictionary of counts of each entry type in the deployment,
+    alongside the block render cache and database connection pool statistics
+    for the serving process."""
 
     user_count = flask_mongo.db.users.count_documents({})
     sample_count = flask_mongo.db.items.count_documents({"type": "samples"})
     cell_count = flask_mongo.db.items.count_documents({"type": "cells"})
 
     return (
-        jsonify({"counts": {"users": user_count, "samples": sample_count, "cells": cell_count}}),
+        jsonify(
+            {
+                "counts": {"users": user_count, "samples": sample_count, "cells": cell_count},
+                "render_cache": RENDER_CACHE_STATS,
+                "mongo_pool": MONGO_POOL_STATS,
+            }
+        ),
         200,
     )
 
@@ -1,22 +1,45 @@
+import concurrent.futures
+import copy
 import datetime
 import json
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Dict, List, Optional, Set, Union
 
+import pymongo.errors
 from bson import ObjectId
-from flask import Blueprint, jsonify, request
+from bson.errors import InvalidId
+from flask import Blueprint, copy_current_request_context, g, jsonify, request
 from flask_login import current_user
 from pydantic import ValidationError
 from pymongo.command_cursor import CommandCursor
+from pymongo.cursor import Cursor
 
 from pydatalab.blocks import BLOCK_TYPES
+from pydatalab.blocks.base import DataBlock
+from pydatalab.blocks.jobs import defer_render
 from pydatalab.config import CONFIG
+from pydatalab.edges import (
+    EDGE_COLLECTION,
+    delete_item_edges,
+    update_item_edges,
+    update_referencing_edges,
+)
+from pydatalab.item_graph import invalidate_graph_cache
+from pydatalab.item_summaries import (
+    ITEM_SUMMARY_COLLECTION,
+    delete_item_summaries,
+    update_item_summaries,
+)
 from pydatalab.logger import LOGGER
 from pydatalab.models import ITEM_MODELS
 from pydatalab.models.items import Item
 from pydatalab.models.relationships import RelationshipType
-from pydatalab.models.utils import generate_unique_refcode
+from pydatalab.models.utils import generate_unique_refcode, generate_unique_refcodes
 from pydatalab.mongo import flask_mongo
+from pydatalab.pagination import ListingParameters, get_listing_parameters
 from pydatalab.permissions import active_users_or_get_only, get_default_permissions
+from pydatalab.streaming import stream_ndjson, wants_ndjson
 
 ITEMS = Blueprint("items", __name__)
 
@@ -26,10 +49,37 @@ ITEMS = Blueprint("items", __name__)
 def _(): ...
 
 
+def _wait_for_block(future: Future, started_at: Dict[str, float], block_id: str) -> Dict:
+    """Wait for a block that is being rendered in a thread, raising a `TimeoutError`
+    if it does not finish within `CONFIG.BLOCK_RENDER_TIMEOUT` of when it started.
+
+    """
+    while True:
+        start = started_at.get(block_id)
+        if start is None:
+            # The block is still waiting for a free thread, which does not count towards its timeout
+            wait_time = 0.1
+        else:
+            wait_time = max(start + CONFIG.BLOCK_RENDER_TIMEOUT - time.monotonic(), 0)
+        try:
+            return future.result(timeout=wait_time)
+        except concurrent.futures.TimeoutError:
+            if start is not None:
+                raise
+
+
 def reserialize_blocks(display_order: List[str], blocks_obj: Dict[str, Dict]) -> Dict[str, Dict]:
     """Create the corresponding Python objects from JSON block data, then
     serialize it again as JSON to populate any missing properties.
 
+    Blocks are rendered concurrently in a pool of up to `CONFIG.BLOCK_RENDER_WORKERS`
+    threads, and any block that takes longer than `CONFIG.BLOCK_RENDER_TIMEOUT` is
+    returned without a plot and with an error.
+
+    Blocks that are expensive to render may instead be rendered by a background
+    job, if enabled, in which case their previous plot (if any) and the job details
+    will be returned (see `pydatalab.blocks.jobs.defer_render`).
+
     Parameters:
         blocks_obj: A dictionary containing the JSON block data, keyed by block ID.
 
@@ -37,6 +87,7 @@ def reserialize_blocks(display_order: List[str], blocks_obj: Dict[str, Dict]) ->
         A dictionary with the re-serialized block data.
 
     """
+    blocks: Dict[str, DataBlock] = {}
     for block_id in display_order:
         try:
             block_data = blocks_obj[block_id]
@@ -44,9 +95,56 @@ def reserialize_blocks(display_order: List[str], blocks_obj: Dict[str, Dict]) ->
             LOGGER.warning(f"block_id {block_id} found in display order but not in blocks_obj")
             continue
         blocktype = block_data["blocktype"]
-        blocks_obj[block_id] = (
-            BLOCK_TYPES.get(blocktype, BLOCK_TYPES["notsupported"]).from_db(block_data).to_web()
-        )
+        block = BLOCK_TYPES.get(blocktype, BLOCK_TYPES["notsupported"]).from_db(block_data)
+        deferred_block_data = defer_render(block)
+        if deferred_block_data is not None:
+            blocks_obj[block_id] = deferred_block_data
+        else:
+            blocks[block_id] = block
+
+    if len(blocks) <= 1 or CONFIG.BLOCK_RENDER_WORKERS <= 1:
+        for block_id, block in blocks.items():
+            blocks_obj[block_id] = block.to_web()
+        return blocks_obj
+
+    # Threads need their own copy of the request context, with the current user attached
+    user = current_user._get_current_object()
+    started_at: Dict[str, float] = {}
+
+    def _render(block: DataBlock) -> Dict:
+        g._login_user = user
+        started_at[block.block_id] = time.monotonic()
+        return block.to_web()
+
+    executor = ThreadPoolExecutor(
+        max_workers=min(CONFIG.BLOCK_RENDER_WORKERS, len(blocks)),
+        thread_name_prefix="block-render",
+    )
+    futures = {
+        block_id: executor.submit(copy_current_request_context(_render), block)
+        for block_id, block in blocks.items()
+    }
+    try:
+        for block_id, future in futures.items():
+            try:
+                blocks_obj[block_id] = _wait_for_block(future, started_at, block_id)
+            except concurrent.futures.TimeoutError:
+                block = blocks[block_id]
+                LOGGER.warning(
+                    "Rendering block %s timed out after %s seconds",
+                    block_id,
+                    CONFIG.BLOCK_RENDER_TIMEOUT,
+                )
+                block_data = {
+                    k: v for k, v in blocks_obj[block_id].items() if k != "bokeh_plot_data"
+                }
+                block_data["errors"] = [
+                    f"{block.__class__.__name__} timed out after {CONFIG.BLOCK_RENDER_TIMEOUT} seconds."
+                ]
+                blocks_obj[block_id] = block_data
+    finally:
+        # Do not wait for any timed out blocks to finish
+        executor.shutdown(wait=False, cancel_futures=True)
 
     return blocks_obj
 
@@ -81,6 +179,32 @@ def dereference_files(file_ids: List[Union[str, ObjectId]]) -> Dict[str, Dict]:
     return results
 
 
+def _listing_error(exc: ValueError):
+    return jsonify(status="error", message=str(exc)), 400
+
+
+def _listing_response(key: str, listing: ListingParameters, documents) -> Dict:
+    results, next_cursor = listing.paginate(documents)
+    response = {"status": "success", key: results}
+    if listing.limit is not None:
+        response["next_cursor"] = next_cursor
+    return response
+
+
+def _listing_pipeline(listing: ListingParameters, match: Dict, project: Dict) -> List[Dict]:
+    """Returns an aggregation pipeline that applies the listing options on top of the
+    given match and projection, sorting and limiting before any projection such that
+    the compound indexes on the sort fields can be used.
+
+    """
+    pipeline: List[Dict] = [{"$match": {"$and": [match, listing.query()]}}]
+    pipeline.append({"$sort": dict(listing.sort_spec)})
+    if listing.limit is not None:
+        pipeline.append({"$limit": listing.limit + 1})
+    pipeline.append({"$project": listing.project(project)})
+    return pipeline
+
+
 @ITEMS.route("/equipment/", methods=["GET"])
 def get_equipment_summary():
     _project = {
@@ -93,65 +217,91 @@ def get_equipment_summary():
         "location": 1,
     }
 
-    items = [
-        doc
-        for doc in flask_mongo.db.items.aggregate(
-            [
-                {
-                    "$match": {
-                        "type": "equipment",
-                    }
-                },
-                {"$project": _project},
-            ]
+    try:
+        listing = get_listing_parameters(
+            sort_fields=("date", "last_modified"),
+            fields=[k for k in _project if k != "_id"],
+            date_field="date",
         )
-    ]
-    return jsonify({"status": "success", "items": items})
+    except ValueError as exc:
+        return _listing_error(exc)
+
+    items = flask_mongo.db.items.aggregate(
+        _listing_pipeline(listing, {"type": "equipment"}, _project)
+    )
+    return jsonify(_listing_response("items", listing, items))
 
 
 @ITEMS.route("/starting-materials/", methods=["GET"])
 def get_starting_materials():
-    items = [
-        doc
-        for doc in flask_mongo.db.items.aggregate(
-            [
-                {
-                    "$match": {
-                        "type": "starting_materials",
-                        **get_default_permissions(user_only=False),
-                    }
-                },
-                {
-                    "$project": {
-                        "_id": 0,
-                        "item_id": 1,
-                        "nblocks": {"$size": "$display_order"},
-                        "date": 1,
-                        "chemform": 1,
-                        "name": 1,
-                        "chemical_purity": 1,
-                        "supplier": 1,
-                        "location": 1,
-                    }
-                },
-            ]
+    _project = {
+        "_id": 0,
+        "item_id": 1,
+        "nblocks": {"$size": "$display_order"},
+        "date": 1,
+        "chemform": 1,
+        "name": 1,
+        "chemical_purity": 1,
+        "supplier": 1,
+        "location": 1,
+    }
+
+    try:
+        listing = get_listing_parameters(
+            sort_fields=("date", "last_modified"),
+            fields=[k for k in _project if k != "_id"],
+            date_field="date",
         )
-    ]
-    return jsonify({"status": "success", "items": items})
+    except ValueError as exc:
+        return _listing_error(exc)
+
+    items = flask_mongo.db.items.aggregate(
+        _listing_pipeline(
+            listing,
+            {"type": "starting_materials", **get_default_permissions(user_only=False)},
+            _project,
+        )
+    )
+    if wants_ndjson():
+        return stream_ndjson(listing.iter_page(items.batch_size(CONFIG.STREAM_BATCH_SIZE)))
+    return jsonify(_listing_response("items", listing, items))
 
 
 get_starting_materials.methods = ("GET",)  # type: ignore
 
 
+SAMPLE_SUMMARY_FIELDS = (
+    "item_id",
+    "refcode",
+    "name",
+    "chemform",
+    "characteristic_chemical_formula",
+    "type",
+    "date",
+    "nblocks",
+    "creators",
+    "collections",
+)
+"""The fields of item summaries that can be requested from `/samples/`."""
+
+
 def get_samples_summary(
-    match: Optional[Dict] = None, project: Optional[Dict] = None
-) -> CommandCursor:
+    match: Optional[Dict] = None,
+    project: Optional[Dict] = None,
+    listing: Optional[ListingParameters] = None,
+) -> Union[Cursor, CommandCursor]:
     """Return a summary of item entries that match some criteria.
 
+    If `CONFIG.ITEM_SUMMARIES_ENABLED` is set, the summaries are read from the
+    materialized `item_summaries` collection (see `pydatalab.item_summaries`),
+    otherwise they are computed with an aggregation over the `items` collection.
+
     Parameters:
         match: A MongoDB aggregation match query to filter the results.
         project: A MongoDB aggregation project query to filter the results, relative
             to the default included below.
+        listing: Pagination, sorting and filtering options to apply (see `pydatalab.pagination`),
+            in which case the `_id` of each summary is also returned.
 
     """
     if not match:
@@ -187,6 +337,36 @@ def get_samples_summary(
             else:
                 _project[key] = 1
 
+    if listing is not None:
+        match = {"$and": [match, listing.query()]}
+        _project = listing.project(_project)
+        sort = listing.sort_spec
+    else:
+        sort = [("date", -1)]
+
+    if CONFIG.ITEM_SUMMARIES_ENABLED:
+        # The summaries already contain only the projected subfields, and the precomputed `nblocks`
+        _project = {key: 1 if isinstance(value, dict) else value for key, value in _project.items()}
+        return flask_mongo.db[ITEM_SUMMARY_COLLECTION].find(
+            match,
+            projection=_project,
+            sort=sort,
+            limit=listing.limit + 1 if listing and listing.limit is not None else 0,
+        )
+
+    if listing is not None:
+        pipeline: List[Dict] = [{"$match": match}, {"$sort": dict(sort)}]
+        if listing.limit is not None:
+            pipeline.append({"$limit": listing.limit + 1})
+        return flask_mongo.db.items.aggregate(
+            pipeline
+            + [
+                {"$lookup": creators_lookup()},
+                {"$lookup": collections_lookup()},
+                {"$project": _project},
+            ]
+        )
+
     return flask_mongo.db.items.aggregate(
         [
             {"$match": match},
@@ -249,11 +429,84 @@ def collections_lookup() -> Dict:
     }
 
 
-def _check_collections(sample_dict: dict) -> list[dict[str, str]]:
+def edges_lookups() -> List[Dict]:
+    """Returns the `$lookup` stages that find the edges into (`parent_edges`) and out of
+    (`child_edges`) the item in the edge index (see `pydatalab.edges`), such that the
+    parents and children of an item are resolved in the same aggregation as the item
+    itself, regardless of which item declared the relationship.
+
+    Each lookup is a single equality match on the `target` or `source` of the edges,
+    served by the corresponding edge index.
+
+    """
+    return [
+        {
+            "$lookup": {
+                "from": EDGE_COLLECTION,
+                "localField": "item_id",
+                "foreignField": field,
+                "as": f"{direction}_edges",
+            }
+        }
+        for field, direction in (("target", "parent"), ("source", "child"))
+    ]
+
+
+def _collection_query(c: dict) -> dict:
+    query = {}
+    query.update(c)
+    if "immutable_id" in c:
+        query["_id"] = ObjectId(query.pop("immutable_id"))
+    return query
+
+
+def _prefetch_collections(sample_dicts: List[dict]) -> List[dict]:
+    """Look up all of the collections referenced (by `collection_id` or `immutable_id`)
+    by the given item data with a single query, for use with `_check_collections`.
+
+    """
+    collection_ids = set()
+    immutable_ids = set()
+    for sample_dict in sample_dicts:
+        for c in sample_dict.get("collections") or []:
+            try:
+                query = _collection_query(c)
+            except (InvalidId, TypeError):
+                continue
+            if "_id" in query:
+                immutable_ids.add(query["_id"])
+            if "collection_id" in query:
+                collection_ids.add(query["collection_id"])
+
+    if not collection_ids and not immutable_ids:
+        return []
+
+    return list(
+        flask_mongo.db.collections.find(
+            {
+                "$or": [
+                    {"_id": {"$in": list(immutable_ids)}},
+                    {"collection_id": {"$in": list(collection_ids)}},
+                ],
+                **get_default_permissions(),
+            }
+        )
+    )
+
+
+def _check_collections(
+    sample_dict: dict, collections: Optional[List[dict]] = None
+) -> list[dict[str, str]]:
     """Loop through the provided collection metadata for the sample and
     return the list of references to store (i.e., just the `immutable_id`
     of the collection).
 
+    Parameters:
+        sample_dict: The item data containing the collection metadata.
+        collections: Collections that have already been looked up with the
+            appropriate permissions (see `_prefetch_collections`), which will be
+            searched before querying the database.
+
     Raises:
         ValueError: if any of the linked collections cannot be found in
         the database.
@@ -265,11 +518,17 @@ def _check_collections(sample_dict: dict) -> list[dict[str, str]]:
     """
     if sample_dict.get("collections", []):
         for ind, c in enumerate(sample_dict.get("collections", [])):
-            query = {}
-            query.update(c)
-            if "immutable_id" in c:
-                query["_id"] = ObjectId(query.pop("immutable_id"))
-            result = flask_mongo.db.collections.find_one({**query, **get_default_permissions()})
+            query = _collection_query(c)
+            result = next(
+                (
+                    collection
+                    for collection in collections or []
+                    if all(collection.get(k) == v for k, v in query.items())
+                ),
+                None,
+            )
+            if result is None:
+                result = flask_mongo.db.collections.find_one({**query, **get_default_permissions()})
             if not result:
                 raise ValueError(f"No collection found matching request: {c}")
             sample_dict["collections"][ind] = {"immutable_id": result["_id"]}
@@ -279,7 +538,22 @@ def _check_collections(sample_dict: dict) -> list[dict[str, str]]:
 
 @ITEMS.route("/samples/", methods=["GET"])
 def get_samples():
-    return jsonify({"status": "success", "samples": list(get_samples_summary())})
+    try:
+        listing = get_listing_parameters(
+            sort_fields=("date",),
+            fields=SAMPLE_SUMMARY_FIELDS,
+            date_field="date",
+            types=("samples", "cells"),
+            creator_filter=True,
+            collection_filter=True,
+        )
+    except ValueError as exc:
+        return _listing_error(exc)
+
+    samples = get_samples_summary(listing=listing)
+    if wants_ndjson():
+        return stream_ndjson(listing.iter_page(samples.batch_size(CONFIG.STREAM_BATCH_SIZE)))
+    return jsonify(_listing_response("samples", listing, samples))
 
 
 @ITEMS.route("/search-items/", methods=["GET"])
@@ -293,7 +567,8 @@ def search_items():
 
     Returns:
         response list of dictionaries containing the matching items in order of
-        descending match score.
+        descending match score, or the items as NDJSON if requested via the `Accept`
+        header (see `pydatalab.streaming`).
     """
 
     query = request.args.get("query", type=str)
@@ -327,17 +602,38 @@ def search_items():
         ]
     )
 
+    if wants_ndjson():
+        return stream_ndjson(cursor)
+
     return jsonify({"status": "success", "items": list(cursor)}), 200
 
 
-def _create_sample(
+def _prepare_new_item(
     sample_dict: dict,
+    refcode: str,
     copy_from_item_id: Optional[str] = None,
+    copied_doc: Optional[dict] = None,
     generate_id_automatically: bool = False,
-) -> tuple[dict, int]:
+    collections: Optional[List[dict]] = None,
+) -> tuple[Optional[Item], Optional[tuple[dict, int]]]:
+    """Validate the data for a new item, merging in any copied item and dereferencing
+    its collections, without writing to the database.
+
+    Parameters:
+        sample_dict: The data for the new item.
+        refcode: The refcode to assign to the new item.
+        copy_from_item_id: The ID of an item to copy data from, if any.
+        copied_doc: The database entry for `copy_from_item_id`, or `None` if it was not found.
+        generate_id_automatically: Whether to generate the `item_id` from the refcode.
+        collections: Candidate collections prefetched for `_check_collections`, if any.
+
+    Returns:
+        The validated item model, or `None` and the error response and HTTP status code.
+
+    """
     sample_dict["item_id"] = sample_dict.get("item_id", None)
     if generate_id_automatically and sample_dict["item_id"]:
-        return (
+        return None, (
             dict(
                 status="error",
                 messages=f"""Request to create item with generate_id_automatically = true is incompatible with the provided item data,
@@ -347,11 +643,9 @@ def _create_sample(
         )
 
     if copy_from_item_id:
-        copied_doc = flask_mongo.db.items.find_one({"item_id": copy_from_item_id})
-
         LOGGER.debug(f"Copying from pre-existing item {copy_from_item_id} with data:\n{copied_doc}")
         if not copied_doc:
-            return (
+            return None, (
                 dict(
                     status="error",
                     message=f"Request to copy item with id {copy_from_item_id} failed because item could not be found.",
@@ -360,11 +654,14 @@ def _create_sample(
                 404,
             )
 
+        # Copy the source document, as the same item may be copied multiple times in a batch
+        copied_doc = copy.deepcopy(copied_doc)
+
         # the provided item_id, name, and date take precedence over the copied parameters, if provided
         try:
             copied_doc["item_id"] = sample_dict["item_id"]
         except KeyError:
-            return (
+            return None, (
                 dict(
                     status="error",
                     message=f"Request to copy item with id {copy_from_item_id} to new item failed because the target new item_id was not provided.",
@@ -412,9 +709,9 @@ def _create_sample(
 
     try:
         # If passed collection data, dereference it and check if the collection exists
-        sample_dict["collections"] = _check_collections(sample_dict)
+        sample_dict["collections"] = _check_collections(sample_dict, collections=collections)
     except ValueError as exc:
-        return (
+        return None, (
             dict(
                 status="error",
                 message=f"Unable to create new item {sample_dict['item_id']!r} inside non-existent collection(s): {exc}",
@@ -461,31 +758,19 @@ def _create_sample(
             }
         ]
 
-    # Generate a unique refcode for the sample
-    new_sample["refcode"] = generate_unique_refcode()
+    new_sample["refcode"] = refcode
     if generate_id_automatically:
         new_sample["item_id"] = new_sample["refcode"].split(":")[1]
         LOGGER.debug(
             "an automatic item_id was generated for the new sample: {new_sample['item_id']}"
         )
 
-    # check to make sure that item_id isn't taken already
-    if flask_mongo.db.items.find_one({"item_id": sample_dict["item_id"]}):
-        return (
-            dict(
-                status="error",
-                message=f"item_id_validation_error: {sample_dict['item_id']!r} already exists in database.",
-                item_id=new_sample["item_id"],
-            ),
-            409,  # 409: Conflict
-        )
-
     new_sample["date"] = new_sample.get("date", datetime.datetime.now())
     try:
         data_model: Item = model(**new_sample)
 
     except ValidationError as error:
-        return (
+        return None, (
             dict(
                 status="error",
                 message=f"Unable to create new item with ID {new_sample['item_id']}: {str(error)}.",
@@ -495,22 +780,21 @@ def _create_sample(
             400,
         )
 
-    # Do not store the fields `collections` or `creators` in the database as these should be populated
-    # via joins for a specific query.
-    # TODO: encode this at the model level, via custom schema properties or hard-coded `.store()` methods
-    # the `Entry` model.
-    result = flask_mongo.db.items.insert_one(data_model.dict(exclude={"creators", "collections"}))
-    if not result.acknowledged:
-        return (
-            dict(
-                status="error",
-                message=f"Failed to add new item {new_sample['item_id']!r} to database.",
-                item_id=new_sample["item_id"],
-                output=result.raw_result,
-            ),
-            400,
-        )
+    return data_model, None
 
+
+def _duplicate_item_id_response(item_id: str) -> tuple[dict, int]:
+    return (
+        dict(
+            status="error",
+            message=f"item_id_validation_error: {item_id!r} already exists in database.",
+            item_id=item_id,
+        ),
+        409,  # 409: Conflict
+    )
+
+
+def _created_item_response(data_model: Item) -> tuple[dict, int]:
     sample_list_entry = {
         "refcode": data_model.refcode,
         "item_id": data_model.item_id,
@@ -548,6 +832,146 @@ def _create_sample(
     return data
 
 
+def _create_sample(
+    sample_dict: dict,
+    copy_from_item_id: Optional[str] = None,
+    generate_id_automatically: bool = False,
+) -> tuple[dict, int]:
+    copied_doc = None
+    if copy_from_item_id:
+        copied_doc = flask_mongo.db.items.find_one({"item_id": copy_from_item_id})
+
+    data_model, error = _prepare_new_item(
+        sample_dict,
+        # Generate a unique refcode for the sample
+        refcode=generate_unique_refcode(),
+        copy_from_item_id=copy_from_item_id,
+        copied_doc=copied_doc,
+        generate_id_automatically=generate_id_automatically,
+    )
+    if error is not None:
+        return error
+
+    # check to make sure that item_id isn't taken already
+    if flask_mongo.db.items.find_one({"item_id": data_model.item_id}):
+        return _duplicate_item_id_response(data_model.item_id)
+
+    # Do not store the fields `collections` or `creators` in the database as these should be populated
+    # via joins for a specific query.
+    # TODO: encode this at the model level, via custom schema properties or hard-coded `.store()` methods
+    # the `Entry` model.
+    result = flask_mongo.db.items.insert_one(data_model.dict(exclude={"creators", "collections"}))
+    if not result.acknowledged:
+        return (
+            dict(
+                status="error",
+                message=f"Failed to add new item {data_model.item_id!r} to database.",
+                item_id=data_model.item_id,
+                output=result.raw_result,
+            ),
+            400,
+        )
+
+    update_item_summaries({"_id": result.inserted_id})
+    update_item_edges({"_id": result.inserted_id})
+    update_referencing_edges({"_id": result.inserted_id})
+    invalidate_graph_cache()
+
+    return _created_item_response(data_model)
+
+
+def _create_samples_in_bulk(
+    sample_dicts: List[dict],
+    copy_from_item_ids: List[Optional[str]],
+    generate_ids_automatically: bool = False,
+) -> List[tuple[dict, int]]:
+    """Create multiple items with a fixed number of database round-trips,
+    returning the response and HTTP status code for each item.
+
+    All items are first validated, with their copy sources, collections and
+    existing duplicate item IDs each looked up with a single query and their
+    refcodes allocated as a batch. The valid items are then written with a single
+    unordered `insert_many`, such that a failure to insert one item does not
+    prevent the others from being created.
+
+    """
+    copy_ids = {item_id for item_id in copy_from_item_ids if item_id}
+    copied_docs = {}
+    if copy_ids:
+        copied_docs = {
+            doc["item_id"]: doc
+            for doc in flask_mongo.db.items.find({"item_id": {"$in": list(copy_ids)}})
+        }
+
+    collections = _prefetch_collections(sample_dicts)
+    refcodes = generate_unique_refcodes(len(sample_dicts))
+
+    outputs: List[Optional[tuple[dict, int]]] = []
+    models: Dict[int, Item] = {}
+    for ind, (sample_dict, copy_from_item_id) in enumerate(zip(sample_dicts, copy_from_item_ids)):
+        data_model, error = _prepare_new_item(
+            sample_dict,
+            refcode=refcodes[ind],
+            copy_from_item_id=copy_from_item_id,
+            copied_doc=copied_docs.get(copy_from_item_id) if copy_from_item_id else None,
+            generate_id_automatically=generate_ids_automatically,
+            collections=collections,
+        )
+        outputs.append(error)
+        if data_model is not None:
+            models[ind] = data_model
+
+    # check to make sure that the item_ids aren't taken already, or repeated within the batch
+    existing_ids = {
+        doc["item_id"]
+        for doc in flask_mongo.db.items.find(
+            {"item_id": {"$in": [model.item_id for model in models.values()]}},
+            projection={"item_id": 1},
+        )
+    }
+    for ind, data_model in list(models.items()):
+        if data_model.item_id in existing_ids:
+            outputs[ind] = _duplicate_item_id_response(data_model.item_id)
+            del models[ind]
+        else:
+            existing_ids.add(data_model.item_id)
+
+    to_insert = list(models.items())
+    inserted_ids: List[ObjectId] = []
+    if to_insert:
+        documents = [
+            data_model.dict(exclude={"creators", "collections"}) for _, data_model in to_insert
+        ]
+        failed: Dict[int, dict] = {}
+        try:
+            flask_mongo.db.items.insert_many(documents, ordered=False)
+        except pymongo.errors.BulkWriteError as exc:
+            failed = {error["index"]: error for error in exc.details.get("writeErrors", [])}
+
+        for position, (ind, data_model) in enumerate(to_insert):
+            if position in failed:
+                outputs[ind] = (
+                    dict(
+                        status="error",
+                        message=f"Failed to add new item {data_model.item_id!r} to database.",
+                        item_id=data_model.item_id,
+                        output=failed[position].get("errmsg"),
+                    ),
+                    409 if failed[position].get("code") == 11000 else 400,
+                )
+            else:
+                inserted_ids.append(documents[position]["_id"])
+                outputs[ind] = _created_item_response(data_model)
+
+    if inserted_ids:
+        update_item_summaries({"_id": {"$in": inserted_ids}})
+        update_item_edges({"_id": {"$in": inserted_ids}})
+        update_referencing_edges({"_id": {"$in": inserted_ids}})
+        invalidate_graph_cache()
+
+    return outputs  # type: ignore[return-value]
+
+
 @ITEMS.route("/new-sample/", methods=["POST"])
 def create_sample():
     request_json = request.get_json()  # noqa: F821 pylint: disable=undefined-variable
@@ -578,14 +1002,11 @@ def create_samples():
     if copy_from_item_ids is None:
         copy_from_item_ids = [None] * len(sample_jsons)
 
-    outputs = [
-        _create_sample(
-            sample_dict=sample_json,
-            copy_from_item_id=copy_from_item_id,
-            generate_id_automatically=generate_ids_automatically,
-        )
-        for sample_json, copy_from_item_id in zip(sample_jsons, copy_from_item_ids)
-    ]
+    outputs = _create_samples_in_bulk(
+        sample_jsons,
+        copy_from_item_ids,
+        generate_ids_automatically=generate_ids_automatically,
+    )
     responses, http_codes = zip(*outputs)
 
     statuses = [response["status"] for response in responses]
@@ -608,11 +1029,12 @@ def delete_sample():
     request_json = request.get_json()  # noqa: F821 pylint: disable=undefined-variable
     item_id = request_json["item_id"]
 
-    result = flask_mongo.db.items.delete_one(
-        {"item_id": item_id, **get_default_permissions(user_only=True)}
+    result = flask_mongo.db.items.find_one_and_delete(
+        {"item_id": item_id, **get_default_permissions(user_only=True)},
+        projection={"_id": 1},
     )
 
-    if result.deleted_count != 1:
+    if result is None:
         return (
             jsonify(
                 {
@@ -622,6 +1044,11 @@ def delete_sample():
             ),
             401,
         )
+
+    delete_item_summaries({"item_id": item_id})
+    delete_item_edges(result["_id"])
+    invalidate_graph_cache()
+
     return (
         jsonify(
             {
@@ -632,10 +1059,24 @@ def delete_sample():
     )
 
 
+def _related_items(edges: List[Dict], field: str, item_id: str) -> Set[str]:
+    """Returns the `item_id`s at the other end (`field`) of the given `parent` edges
+    of the item, excluding collections and unresolved references."""
+    return {
+        edge[field]
+        for edge in edges
+        if edge.get("relation") == RelationshipType.PARENT.value
+        and edge.get("type") != "collections"
+        and isinstance(edge[field], str)
+        and edge[field] != item_id
+    }
+
+
 @ITEMS.route("/get-item-data/<item_id>", methods=["GET"])
 def get_item_data(item_id, load_blocks: bool = False):
     """Generates a JSON response for the item with the given `item_id`,
-    additionally resolving relationships to files and other items.
+    additionally resolving its creators, collections, files, and its parents and
+    children from the edge index, in a single aggregation.
 
     Parameters:
        load_blocks: Whether to regenerate any data blocks associated with this
@@ -656,6 +1097,7 @@ def get_item_data(item_id, load_blocks: bool = False):
             {"$lookup": creators_lookup()},
             {"$lookup": collections_lookup()},
             {"$lookup": files_lookup()},
+            *edges_lookups(),
         ],
     )
 
@@ -688,63 +1130,14 @@ def get_item_data(item_id, load_blocks: bool = False):
         else:
             raise KeyError(f"Item {item_id=} has no type field in document.")
 
+    # collect parents and children declared in either direction from the edge index
+    parents = _related_items(doc.pop("parent_edges", []), "source", item_id)
+    children = _related_items(doc.pop("child_edges", []), "target", item_id)
+
     doc = ItemModel(**doc)
     if load_blocks:
         doc.blocks_obj = reserialize_blocks(doc.display_order, doc.blocks_obj)
 
-    # find any documents with relationships that mention this document
-    relationships_query_results = flask_mongo.db.items.find(
-        filter={
-            "$or": [
-                {"relationships.item_id": doc.item_id},
-                {"relationships.refcode": doc.refcode},
-                {"relationships.immutable_id": doc.immutable_id},
-            ]
-        },
-        projection={
-            "item_id": 1,
-            "refcode": 1,
-            "relationships": {
-                "$elemMatch": {
-                    "$or": [
-                        {"item_id": doc.item_id},
-                        {"refcode": doc.refcode},
-                    ],
-                },
-            },
-        },
-    )
-
-    # loop over and collect all 'outer' relationships presented by other items
-    incoming_relationships: Dict[RelationshipType, Set[str]] = {}
-    for d in relationships_query_results:
-        for k in d["relationships"]:
-            if k["relation"] not in incoming_relationships:
-                incoming_relationships[k["relation"]] = set()
-            incoming_relationships[k["relation"]].add(
-                d["item_id"] or d["refcode"] or d["immutable_id"]
-            )
-
-    # loop over and aggregate all 'inner' relationships presented by this item
-    inlined_relationships: Dict[RelationshipType, Set[str]] = {}
-    if doc.relationships is not None:
-        inlined_relationships = {
-            relation: {
-                d.item_id or d.refcode or d.immutable_id
-                for d in doc.relationships
-                if d.relation == relation
-            }
-            for relation in RelationshipType
-        }
-
-    # reunite parents and children from both directions of the relationships field
-    parents = incoming_relationships.get(RelationshipType.CHILD, set()).union(
-        inlined_relationships.get(RelationshipType.PARENT, set())
-    )
-    children = incoming_relationships.get(RelationshipType.PARENT, set()).union(
-        inlined_relationships.get(RelationshipType.CHILD, set())
-    )
-
     # Must be exported to JSON first to apply the custom pydantic JSON encoders
     return_dict = json.loads(doc.json(exclude_unset=True))
 
@@ -825,6 +1218,7 @@ def save_item():
             )
 
     item_type = item["type"]
+    previous_graph_data = (item.get("name"), item.get("relationships"))
     item.update(updated_data)
 
     try:
@@ -858,6 +1252,11 @@ def save_item():
             400,
         )
 
+    update_item_summaries({"item_id": item_id})
+    if (item.get("name"), item.get("relationships")) != previous_graph_data:
+        update_item_edges({"item_id": item_id})
+        invalidate_graph_cache()
+
     return jsonify(status="success", last_modified=updated_data["last_modified"]), 200
 
 
@@ -1,10 +1,14 @@
 from bson import ObjectId
+from bson.errors import InvalidId
 from flask import Blueprint, jsonify, request
 from flask_login import current_user
 
 from pydatalab.config import CONFIG
+from pydatalab.item_summaries import update_item_summaries
+from pydatalab.login import invalidate_user_cache
 from pydatalab.models.people import DisplayName, EmailStr
 from pydatalab.mongo import flask_mongo
+from pydatalab.permissions import invalidate_permissions_cache
 
 USERS = Blueprint("users", __name__)
 
@@ -16,11 +20,13 @@ def save_user(user_id):
     display_name: str | None = None
     contact_email: str | None = None
     account_status: str | None = None
+    managers: list[str] | None = None
 
     if request_json is not None:
         display_name = request_json.get("display_name", False)
         contact_email = request_json.get("contact_email", False)
         account_status = request_json.get("account_status", None)
+        managers = request_json.get("managers", None)
 
     if not current_user.is_authenticated and not CONFIG.TESTING:
         return (jsonify({"status": "error", "message": "No user authenticated."}), 401)
@@ -31,6 +37,12 @@ def save_user(user_id):
             403,
         )
 
+    if managers is not None and not CONFIG.TESTING and current_user.role != "admin":
+        return (
+            jsonify({"status": "error", "message": "Only admins can change a user's managers."}),
+            403,
+        )
+
     update = {}
 
     try:
@@ -51,6 +63,14 @@ def save_user(user_id):
             {"status": "error", "message": f"Invalid display name or email was passed: {str(e)}"}
         ), 400
 
+    if managers is not None:
+        try:
+            update["managers"] = [ObjectId(manager) for manager in managers]
+        except (InvalidId, TypeError) as e:
+            return jsonify(
+                {"status": "error", "message": f"Invalid manager IDs were passed: {str(e)}"}
+            ), 400
+
     if not update:
         return jsonify({"status": "success", "message": "No update was performed."}), 200
 
@@ -59,6 +79,13 @@ def save_user(user_id):
     if update_result.matched_count != 1:
         return (jsonify({"status": "error", "message": "Unable to update user."}), 400)
 
+    if update_result.modified_count:
+        invalidate_user_cache(user_id)
+        if "managers" in update:
+            invalidate_permissions_cache()
+        if "display_name" in update or "contact_email" in update:
+            update_item_summaries({"creator_ids": ObjectId(user_id)})
+
     if update_result.modified_count != 1:
         return (
             jsonify(
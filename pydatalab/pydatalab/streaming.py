@@ -0,0 +1,55 @@
+"""This module implements streaming of large API responses as newline-delimited
+JSON (NDJSON), one document per line, such that results can be sent as they are
+read from the database rather than first being collected and encoded in memory.
+
+Streaming is opt-in: endpoints that support it will stream their results when
+the request prefers the `application/x-ndjson` media type via its `Accept` header,
+and return their usual JSON response otherwise.
+
+"""
+
+from typing import Any, Iterable, Iterator
+
+from flask import Response, current_app, request, stream_with_context
+
+from pydatalab.config import CONFIG
+
+__all__ = ("NDJSON_MIMETYPE", "wants_ndjson", "stream_ndjson")
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def wants_ndjson() -> bool:
+    """Returns whether the current request prefers an NDJSON response over JSON.
+
+    Requests that accept any media type (or do not specify one) receive JSON.
+
+    """
+    return (
+        request.accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE])
+        == NDJSON_MIMETYPE
+    )
+
+
+def stream_ndjson(documents: Iterable[Any], status: int = 200) -> Response:
+    """Returns a streamed NDJSON response containing the given documents.
+
+    If `documents` is a MongoDB cursor, results will be fetched from the database
+    in batches of `CONFIG.STREAM_BATCH_SIZE` while the response is being sent.
+    Each document is encoded with the app's JSON provider (i.e., `BSONProvider`),
+    so values are serialized identically to the non-streamed responses.
+
+    Parameters:
+        documents: An iterable of JSON-serializable documents, e.g., a MongoDB cursor
+            or a generator that lazily transforms one.
+        status: The HTTP status code of the response.
+
+    """
+    if hasattr(documents, "batch_size"):
+        documents.batch_size(CONFIG.STREAM_BATCH_SIZE)
+
+    def generate() -> Iterator[str]:
+        for document in documents:
+            yield current_app.json.dumps(document) + "\n"
+
+    return Response(stream_with_context(generate()), status=status, mimetype=NDJSON_MIMETYPE)
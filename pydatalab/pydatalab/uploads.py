@@ -0,0 +1,270 @@
+"""This module implements resumable, chunked file uploads, loosely following the
+[tus](https://tus.io/protocols/resumable-upload) protocol, such that large files
+can be uploaded over several requests and resumed from the last received byte
+after a dropped connection.
+
+An upload is created with its expected size (which is immediately checked against
+the space available in the file store) and then filled by appending chunks at
+the current offset. Each chunk is streamed directly into the final location of
+the file in the file store, with its SHA-256 hash computed incrementally. Once
+all bytes have been received, the file is registered in the database and
+attached to its items, as for a single-request upload.
+
+Uploads that are not completed within `CONFIG.UPLOAD_SESSION_LIFETIME` hours
+can be removed with `prune_expired_uploads` (or the `admin.prune-uploads` task).
+
+"""
+
+import datetime
+import os
+import pathlib
+import shutil
+import threading
+from typing import IO, Any, Dict, List, Optional, Tuple
+
+import pymongo.database
+from bson import ObjectId
+from pymongo import ReturnDocument
+from werkzeug.exceptions import Conflict
+from werkzeug.utils import secure_filename
+
+from pydatalab.config import CONFIG
+from pydatalab.file_utils import (
+    check_space_available,
+    hash_file,
+    register_uploaded_file,
+    stream_to_file,
+)
+from pydatalab.logger import LOGGER
+from pydatalab.models.utils import PyObjectId
+from pydatalab.mongo import flask_mongo
+from pydatalab.permissions import get_default_permissions
+
+__all__ = (
+    "UPLOAD_COLLECTION",
+    "create_upload",
+    "get_upload",
+    "append_to_upload",
+    "abort_upload",
+    "prune_expired_uploads",
+)
+
+UPLOAD_COLLECTION = "uploads"
+
+_LOCK_TIMEOUT = datetime.timedelta(hours=1)
+"""The time after which the lock held by a request appending to an upload is
+assumed to be stale, e.g., if the server process was killed mid-request."""
+
+_HASHERS: Dict[ObjectId, Tuple[int, Any]] = {}
+"""The in-progress hash of each upload handled by this process, alongside the offset
+it has been computed up to, such that it need not be recomputed from the partial
+file for each chunk."""
+
+_HASHERS_LOCK = threading.Lock()
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(tz=datetime.timezone.utc)
+
+
+def _resume_hasher(upload_id: ObjectId, location: str, offset: int) -> Any:
+    """Returns the hash of the first `offset` bytes of the upload, either from
+    this process's cache or by rehashing the partial file (e.g., if a previous
+    chunk was handled by a different server process).
+
+    """
+    with _HASHERS_LOCK:
+        cached = _HASHERS.pop(upload_id, None)
+    if cached is not None and cached[0] == offset:
+        return cached[1]
+    return hash_file(location, size=offset)
+
+
+def create_upload(
+    filename: str,
+    size: int,
+    item_ids: List[str],
+    creator_ids: Optional[List[PyObjectId]] = None,
+    last_modified: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Start a new resumable upload.
+
+    Parameters:
+        filename: The name of the file being uploaded.
+        size: The total size of the file in bytes.
+        item_ids: The item IDs to attach the file to once uploaded.
+        creator_ids: The IDs of the users who will be registered as the creators of the file.
+        last_modified: An isoformat datetime to track as the last time the file was modified.
+
+    Raises:
+        ValueError: If the size is invalid or the items cannot be found.
+        InsufficientStorage: If there is not enough space available to store the file.
+
+    Returns:
+        The stored upload document.
+
+    """
+    if size < 1:
+        raise ValueError(f"Invalid upload size {size}, must be a positive integer.")
+
+    for item_id in item_ids:
+        if not flask_mongo.db.items.find_one(
+            {"item_id": item_id, **get_default_permissions(user_only=True)},
+            projection={"_id": 1},
+        ):
+            raise ValueError(f"item_id is invalid: {item_id}")
+
+    check_space_available(size)
+
+    # The upload ID is reused as the file ID, and the file is written to its final location
+    upload_id = ObjectId()
+    secure_name = secure_filename(filename)
+    if not secure_name:
+        raise ValueError(f"Invalid filename {filename!r}.")
+    directory = os.path.join(CONFIG.FILE_DIRECTORY, str(upload_id))
+    location = os.path.join(directory, secure_name)
+    pathlib.Path(directory).mkdir(exist_ok=False)
+    pathlib.Path(location).touch()
+
+    upload = {
+        "_id": upload_id,
+        "original_name": filename,
+        "location": location,
+        "size": size,
+        "offset": 0,
+        "item_ids": item_ids,
+        "creator_ids": creator_ids or [],
+        "last_modified": last_modified,
+        "created_at": _now(),
+        "locked_at": None,
+    }
+    flask_mongo.db[UPLOAD_COLLECTION].insert_one(upload)
+
+    return upload
+
+
+def get_upload(upload_id: ObjectId) -> Optional[Dict[str, Any]]:
+    """Returns the upload with the given ID, if it was created by the current user."""
+    return flask_mongo.db[UPLOAD_COLLECTION].find_one(
+        {"_id": upload_id, **get_default_permissions(user_only=True)}
+    )
+
+
+def append_to_upload(
+    upload_id: ObjectId, offset: int, stream: IO[bytes]
+) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """Append the contents of the stream to the upload at the given offset,
+    completing the upload if all bytes have been received.
+
+    If the stream is interrupted, the bytes that were received are kept and the
+    offset of the upload is updated, such that it can be resumed from there.
+
+    Parameters:
+        upload_id: The ID of the upload.
+        offset: The current offset of the upload, as known by the client.
+        stream: The stream of bytes to append.
+
+    Raises:
+        Conflict: If the offset does not match the current offset of the upload, or
+            another request is currently appending to it.
+        RequestEntityTooLarge: If the stream contains more bytes than remain in the upload.
+        InsufficientStorage: If the disk filled up while writing.
+
+    Returns:
+        The updated upload document and, if the upload is complete, the metadata of the
+        registered file.
+
+    """
+    collection = flask_mongo.db[UPLOAD_COLLECTION]
+    now = _now()
+    upload = collection.find_one_and_update(
+        {
+            "$and": [
+                {"_id": upload_id, "offset": offset},
+                {"$or": [{"locked_at": None}, {"locked_at": {"$lt": now - _LOCK_TIMEOUT}}]},
+                get_default_permissions(user_only=True),
+            ]
+        },
+        {"$set": {"locked_at": now}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if upload is None:
+        raise Conflict(
+            f"Upload {upload_id} is not at offset {offset}, or is already being appended to."
+        )
+
+    location = upload["location"]
+    try:
+        hasher = _resume_hasher(upload_id, location, offset)
+        written, hasher = stream_to_file(
+            stream, location, offset=offset, hasher=hasher, max_bytes=upload["size"] - offset
+        )
+    except Exception:
+        # Keep any bytes that were received, so that the upload can be resumed
+        received = min(os.path.getsize(location), upload["size"])
+        collection.update_one({"_id": upload_id}, {"$set": {"offset": received, "locked_at": None}})
+        raise
+
+    new_offset = offset + written
+    if new_offset < upload["size"]:
+        with _HASHERS_LOCK:
+            _HASHERS[upload_id] = (new_offset, hasher)
+        upload = collection.find_one_and_update(
+            {"_id": upload_id},
+            {"$set": {"offset": new_offset, "locked_at": None}},
+            return_document=ReturnDocument.AFTER,
+        )
+        return upload, None
+
+    try:
+        file_information = register_uploaded_file(
+            upload_id,
+            location,
+            size=new_offset,
+            sha256=hasher.hexdigest(),
+            original_name=upload["original_name"],
+            item_ids=upload["item_ids"],
+            last_modified=upload.get("last_modified"),
+            creator_ids=upload["creator_ids"],
+        )
+    except Exception:
+        collection.update_one(
+            {"_id": upload_id}, {"$set": {"offset": new_offset, "locked_at": None}}
+        )
+        raise
+    collection.delete_one({"_id": upload_id})
+    upload["offset"] = new_offset
+
+    return upload, file_information
+
+
+def abort_upload(upload: Dict[str, Any]) -> None:
+    """Cancel an incomplete upload, removing any bytes that were received."""
+    with _HASHERS_LOCK:
+        _HASHERS.pop(upload["_id"], None)
+    shutil.rmtree(os.path.dirname(upload["location"]), ignore_errors=True)
+    flask_mongo.db[UPLOAD_COLLECTION].delete_one({"_id": upload["_id"]})
+
+
+def prune_expired_uploads(database: Optional[pymongo.database.Database] = None) -> int:
+    """Remove all incomplete uploads that were created more than
+    `CONFIG.UPLOAD_SESSION_LIFETIME` hours ago, along with their partial files.
+
+    Returns:
+        The number of removed uploads.
+
+    """
+    if database is None:
+        database = flask_mongo.db
+
+    cutoff = _now() - datetime.timedelta(hours=CONFIG.UPLOAD_SESSION_LIFETIME)
+    count = 0
+    for upload in database[UPLOAD_COLLECTION].find(
+        {"created_at": {"$lt": cutoff}}, projection={"location": 1}
+    ):
+        shutil.rmtree(os.path.dirname(upload["location"]), ignore_errors=True)
+        database[UPLOAD_COLLECTION].delete_one({"_id": upload["_id"]})
+        count += 1
+
+    LOGGER.info("Removed %s expired uploads", count)
+    return count
@@ -6,7 +6,9 @@ anywhere in the package.
 import datetime
 from json import JSONEncoder
 from math import ceil
+from typing import Optional
 
+import numpy as np
 import pandas as pd
 from bson import json_util
 from flask.json.provider import DefaultJSONProvider
@@ -34,6 +36,183 @@ def reduce_df_size(df: pd.DataFrame, target_nrows: int, endpoint: bool = True) -
     return df.iloc[indices].copy()
 
 
+DOWNSAMPLING_METHODS = ("stride", "minmax", "lttb")
+"""The available methods for downsampling data for plotting, see
+[`downsample_df`][pydatalab.utils.downsample_df]."""
+
+DEFAULT_MAX_POINTS = 10_000
+"""The default number of points to downsample plotted data to, if a method
+but no point budget is specified."""
+
+
+def _stride_indices(num_rows: int, target_nrows: int) -> np.ndarray:
+    """Returns the strided indices used by `reduce_df_size`, including the endpoints."""
+    stride = ceil(num_rows / target_nrows)
+    return np.unique(np.concatenate(([0], np.arange(stride, num_rows - 1, stride), [num_rows - 1])))
+
+
+def _minmax_indices(y: np.ndarray, target_nrows: int) -> np.ndarray:
+    """Returns the indices of the minimum and maximum `y` values in each of
+    `target_nrows // 2` equally-sized buckets, plus the endpoints.
+
+    """
+    num_rows = len(y)
+    num_buckets = max(target_nrows // 2, 1)
+    bucket_ids = (np.arange(num_rows) * num_buckets) // num_rows
+
+    # Sort by bucket, then by value within each bucket (NaNs are sorted last)
+    order = np.lexsort((y, bucket_ids))
+    starts = np.searchsorted(bucket_ids, np.arange(num_buckets))
+    ends = np.append(starts[1:], num_rows) - 1
+    num_nans = np.add.reduceat(np.isnan(y), starts)
+
+    minima = order[starts]
+    maxima = order[np.maximum(ends - num_nans, starts)]
+
+    return np.unique(np.concatenate(([0, num_rows - 1], minima, maxima)))
+
+
+def _lttb_indices(x: np.ndarray, y: np.ndarray, target_nrows: int) -> np.ndarray:
+    """Returns the indices selected by the Largest-Triangle-Three-Buckets algorithm
+    (S. Steinarsson, 2013), which keeps the first and last points and, from each
+    intermediate bucket, the point forming the largest triangle with the previously
+    selected point and the mean of the next bucket.
+
+    """
+    num_rows = len(y)
+    if target_nrows < 3:
+        return np.array([0, num_rows - 1])
+
+    num_buckets = target_nrows - 2
+    edges = np.linspace(1, num_rows - 1, num_buckets + 1).astype(int)
+    counts = np.diff(edges)
+
+    # The mean of each bucket, followed by the final point for use with the last bucket
+    mean_x = np.append(np.add.reduceat(x[1:-1], edges[:-1] - 1) / counts, x[-1])
+    mean_y = np.append(np.add.reduceat(y[1:-1], edges[:-1] - 1) / counts, y[-1])
+
+    indices = np.empty(target_nrows, dtype=int)
+    indices[0], indices[-1] = 0, num_rows - 1
+
+    a = 0
+    for bucket in range(num_buckets):
+        start, stop = edges[bucket], edges[bucket + 1]
+        areas = np.abs(
+            (x[a] - mean_x[bucket + 1]) * (y[start:stop] - y[a])
+            - (x[a] - x[start:stop]) * (mean_y[bucket + 1] - y[a])
+        )
+        a = start + int(np.argmax(np.nan_to_num(areas, nan=-1.0)))
+        indices[bucket + 1] = a
+
+    return indices
+
+
+def downsample_indices(
+    y: np.ndarray,
+    target_nrows: int,
+    x: Optional[np.ndarray] = None,
+    method: str = "lttb",
+) -> np.ndarray:
+    """Returns the sorted indices of the points to keep when downsampling
+    the given data to (at most) the target number of points.
+
+    Parameters:
+        y: The values that will be plotted on the y-axis.
+        target_nrows: The target number of points.
+        x: The values that will be plotted on the x-axis (defaults to the index of `y`).
+        method: One of `"stride"` (every n-th point), `"minmax"` (the extrema
+            of each bucket) or `"lttb"` (Largest-Triangle-Three-Buckets).
+
+    Returns:
+        An array of integer indices into the input arrays, always including the endpoints.
+
+    """
+    if method not in DOWNSAMPLING_METHODS:
+        raise ValueError(
+            f"Downsampling method must be one of {DOWNSAMPLING_METHODS}, not {method!r}"
+        )
+
+    num_rows = len(y)
+    if num_rows <= target_nrows or num_rows < 3:
+        return np.arange(num_rows)
+
+    if method == "stride":
+        return _stride_indices(num_rows, target_nrows)
+
+    y = np.asarray(y, dtype=float)
+    if method == "minmax":
+        return _minmax_indices(y, target_nrows)
+
+    x = np.arange(num_rows, dtype=float) if x is None else np.asarray(x, dtype=float)
+    return _lttb_indices(x, y, target_nrows)
+
+
+def downsample_df(
+    df: pd.DataFrame,
+    max_points: int,
+    method: str = "lttb",
+    x: Optional[str] = None,
+    y: Optional[str] = None,
+    group_by: Optional[str] = None,
+) -> pd.DataFrame:
+    """Downsample a dataframe to a fixed point budget for plotting,
+    using a shape-preserving method such that peaks and plateaus in the
+    plotted curve are retained.
+
+    Parameters:
+        df: The dataframe to reduce.
+        max_points: The approximate maximum number of rows in the output.
+        method: The downsampling method, one of `DOWNSAMPLING_METHODS`.
+        x: The column that will be plotted on the x-axis (defaults to the row number).
+        y: The column that will be plotted on the y-axis, used to pick the points
+            to keep (defaults to the first numeric column).
+        group_by: An optional column (e.g., `"half cycle"`) that separates distinct
+            curves; each group is downsampled separately with a share of the point
+            budget proportional to its size.
+
+    Returns:
+        A copy of the input dataframe containing only the selected rows, in their original order.
+
+    """
+    if len(df) <= max_points:
+        return df.copy()
+
+    if x is not None and x not in df:
+        x = None
+
+    if y is None or y not in df:
+        numeric_columns = [col for col in df.select_dtypes("number") if col not in (x, group_by)]
+        if not numeric_columns:
+            method = "stride"
+            y = None
+        else:
+            y = numeric_columns[0]
+
+    x_values = df[x].to_numpy() if x is not None else None
+    y_values = df[y].to_numpy() if y is not None else np.zeros(len(df))
+
+    if group_by is None:
+        groups = [np.arange(len(df))]
+    else:
+        groups = list(df.groupby(group_by, sort=False).indices.values())
+
+    selected = []
+    for group in groups:
+        budget = max(int(max_points * len(group) / len(df)), 3)
+        selected.append(
+            group[
+                downsample_indices(
+                    y_values[group],
+                    budget,
+                    x=x_values[group] if x_values is not None else None,
+                    method=method,
+                )
+            ]
+        )
+
+    return df.iloc[np.sort(np.concatenate(selected))].copy()
+
+
 class CustomJSONEncoder(JSONEncoder):
     """A custom JSON encoder that uses isoformat datetime strings and
     BSON for other serialization."""
@@ -8,35 +8,29 @@ client = MongoClient(CONFIG.MONGO_URI)
 
 db = client.datalabvue
 
-all_documents = db.items.find()
+all_documents = db.items.find(projection={"item_id": 1, "name": 1, "type": 1})
 
 nodes = []
-edges = []
 for document in all_documents:
     nodes.append(
         {"data": {"id": document["item_id"], "name": document["name"], "type": document["type"]}}
     )
 
-    if "relationships" not in document:
-        continue
-
-    for relationship in document["relationships"]:
-        # only considering child-parent relationships:
-        if relationship["relation"] != "parent":
-            continue
-
-        target = document["item_id"]
-        source = relationship["item_id"]
-        edges.append(
-            {
-                "data": {
-                    "id": f"{source}->{target}",
-                    "source": source,
-                    "target": target,
-                    "value": 1,
-                }
+# only considering child-parent relationships, from the index maintained in `pydatalab.edges`:
+edges = []
+for edge in db.edges.find({"relation": "parent"}, projection={"source": 1, "target": 1}):
+    source = edge["source"]
+    target = edge["target"]
+    edges.append(
+        {
+            "data": {
+                "id": f"{source}->{target}",
+                "source": source,
+                "target": target,
+                "value": 1,
             }
-        )
+        }
+    )
 
 
 # We want to filter out all the starting materials that don't have relationships since there are so many of them:
@@ -82,6 +82,91 @@ def create_mongo_indices(_):
 admin.add_task(create_mongo_indices)
 
 
+@task
+def rebuild_item_summaries(_):
+    """This task regenerates the materialized summaries of all samples and cells
+    used for item listings, e.g., after the database has been modified directly."""
+    from pydatalab.item_summaries import rebuild_item_summaries
+    from pydatalab.mongo import get_database
+
+    count = rebuild_item_summaries(get_database())
+    print(f"Rebuilt {count} item summaries.")
+
+
+admin.add_task(rebuild_item_summaries)
+
+
+@task
+def rebuild_edges(_):
+    """This task regenerates the index of relationship edges between items
+    used for lineage queries, e.g., after the database has been modified directly."""
+    from pydatalab.edges import rebuild_edges
+    from pydatalab.mongo import get_database
+
+    count = rebuild_edges(get_database())
+    print(f"Rebuilt {count} edges.")
+
+
+admin.add_task(rebuild_edges)
+
+
+@task
+def prune_uploads(_):
+    """This task removes resumable uploads that have not been completed within
+    `UPLOAD_SESSION_LIFETIME` hours, along with their partially uploaded files."""
+    from pydatalab.mongo import get_database
+    from pydatalab.uploads import prune_expired_uploads
+
+    count = prune_expired_uploads(get_database())
+    print(f"Removed {count} expired uploads.")
+
+
+admin.add_task(prune_uploads)
+
+
+@task
+def deduplicate_files(_):
+    """This task hashes any stored files that do not yet have a recorded SHA-256 hash
+    (e.g., those added before deduplication was enabled) and links all files with
+    identical contents to a single blob in the content-addressed blob store."""
+    from pydatalab.blob_store import deduplicate_file
+    from pydatalab.file_utils import hash_file
+    from pydatalab.mongo import get_database
+
+    database = get_database()
+    count = 0
+    for file in database.files.find({}, projection={"location": 1, "sha256": 1}):
+        if not file.get("location") or not pathlib.Path(file["location"]).is_file():
+            continue
+        sha256 = file.get("sha256")
+        if not sha256:
+            sha256 = hash_file(file["location"]).hexdigest()
+            database.files.update_one({"_id": file["_id"]}, {"$set": {"sha256": sha256}})
+        deduplicate_file(file["location"], sha256)
+        count += 1
+
+    print(f"Deduplicated {count} files.")
+
+
+admin.add_task(deduplicate_files)
+
+
+@task
+def collect_garbage_blobs(_, dry_run: bool = False):
+    """This task removes all blobs from the content-addressed file store that are no
+    longer referenced by any file in the database."""
+    from pydatalab.blob_store import collect_garbage
+    from pydatalab.mongo import get_database
+
+    removed, freed = collect_garbage(get_database(), dry_run=dry_run)
+    print(
+        f"{'Would remove' if dry_run else 'Removed'} {removed} unreferenced blobs ({freed / 1024**2:.1f} MB)."
+    )
+
+
+admin.add_task(collect_garbage_blobs)
+
+
 @task
 def change_user_role(_, display_name: str, role: UserRole):
     """This task takes a user's name and gives them the desired role."""
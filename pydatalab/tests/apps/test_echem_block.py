@@ -1,12 +1,20 @@
+import time
 from pathlib import Path
 
+import numpy as np
+import pandas as pd
 import pytest
 from navani.echem import echem_file_loader
 
+from pydatalab.apps.echem.incremental import parse_incrementally
 from pydatalab.apps.echem.utils import (
+    append_echem_cache,
     compute_gpcl_differential,
     filter_df_by_cycle_index,
+    read_echem_cache,
+    read_echem_cache_metadata,
     reduce_echem_cycle_sampling,
+    write_echem_cache,
 )
 
 
@@ -56,6 +64,79 @@ def test_reduce_size(echem_dataframe):
         assert reduced_df.shape[1] == echem_dataframe.shape[1]
 
 
+def _reduce_echem_cycle_sampling_per_group(df, num_samples):
+    """The previous, per-group implementation of `reduce_echem_cycle_sampling`,
+    used as a reference for correctness and performance."""
+    from pydatalab.utils import reduce_df_size
+
+    return_df = pd.DataFrame([])
+    for _, half_cycle in df.groupby("half cycle"):
+        return_df = pd.concat([return_df, reduce_df_size(half_cycle, num_samples, endpoint=True)])
+    return return_df
+
+
+def test_reduce_echem_cycle_sampling_matches_per_group(echem_dataframe):
+    for size in (1, 2, 10, 100, len(echem_dataframe)):
+        expected = _reduce_echem_cycle_sampling_per_group(echem_dataframe, size)
+        pd.testing.assert_frame_equal(reduce_echem_cycle_sampling(echem_dataframe, size), expected)
+
+    # Unsorted half cycles, missing half cycles and single-point half cycles
+    df = pd.DataFrame(
+        {
+            "half cycle": [3, 3, 1, 1, 1, np.nan, 2, 3, 1, 5],
+            "voltage (V)": np.arange(10, dtype=float),
+        }
+    )
+    for size in (1, 2, 3, 10):
+        pd.testing.assert_frame_equal(
+            reduce_echem_cycle_sampling(df, size), _reduce_echem_cycle_sampling_per_group(df, size)
+        )
+
+
+def _long_cycling_dataframe(num_half_cycles: int) -> pd.DataFrame:
+    """Generate random cycling data with the given number of half cycles of varying length."""
+    rng = np.random.default_rng(seed=0)
+    points_per_half_cycle = rng.integers(1, 100, size=num_half_cycles)
+    return pd.DataFrame(
+        {
+            "half cycle": np.repeat(np.arange(1, num_half_cycles + 1), points_per_half_cycle),
+            "voltage (V)": rng.random(points_per_half_cycle.sum()),
+            "capacity (mAh)": rng.random(points_per_half_cycle.sum()),
+        }
+    )
+
+
+def test_reduce_echem_cycle_sampling_long_cycling():
+    """Compare the vectorized downsampling against the per-group implementation
+    for a cell with hundreds of half cycles of varying length."""
+    df = _long_cycling_dataframe(500)
+    pd.testing.assert_frame_equal(
+        reduce_echem_cycle_sampling(df, 10), _reduce_echem_cycle_sampling_per_group(df, 10)
+    )
+
+
+@pytest.mark.benchmark
+def test_reduce_echem_cycle_sampling_benchmark():
+    """Compare the time taken by the vectorized downsampling and the per-group
+    implementation for a long-cycled cell with 10,000 half cycles."""
+    df = _long_cycling_dataframe(10_000)
+
+    start = time.perf_counter()
+    reduced_df = reduce_echem_cycle_sampling(df, 10)
+    vectorized_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = _reduce_echem_cycle_sampling_per_group(df, 10)
+    per_group_time = time.perf_counter() - start
+
+    print(
+        f"reduce_echem_cycle_sampling over 10,000 half cycles: "
+        f"{vectorized_time:.3f} s (vectorized) vs {per_group_time:.3f} s (per group)"
+    )
+    pd.testing.assert_frame_equal(reduced_df, expected)
+    assert vectorized_time < per_group_time
+
+
 def test_compute_gpcl_differential(reduced_and_filtered_echem_dataframe):
     df = reduced_and_filtered_echem_dataframe
 
@@ -66,6 +147,68 @@ def test_compute_gpcl_differential(reduced_and_filtered_echem_dataframe):
     assert "dV/dQ (V/mA)" in dvdq_results
 
 
+def test_compute_gpcl_differential_cache(reduced_echem_dataframe, tmp_path, monkeypatch):
+    import pydatalab.apps.echem.utils
+
+    cache_key = {"source_revision": 1}
+    df = filter_df_by_cycle_index(reduced_echem_dataframe, [1, 2])
+    uncached = compute_gpcl_differential(df)
+    cached = compute_gpcl_differential(df, cache_dir=tmp_path, cache_key=cache_key)
+    pd.testing.assert_frame_equal(cached, uncached)
+    assert len(list(tmp_path.glob("*.npz"))) == 1
+
+    # Results read back from the cache should be identical to freshly computed ones
+    pd.testing.assert_frame_equal(
+        compute_gpcl_differential(df, cache_dir=tmp_path, cache_key=cache_key),
+        uncached,
+        check_exact=True,
+    )
+
+    # Only newly selected half cycles should be recomputed
+    computed_cycles = []
+    compute = pydatalab.apps.echem.utils._compute_half_cycle_differential
+
+    def _counting_compute(cycle, *args):
+        computed_cycles.append(cycle)
+        return compute(cycle, *args)
+
+    monkeypatch.setattr(
+        pydatalab.apps.echem.utils, "_compute_half_cycle_differential", _counting_compute
+    )
+    df = filter_df_by_cycle_index(reduced_echem_dataframe, [1, 2, 3])
+    result = compute_gpcl_differential(df, cache_dir=tmp_path, cache_key=cache_key)
+    assert set(computed_cycles) == set(df["half cycle"]) - set(cached["half cycle"])
+    assert set(result["half cycle"]) >= set(cached["half cycle"])
+
+    # Different parameters or a new file revision should not reuse the cached results
+    computed_cycles.clear()
+    compute_gpcl_differential(df, cache_dir=tmp_path, cache_key={"source_revision": 2})
+    assert set(computed_cycles) == set(df["half cycle"])
+    assert len(list(tmp_path.glob("*.npz"))) == 2
+
+
+def test_compute_gpcl_differential_parallel(reduced_echem_dataframe, monkeypatch):
+    import pydatalab.apps.echem.utils
+
+    df = filter_df_by_cycle_index(reduced_echem_dataframe, [1, 2, 3])
+    serial = compute_gpcl_differential(df)
+
+    monkeypatch.setattr(pydatalab.apps.echem.utils, "DIFFERENTIAL_PARALLEL_MIN_ROWS", 0)
+    try:
+        parallel = compute_gpcl_differential(df)
+        executor = pydatalab.apps.echem.utils._DIFFERENTIAL_EXECUTOR
+        assert executor is not None
+        assert executor._mp_context.get_start_method() == "spawn"
+
+        # The same long-lived pool is reused by subsequent calls
+        pd.testing.assert_frame_equal(compute_gpcl_differential(df), parallel)
+        assert pydatalab.apps.echem.utils._DIFFERENTIAL_EXECUTOR is executor
+    finally:
+        pydatalab.apps.echem.utils._reset_differential_executor()
+
+    pd.testing.assert_frame_equal(parallel, serial)
+
+
 def test_filter_df_by_cycle_index(reduced_echem_dataframe):
     cycle_lists = ([1, 2, 3], [4.0, 6.0, 10.0], [-1, 5, 2])
     for cycle_list in cycle_lists:
@@ -81,3 +224,118 @@ def test_plot(reduced_echem_dataframe):
     differential_df = compute_gpcl_differential(reduced_echem_dataframe, mode="dV/dQ")
     layout = double_axes_echem_plot(differential_df, mode="dV/dQ")
     assert layout
+
+
+def test_downsampled_plot(echem_dataframe):
+    from pydatalab.bokeh_plots import double_axes_echem_plot
+    from pydatalab.utils import downsample_df
+
+    max_points = 500
+    for method in ("lttb", "minmax"):
+        reduced_df = downsample_df(
+            echem_dataframe,
+            max_points,
+            method=method,
+            x="capacity (mAh)",
+            y="voltage (V)",
+            group_by="half cycle",
+        )
+        assert len(reduced_df) <= 2 * max_points
+        assert set(reduced_df["half cycle"]) == set(echem_dataframe["half cycle"].dropna())
+        # The voltage limits of each half cycle are preserved
+        tolerance = 0.01 * np.ptp(echem_dataframe["voltage (V)"])
+        for half_cycle, group in reduced_df.groupby("half cycle"):
+            original = echem_dataframe[echem_dataframe["half cycle"] == half_cycle]
+            assert group["voltage (V)"].max() >= original["voltage (V)"].max() - tolerance
+            assert group["voltage (V)"].min() <= original["voltage (V)"].min() + tolerance
+
+        layout = double_axes_echem_plot(
+            echem_dataframe, downsample_method=method, max_points=max_points
+        )
+        assert layout
+
+
+def test_echem_cache(echem_dataframe, tmp_path):
+    columns = ("time (s)", "voltage (V)", "capacity (mAh)", "half cycle", "full cycle")
+    cache_dir = tmp_path / "echem.RAW_PARSED"
+    write_echem_cache(echem_dataframe, cache_dir, columns, source_revision=1)
+
+    cached_df = read_echem_cache(cache_dir, source_revision=1)
+    assert list(cached_df.columns) == list(columns)
+    assert len(cached_df) == len(echem_dataframe)
+    assert cached_df["voltage (V)"].dtype == "float32"
+    assert (cached_df["half cycle"].to_numpy() == echem_dataframe["half cycle"].to_numpy()).all()
+
+    # Only the requested cycles should be read back from the cache
+    for cycle_list in ([1, 2, 3], [4.0, 6.0, 10.0], [-1, 5, 2], [100]):
+        filtered_df = filter_df_by_cycle_index(echem_dataframe, cycle_list)
+        cached_df = read_echem_cache(cache_dir, source_revision=1, cycle_list=cycle_list)
+        assert len(cached_df) == len(filtered_df)
+        assert set(cached_df["half cycle"]) == set(filtered_df["half cycle"])
+
+    # A new file revision invalidates the cache
+    assert read_echem_cache(cache_dir, source_revision=2) is None
+    assert read_echem_cache(tmp_path / "missing", source_revision=1) is None
+
+
+def _write_ivium_rows(path, start, stop, mode="a"):
+    """Writes synthetic Ivium rows, alternating between charge and discharge every 50 rows."""
+    time_s = np.arange(start, stop, dtype=float)
+    current = np.where((time_s // 50) % 2, -1.0, 1.0)
+    voltage = 3.0 + 0.01 * (time_s % 50) * current
+    with open(path, mode) as f:
+        if mode == "w":
+            f.write("time /s\tI /mA\tE /V\n")
+        for row in zip(time_s, current, voltage):
+            f.write("\t".join(f"{value:.6f}" for value in row) + "\n")
+
+
+def test_incremental_parsing(tmp_path):
+    columns = ("Time", "Voltage", "Capacity", "Current", "state", "half cycle", "full cycle")
+    live_file = tmp_path / "live.txt"
+    cache_dir = live_file.with_suffix(".RAW_PARSED")
+
+    _write_ivium_rows(live_file, 0, 120, mode="w")
+    first_rows, state = parse_incrementally(live_file)
+    assert len(first_rows) == 120
+    write_echem_cache(first_rows, cache_dir, columns, source_revision=1, incremental_state=state)
+
+    # Append more rows, including a partially written final line
+    _write_ivium_rows(live_file, 120, 275)
+    with open(live_file, "a") as f:
+        f.write("275.0\t-1.0")
+
+    new_rows, state = parse_incrementally(live_file, state)
+    assert len(new_rows) == 155
+    assert new_rows["Time"].iloc[0] == 120
+
+    metadata = read_echem_cache_metadata(cache_dir, source_revision=1)
+    assert append_echem_cache(
+        new_rows, cache_dir, metadata, source_revision=2, incremental_state=state
+    )
+    assert read_echem_cache(cache_dir, source_revision=1) is None
+
+    # The incrementally parsed data should match a full parse of the complete lines
+    with open(live_file, "a") as f:
+        f.write("000\t2.970000\n")
+    full_df = echem_file_loader(str(live_file)).iloc[:-1]
+    cached_df = read_echem_cache(cache_dir, source_revision=2)
+    assert len(cached_df) == len(full_df)
+    for column in ("Time", "Voltage", "Capacity", "Current"):
+        np.testing.assert_allclose(cached_df[column], full_df[column], rtol=1e-6)
+    for column in ("state", "half cycle", "full cycle"):
+        assert (cached_df[column].to_numpy() == full_df[column].to_numpy()).all()
+
+    # Only the requested half cycles should be read back
+    cached_df = read_echem_cache(cache_dir, source_revision=2, half_cycles=[5, 6])
+    assert set(cached_df["half cycle"]) == {5, 6}
+    assert len(cached_df) == (full_df["half cycle"].isin([5, 6])).sum()
+
+    # The final line was completed, so only it should be parsed
+    new_rows, state = parse_incrementally(live_file, state)
+    assert len(new_rows) == 1
+
+    # Any modification to previously parsed data requires a full reparse
+    contents = live_file.read_bytes()
+    live_file.write_bytes(contents.replace(b"3.000000", b"3.100000", 1))
+    assert parse_incrementally(live_file, state) is None
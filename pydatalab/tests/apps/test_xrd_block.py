@@ -4,6 +4,7 @@ import pytest
 
 from pydatalab.apps.xrd.blocks import XRDBlock
 from pydatalab.bokeh_plots import selectable_axes_plot
+from pydatalab.utils import DOWNSAMPLING_METHODS, downsample_df
 
 
 @pytest.fixture
@@ -29,3 +30,30 @@ def test_plot(data_files):
         point_size=3,
     )
     assert p
+
+
+@pytest.mark.parametrize("method", DOWNSAMPLING_METHODS)
+def test_downsampled_plot(data_files, method):
+    f = next(data_files)
+    df, y_options = XRDBlock.load_pattern(f)
+    max_points = min(len(df) // 4, 1000)
+    reduced_df = downsample_df(df, max_points, method=method, x="2θ (°)", y=y_options[0])
+    assert 3 <= len(reduced_df) <= max_points + 2
+    assert reduced_df.index.is_monotonic_increasing
+    # The endpoints are always kept
+    assert reduced_df.index[0] == df.index[0]
+    assert reduced_df.index[-1] == df.index[-1]
+    if method == "minmax":
+        # The most intense reflection should be kept exactly
+        assert reduced_df[y_options[0]].max() == df[y_options[0]].max()
+    elif method == "lttb":
+        assert reduced_df[y_options[0]].max() >= 0.9 * df[y_options[0]].max()
+
+    p = selectable_axes_plot(
+        [df],
+        x_options=["2θ (°)", "Q (Å⁻¹)", "d (Å)"],
+        y_options=y_options,
+        downsample_method=method,
+        max_points=max_points,
+    )
+    assert p
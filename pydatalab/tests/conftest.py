@@ -3,6 +3,30 @@ from pathlib import Path
 import pytest
 
 
+def pytest_addoption(parser):
+    parser.addoption(
+        "--benchmark",
+        action="store_true",
+        default=False,
+        help="Run the (slow) performance benchmarks marked with `benchmark`.",
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "benchmark: performance benchmark, only run when `--benchmark` is passed"
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--benchmark"):
+        return
+    skip_benchmark = pytest.mark.skip(reason="benchmarks only run with `--benchmark`")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip_benchmark)
+
+
 @pytest.fixture(scope="module", name="default_filepath")
 def fixture_default_filepath():
     return Path(__file__).parent.joinpath(
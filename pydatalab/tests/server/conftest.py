@@ -253,6 +253,11 @@ def insert_demo_users(
     unverified_user_api_key,
     real_mongo_client,
 ):
+    from pydatalab.login import invalidate_user_cache
+
+    # Users are recreated for each test module, so should not be served from the cache
+    invalidate_user_cache()
+
     insert_user(user_id, user_api_key, "user", real_mongo_client)
     insert_user(admin_user_id, admin_api_key, "admin", real_mongo_client)
     insert_user(
@@ -0,0 +1,355 @@
+import time
+
+import pytest
+from bson import ObjectId
+
+
+def _upload_file(client, filepath, item_id, replace_file="null"):
+    with open(filepath, "rb") as f:
+        response = client.post(
+            "/upload-file/",
+            buffered=True,
+            content_type="multipart/form-data",
+            data={
+                "item_id": item_id,
+                "file": [(f, filepath.name)],
+                "type": "application/octet-stream",
+                "replace_file": replace_file,
+                "relativePath": "null",
+            },
+        )
+    assert response.status_code == 201
+    return response.json["file_id"]
+
+
+def test_render_cache(client, default_filepath, insert_default_sample, default_sample):  # pylint: disable=unused-argument
+    file_id = _upload_file(client, default_filepath, default_sample.item_id)
+
+    response = client.post(
+        "/add-data-block/",
+        json={"block_type": "cycle", "item_id": default_sample.item_id, "index": 0},
+    )
+    assert response.status_code == 200
+    block_data = response.json["new_block_obj"]
+    block_data["file_id"] = file_id
+
+    def render():
+        response = client.post("/update-block/", json={"block_data": block_data})
+        assert response.status_code == 200
+        assert response.json["new_block_data"]["bokeh_plot_data"]
+        return response.json["new_block_data"]
+
+    def cache_stats():
+        return client.get("/info/stats").json["render_cache"]
+
+    first_render = render()
+    stats = cache_stats()
+
+    # An identical request should now be served from the cache
+    second_render = render()
+    new_stats = cache_stats()
+    assert new_stats["hits"] == stats["hits"] + 1
+    assert second_render["bokeh_plot_data"] == first_render["bokeh_plot_data"]
+
+    # Changing block parameters should miss the cache
+    block_data["derivative_mode"] = "dQ/dV"
+    render()
+    stats, new_stats = new_stats, cache_stats()
+    assert new_stats["misses"] == stats["misses"] + 1
+
+    # Uploading a new revision of the file should invalidate any cached renders
+    _upload_file(client, default_filepath, default_sample.item_id, replace_file=file_id)
+    new_stats = cache_stats()
+    assert new_stats["invalidations"] > stats["invalidations"]
+    render()
+    assert cache_stats()["misses"] == new_stats["misses"] + 1
+
+
+def test_render_cache_eviction(app, database, monkeypatch):
+    """Check that the running total size of the render cache is kept up to date without
+    recomputing it on every write, that the least recently used entries are evicted, and
+    that failing to evict does not fail the render."""
+    import types
+
+    import bson
+    import pymongo.errors
+
+    from pydatalab.blocks import render_cache
+    from pydatalab.config import CONFIG
+
+    database[render_cache.RENDER_CACHE_COLLECTION].delete_many({})
+    database[render_cache.RENDER_CACHE_TOTALS_COLLECTION].delete_many({})
+
+    computations = []
+    compute_total_size = render_cache._compute_total_size
+    monkeypatch.setattr(
+        render_cache,
+        "_compute_total_size",
+        lambda: computations.append(1) or compute_total_size(),
+    )
+
+    file_id = bson.ObjectId()
+    block = types.SimpleNamespace(blocktype="test", block_id="test", data={"file_id": file_id})
+    outputs = {"bokeh_plot_data": "x" * 1000}
+    entry_size = len(bson.encode(outputs))
+    monkeypatch.setattr(CONFIG, "RENDER_CACHE_MAX_SIZE_BYTES", 3 * entry_size)
+
+    def total():
+        return database[render_cache.RENDER_CACHE_TOTALS_COLLECTION].find_one()["size_bytes"]
+
+    with app.app_context():
+        for i in range(5):
+            assert render_cache.save_render_to_cache(f"key-{i}", block, outputs)
+            time.sleep(0.01)
+        assert len(computations) == 1
+        assert sorted(database[render_cache.RENDER_CACHE_COLLECTION].distinct("_id")) == [
+            "key-2",
+            "key-3",
+            "key-4",
+        ]
+        assert total() == 3 * entry_size
+
+        # Overwriting an entry only counts its change in size
+        assert render_cache.save_render_to_cache("key-4", block, {"bokeh_plot_data": "x"})
+        assert total() == 2 * entry_size + len(bson.encode({"bokeh_plot_data": "x"}))
+
+        assert render_cache.invalidate_render_cache(file_id) == 3
+        assert total() == 0
+        assert len(computations) == 1
+
+        def fail(*_):
+            raise pymongo.errors.PyMongoError("unavailable")
+
+        monkeypatch.setattr(render_cache, "_evict_least_recently_used", fail)
+        assert render_cache.save_render_to_cache("key-5", block, outputs)
+
+
+def test_render_cache_echem_summary_synthesis(app, database, monkeypatch):
+    """Check that editing the synthesis of the negative electrode of a cell
+    invalidates the cached render of its electrochemistry summary block."""
+    import datetime
+
+    import bson
+
+    from pydatalab.apps.echem_summary import EchemSumBlock
+
+    renders = []
+
+    def generate_echem_summary(self):
+        renders.append(self.data["item_id"])
+        self.data["freeform_comment"] = f"render {len(renders)}"
+
+    monkeypatch.setattr(EchemSumBlock, "generate_echem_summary", generate_echem_summary)
+
+    file_id = database.files.insert_one(
+        {"name": "summary.csv", "revision": 1, "last_modified": datetime.datetime.now()}
+    ).inserted_id
+    database.items.insert_many(
+        [
+            {
+                "item_id": "echem_sum_cell",
+                "refcode": "test:ECHEMSUMCELL",
+                "type": "cells",
+                "negative_electrode": [{"item": {"item_id": "echem_sum_anode"}}],
+            },
+            {
+                "item_id": "echem_sum_anode",
+                "refcode": "test:ECHEMSUMANODE",
+                "type": "samples",
+                "synthesis_description": "<table><tr><th>A</th></tr></table>",
+            },
+        ]
+    )
+
+    def render():
+        block = EchemSumBlock(
+            item_id="echem_sum_cell", init_data={"file_id": str(file_id)}, unique_id="echem_sum"
+        )
+        return block.to_web()["freeform_comment"]
+
+    with app.test_request_context():
+        assert render() == "render 1"
+        assert render() == "render 1"
+        database.items.update_one(
+            {"item_id": "echem_sum_anode"},
+            {"$set": {"synthesis_description": "<table><tr><th>B</th></tr></table>"}},
+        )
+        assert render() == "render 2"
+        assert len(renders) == 2
+
+    database.items.delete_many({"item_id": {"$in": ["echem_sum_cell", "echem_sum_anode"]}})
+    database.files.delete_one({"_id": bson.ObjectId(file_id)})
+
+
+def test_cycle_summary_store(
+    client, default_filepath, insert_default_sample, default_sample, database, monkeypatch
+):  # pylint: disable=unused-argument
+    file_id = _upload_file(client, default_filepath, default_sample.item_id)
+
+    # The summary should be computed at upload time
+    response = client.get(f"/files/{file_id}/cycle-summary")
+    assert response.status_code == 200
+    summary = response.json["cycle_summary"]
+    assert summary["status"] == "success"
+    assert summary["revision"] == 1
+    assert summary["item_ids"] == [default_sample.item_id]
+    assert len(summary["cycles"]) > 1
+    for cycle in summary["cycles"]:
+        assert {
+            "full cycle",
+            "charge capacity (mAh)",
+            "discharge capacity (mAh)",
+            "coulombic efficiency",
+            "min voltage (V)",
+            "max voltage (V)",
+            "duration (s)",
+        }.issubset(cycle)
+
+    response = client.post(
+        "/add-data-block/",
+        json={"block_type": "cycle", "item_id": default_sample.item_id, "index": 0},
+    )
+    assert response.status_code == 200
+    block_data = response.json["new_block_obj"]
+    block_data["file_id"] = file_id
+    block_data["derivative_mode"] = "final capacity"
+    response = client.post("/update-block/", json={"block_data": block_data})
+    assert response.status_code == 200
+    assert response.json["new_block_data"]["bokeh_plot_data"]
+    assert "errors" not in response.json["new_block_data"]
+
+    # A lost summary should be rebuilt from the up-to-date cache, without reparsing the file
+    import pydatalab.apps.echem.summary
+
+    def _no_reparse(*_, **__):
+        raise AssertionError("File should not be reparsed")
+
+    with monkeypatch.context() as m:
+        m.setattr(pydatalab.apps.echem.summary, "parse_incrementally", _no_reparse)
+        m.setattr(pydatalab.apps.echem.summary.ec, "echem_file_loader", _no_reparse)
+        database.cycle_summaries.delete_one({"file_id": ObjectId(file_id)})
+        block_data["derivative_mode"] = None
+        response = client.post("/update-block/", json={"block_data": block_data})
+        assert response.status_code == 200
+        assert "errors" not in response.json["new_block_data"]
+        response = client.get(f"/files/{file_id}/cycle-summary")
+        assert response.status_code == 200
+        rebuilt = response.json["cycle_summary"]
+        assert rebuilt["status"] == "success"
+        assert [c["full cycle"] for c in rebuilt["cycles"]] == [
+            c["full cycle"] for c in summary["cycles"]
+        ]
+        # The cached columns are stored in single precision
+        assert rebuilt["cycles"][1]["charge capacity (mAh)"] == pytest.approx(
+            summary["cycles"][1]["charge capacity (mAh)"], rel=1e-5
+        )
+
+    # A new revision of the file should be summarised again
+    _upload_file(client, default_filepath, default_sample.item_id, replace_file=file_id)
+    response = client.get(f"/files/{file_id}/cycle-summary")
+    assert response.status_code == 200
+    assert response.json["cycle_summary"]["revision"] == 2
+
+
+def test_background_render_job(
+    client, default_filepath, insert_default_sample, default_sample, monkeypatch
+):  # pylint: disable=unused-argument
+    from pydatalab.config import CONFIG
+
+    # Run jobs synchronously, as worker processes cannot share the test database
+    monkeypatch.setattr(CONFIG, "RENDER_JOBS_ENABLED", True)
+    monkeypatch.setattr(CONFIG, "RENDER_JOB_WORKERS", 0)
+
+    file_id = _upload_file(client, default_filepath, default_sample.item_id)
+    response = client.post(
+        "/add-data-block/",
+        json={"block_type": "cycle", "item_id": default_sample.item_id, "index": 0},
+    )
+    assert response.status_code == 200
+    block_data = response.json["new_block_obj"]
+    block_data["file_id"] = file_id
+    block_data["derivative_mode"] = "dV/dQ"
+
+    response = client.post(
+        "/update-block/", json={"block_data": block_data, "background": True, "save_to_db": True}
+    )
+    assert response.status_code == 202
+    render_job = response.json["new_block_data"]["render_job"]
+    assert render_job["status"] == "success"
+
+    response = client.get(f"/jobs/{render_job['job_id']}")
+    assert response.status_code == 200
+    job = response.json["job"]
+    assert job["status"] == "success"
+    assert job["progress"] == 1.0
+    assert job["blocktype"] == "cycle"
+    assert job["result"]["bokeh_plot_data"]
+    assert "render_job" not in job["result"]
+
+    # The rendered block should have been cached, so is now rendered synchronously
+    response = client.post("/update-block/", json={"block_data": block_data, "background": True})
+    assert response.status_code == 200
+    assert response.json["new_block_data"]["bokeh_plot_data"]
+    assert "render_job" not in response.json["new_block_data"]
+
+    assert client.get("/jobs/not-a-job-id").status_code == 404
+
+
+def test_parallel_block_rendering(
+    app, client, user_api_key, default_filepath, insert_default_sample, default_sample, monkeypatch
+):  # pylint: disable=unused-argument
+    from pydatalab.apps.echem import CycleBlock
+    from pydatalab.config import CONFIG
+    from pydatalab.mongo import flask_mongo
+    from pydatalab.routes.v0_1.items import reserialize_blocks
+
+    file_id = _upload_file(client, default_filepath, default_sample.item_id)
+
+    block_ids = []
+    for block_type in ("cycle", "comment", "cycle"):
+        response = client.post(
+            "/add-data-block/",
+            json={"block_type": block_type, "item_id": default_sample.item_id, "index": None},
+        )
+        assert response.status_code == 200
+        block_data = response.json["new_block_obj"]
+        block_ids.append(block_data["block_id"])
+        if block_type == "cycle":
+            block_data["file_id"] = file_id
+            block_data["title"] = f"Parallel block {len(block_ids)}"
+            response = client.post(
+                "/update-block/", json={"block_data": block_data, "save_to_db": True}
+            )
+            assert response.status_code == 200
+
+    # Render the blocks directly, as the full item query is not supported by mongomock
+    def get_blocks():
+        item = flask_mongo.db.items.find_one({"item_id": default_sample.item_id})
+        with app.test_request_context(headers={"DATALAB-API-KEY": user_api_key}):
+            return reserialize_blocks(item["display_order"], item["blocks_obj"])
+
+    monkeypatch.setattr(CONFIG, "BLOCK_RENDER_WORKERS", 1)
+    serial_blocks = get_blocks()
+    monkeypatch.setattr(CONFIG, "BLOCK_RENDER_WORKERS", 4)
+    parallel_blocks = get_blocks()
+
+    assert list(parallel_blocks) == list(serial_blocks)
+    assert [block_id for block_id in parallel_blocks if block_id in block_ids] == block_ids
+    for block_id in block_ids:
+        assert parallel_blocks[block_id]["block_id"] == block_id
+        assert parallel_blocks[block_id] == serial_blocks[block_id]
+    assert parallel_blocks[block_ids[0]]["bokeh_plot_data"]
+    assert parallel_blocks[block_ids[2]]["bokeh_plot_data"]
+
+    # A block that exceeds the timeout should be returned with an error, without stalling the others
+    monkeypatch.setattr(CONFIG, "BLOCK_RENDER_WORKERS", len(serial_blocks))
+    monkeypatch.setattr(CONFIG, "BLOCK_RENDER_TIMEOUT", 0.5)
+    monkeypatch.setattr(CONFIG, "RENDER_CACHE_ENABLED", False)
+    monkeypatch.setattr(CycleBlock, "plot_cycle", lambda self: time.sleep(2))
+    start = time.monotonic()
+    timed_out_blocks = get_blocks()
+    assert time.monotonic() - start < 2
+    for block_id in (block_ids[0], block_ids[2]):
+        assert "timed out" in timed_out_blocks[block_id]["errors"][0]
+        assert "bokeh_plot_data" not in timed_out_blocks[block_id]
+    assert timed_out_blocks[block_ids[1]] == serial_blocks[block_ids[1]]
@@ -1,4 +1,7 @@
+import hashlib
+import os
 import shutil
+import time
 
 import pytest
 
@@ -22,6 +25,11 @@ def test_upload(client, default_filepath, insert_default_sample, default_sample)
         )
     assert isinstance(response.json["file_id"], str)
     assert response.json["file_information"]
+    assert response.json["file_information"]["size"] == default_filepath.stat().st_size
+    assert (
+        response.json["file_information"]["sha256"]
+        == hashlib.sha256(default_filepath.read_bytes()).hexdigest()
+    )
     assert response.json["status"], "success"
     assert response.status_code == 201
 
@@ -118,3 +126,355 @@ def test_upload_new_version(
         == response.json["file_information"]["location"]
     )
     assert response_reup.json["file_id"] == response.json["file_id"]
+
+
+def test_upload_streamed_into_file_store(
+    client, default_filepath, insert_default_sample, default_sample, monkeypatch
+):  # pylint: disable=unused-argument
+    """Check that uploads are streamed straight into the file store, without werkzeug
+    spooling them to a temporary file, and that nothing is left behind on replacement."""
+    import werkzeug.formparser
+
+    def _no_spooling(*args, **kwargs):
+        raise AssertionError("Upload was spooled to a temporary file")
+
+    monkeypatch.setattr(werkzeug.formparser, "default_stream_factory", _no_spooling)
+
+    def _upload(replace_file):
+        with open(default_filepath, "rb") as f:
+            return client.post(
+                "/upload-file/",
+                buffered=True,
+                content_type="multipart/form-data",
+                data={
+                    "item_id": default_sample.item_id,
+                    "file": [(f, default_filepath.name)],
+                    "type": "application/octet-stream",
+                    "replace_file": replace_file,
+                    "relativePath": "null",
+                },
+            )
+
+    directories = set(os.listdir(CONFIG.FILE_DIRECTORY))
+    response = _upload("null")
+    assert response.status_code == 201
+    file_id = response.json["file_id"]
+    assert set(os.listdir(CONFIG.FILE_DIRECTORY)) - directories == {file_id}
+    with open(response.json["file_information"]["location"], "rb") as f:
+        assert f.read() == default_filepath.read_bytes()
+
+    response = _upload(file_id)
+    assert response.status_code == 201
+    assert response.json["file_id"] == file_id
+    assert (
+        response.json["file_information"]["sha256"]
+        == hashlib.sha256(default_filepath.read_bytes()).hexdigest()
+    )
+    assert set(os.listdir(CONFIG.FILE_DIRECTORY)) - directories == {file_id}
+
+
+def test_resumable_upload(
+    client, user_api_key, default_filepath, insert_default_sample, default_sample
+):  # pylint: disable=unused-argument
+    """Upload a file in several chunks, including a retry from a stale offset."""
+    data = default_filepath.read_bytes()
+    half = len(data) // 2
+
+    def offset_headers(offset):
+        return {"Upload-Offset": str(offset), "DATALAB_API_KEY": user_api_key}
+
+    response = client.post(
+        "/uploads/",
+        json={
+            "item_id": default_sample.item_id,
+            "filename": default_filepath.name,
+            "size": len(data),
+        },
+    )
+    assert response.status_code == 201, response.json
+    upload_id = response.json["upload_id"]
+    assert response.headers["Location"] == f"/uploads/{upload_id}"
+    assert response.headers["Upload-Offset"] == "0"
+
+    response = client.patch(f"/uploads/{upload_id}", data=data[:half], headers=offset_headers(0))
+    assert response.status_code == 204
+    assert response.headers["Upload-Offset"] == str(half)
+
+    # Resending the first chunk should be rejected with the current offset
+    response = client.patch(f"/uploads/{upload_id}", data=data[:half], headers=offset_headers(0))
+    assert response.status_code == 409
+    assert response.headers["Upload-Offset"] == str(half)
+
+    response = client.get(f"/uploads/{upload_id}")
+    assert response.status_code == 200
+    assert response.json["offset"] == half
+    assert response.json["size"] == len(data)
+
+    response = client.patch(f"/uploads/{upload_id}", data=data[half:], headers=offset_headers(half))
+    assert response.status_code == 201, response.json
+    file_information = response.json["file_information"]
+    assert response.json["file_id"] == upload_id
+    assert file_information["size"] == len(data)
+    assert file_information["sha256"] == hashlib.sha256(data).hexdigest()
+    with open(file_information["location"], "rb") as f:
+        assert f.read() == data
+
+    response = client.get(f"/uploads/{upload_id}")
+    assert response.status_code == 404
+
+    # Sending more bytes than expected should fail, and the upload can be cancelled
+    response = client.post(
+        "/uploads/",
+        json={"item_id": default_sample.item_id, "filename": default_filepath.name, "size": 10},
+    )
+    assert response.status_code == 201
+    upload_id = response.json["upload_id"]
+    response = client.patch(f"/uploads/{upload_id}", data=data[:20], headers=offset_headers(0))
+    assert response.status_code == 413
+
+    response = client.delete(f"/uploads/{upload_id}")
+    assert response.status_code == 200
+    assert not os.path.exists(os.path.join(CONFIG.FILE_DIRECTORY, upload_id))
+
+
+def test_deduplicated_upload(
+    client, default_filepath, insert_default_sample, default_sample, database, tmpdir
+):  # pylint: disable=unused-argument
+    """Upload the same file twice, check that it is stored once, then replace one copy
+    and check that the other is unaffected."""
+    from pydatalab.blob_store import blob_path, collect_garbage
+
+    def upload(path, replace_file="null"):
+        with open(path, "rb") as f:
+            response = client.post(
+                "/upload-file/",
+                buffered=True,
+                content_type="multipart/form-data",
+                data={
+                    "item_id": default_sample.item_id,
+                    "file": [(f, default_filepath.name)],
+                    "type": "application/octet-stream",
+                    "replace_file": replace_file,
+                    "relativePath": "null",
+                },
+            )
+        assert response.status_code == 201, response.json
+        return response.json["file_id"], response.json["file_information"]
+
+    data = default_filepath.read_bytes()
+    sha256 = hashlib.sha256(data).hexdigest()
+    first_id, first = upload(default_filepath)
+    second_id, second = upload(default_filepath)
+    assert first_id != second_id
+    assert first["location"] != second["location"]
+
+    blob = blob_path(sha256)
+    assert os.path.samefile(first["location"], blob)
+    assert os.path.samefile(second["location"], blob)
+
+    # Replacing the second file must not modify the contents of the first
+    new_version = tmpdir / default_filepath.name
+    new_version.write_binary(b"new revision")
+    _, second = upload(new_version, replace_file=second_id)
+    assert second["sha256"] == hashlib.sha256(b"new revision").hexdigest()
+    with open(second["location"], "rb") as f:
+        assert f.read() == b"new revision"
+    with open(first["location"], "rb") as f:
+        assert f.read() == data
+    assert os.path.samefile(first["location"], blob)
+
+    # Both blobs are still referenced, so nothing is collected
+    assert collect_garbage(database) == (0, 0)
+    assert blob.exists()
+
+    # Replacing a file again removes the blob of its previous revision, which is no longer used
+    previous_blob = blob_path(second["sha256"])
+    new_version.write_binary(b"another revision")
+    _, second = upload(new_version, replace_file=second_id)
+    assert not previous_blob.exists()
+    assert os.path.samefile(second["location"], blob_path(second["sha256"]))
+    assert blob.exists()
+
+
+def test_get_file_conditional_and_range(
+    client, user_api_key, default_filepath, insert_default_sample, default_sample, monkeypatch
+):  # pylint: disable=unused-argument
+    """Check range requests, strong ETags, conditional requests and proxy offloading."""
+    with open(default_filepath, "rb") as f:
+        response = client.post(
+            "/upload-file/",
+            buffered=True,
+            content_type="multipart/form-data",
+            data={
+                "item_id": default_sample.item_id,
+                "file": [(f, default_filepath.name)],
+                "type": "application/octet-stream",
+                "replace_file": "null",
+                "relativePath": "null",
+            },
+        )
+    assert response.status_code == 201
+    file_id = response.json["file_id"]
+    url = f"/files/{file_id}/{default_filepath.name}"
+    data = default_filepath.read_bytes()
+
+    def get(**headers):
+        return client.get(url, headers={"DATALAB_API_KEY": user_api_key, **headers})
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.data == data
+    assert response.headers["ETag"] == f'"{hashlib.sha256(data).hexdigest()}"'
+    assert response.headers["Accept-Ranges"] == "bytes"
+    etag = response.headers["ETag"]
+    last_modified = response.headers["Last-Modified"]
+
+    response = get(Range="bytes=100-199")
+    assert response.status_code == 206
+    assert response.data == data[100:200]
+    assert response.headers["Content-Range"] == f"bytes 100-199/{len(data)}"
+
+    response = get(**{"If-None-Match": etag})
+    assert response.status_code == 304
+    assert not response.data
+
+    response = get(**{"If-Modified-Since": last_modified})
+    assert response.status_code == 304
+
+    response = client.get(f"/files/{file_id}/missing.txt")
+    assert response.status_code == 404
+
+    monkeypatch.setattr(CONFIG, "FILE_SENDFILE_MODE", "x-accel-redirect")
+    response = client.get(url)
+    assert response.status_code == 200
+    assert not response.data
+    assert response.headers["ETag"] == etag
+    assert (
+        response.headers["X-Accel-Redirect"]
+        == f"{CONFIG.FILE_ACCEL_REDIRECT_PREFIX}{file_id}/{default_filepath.name}"
+    )
+
+    response = get(**{"If-None-Match": etag})
+    assert response.status_code == 304
+    assert "X-Accel-Redirect" not in response.headers
+
+    monkeypatch.setattr(CONFIG, "FILE_SENDFILE_MODE", "x-sendfile")
+    response = client.get(url)
+    assert response.headers["X-Sendfile"] == os.path.join(
+        CONFIG.FILE_DIRECTORY, file_id, default_filepath.name
+    )
+
+
+def test_live_file_unchanged_not_resynced(app, database, tmp_path, monkeypatch):
+    """Check that reading an unchanged live file neither increments its revision nor
+    reparses it, and that a new version on the remote does both exactly once."""
+    import datetime
+
+    import pydatalab.file_utils
+    from pydatalab.config import RemoteFilesystem
+    from pydatalab.file_utils import get_file_info_by_id
+
+    refreshes = []
+    monkeypatch.setattr(
+        pydatalab.file_utils,
+        "_refresh_derived_file_data",
+        lambda file_info: refreshes.append(file_info["_id"]),
+    )
+    monkeypatch.setattr(
+        CONFIG, "REMOTE_FILESYSTEMS", [RemoteFilesystem(name="live", path=tmp_path)]
+    )
+
+    remote_file = tmp_path / "cycling.mpr"
+    remote_file.write_bytes(b"initial data")
+    remote_timestamp = datetime.datetime.fromtimestamp(remote_file.stat().st_mtime)
+
+    file_id = database.files.insert_one(
+        {
+            "name": "cycling.mpr",
+            "extension": ".mpr",
+            "source_server_name": "live",
+            "source_path": "cycling.mpr",
+            "last_modified_remote": remote_timestamp,
+            "is_live": True,
+            "revision": 1,
+            "time_added": remote_timestamp,
+            "last_modified": remote_timestamp,
+            "item_ids": [],
+            "blocks": [],
+        }
+    ).inserted_id
+    location = os.path.join(CONFIG.FILE_DIRECTORY, str(file_id), "cycling.mpr")
+    os.makedirs(os.path.dirname(location))
+    shutil.copy(remote_file, location)
+    database.files.update_one({"_id": file_id}, {"$set": {"location": location}})
+
+    with app.test_request_context():
+        for _ in range(2):
+            file_info = get_file_info_by_id(file_id)
+            assert file_info["revision"] == 1
+            assert file_info["is_live"]
+        assert not refreshes
+        assert database.files.find_one({"_id": file_id})["revision"] == 1
+
+        remote_file.write_bytes(b"initial data, and some more")
+        newer = time.time() + 60 * (CONFIG.REMOTE_CACHE_MAX_AGE + 1)
+        os.utime(remote_file, (newer, newer))
+        file_info = get_file_info_by_id(file_id)
+        assert file_info["revision"] == 2
+        assert refreshes == [file_id]
+        with open(location, "rb") as f:
+            assert f.read() == b"initial data, and some more"
+
+
+def test_live_file_sync_releases_previous_blob(app, database, tmp_path, monkeypatch):
+    """Check that syncing new revisions of a live file does not leave the blob of
+    every previous revision behind in the blob store."""
+    import datetime
+
+    import pydatalab.file_utils
+    from pydatalab.blob_store import blob_path
+    from pydatalab.config import RemoteFilesystem
+    from pydatalab.file_utils import get_file_info_by_id
+
+    monkeypatch.setattr(pydatalab.file_utils, "_refresh_derived_file_data", lambda _: None)
+    monkeypatch.setattr(
+        CONFIG, "REMOTE_FILESYSTEMS", [RemoteFilesystem(name="live", path=tmp_path)]
+    )
+
+    remote_file = tmp_path / "growing.csv"
+    remote_file.write_bytes(b"revision 0")
+    remote_timestamp = datetime.datetime.fromtimestamp(remote_file.stat().st_mtime)
+
+    file_id = database.files.insert_one(
+        {
+            "name": "growing.csv",
+            "extension": ".csv",
+            "source_server_name": "live",
+            "source_path": "growing.csv",
+            "last_modified_remote": remote_timestamp,
+            "time_added": remote_timestamp,
+            "last_modified": remote_timestamp,
+            "is_live": True,
+            "revision": 1,
+            "item_ids": [],
+            "blocks": [],
+        }
+    ).inserted_id
+    location = os.path.join(CONFIG.FILE_DIRECTORY, str(file_id), "growing.csv")
+    os.makedirs(os.path.dirname(location))
+    shutil.copy(remote_file, location)
+    database.files.update_one({"_id": file_id}, {"$set": {"location": location}})
+
+    hashes = []
+    with app.test_request_context():
+        for revision in (1, 2):
+            remote_file.write_bytes(f"revision {revision}".encode())
+            newer = time.time() + 60 * (CONFIG.REMOTE_CACHE_MAX_AGE + 1) * revision
+            os.utime(remote_file, (newer, newer))
+            file_info = get_file_info_by_id(file_id)
+            assert file_info["revision"] == revision + 1
+            hashes.append(file_info["sha256"])
+
+    assert hashes[0] == hashlib.sha256(b"revision 1").hexdigest()
+    assert not blob_path(hashes[0]).exists()
+    assert os.path.samefile(blob_path(hashes[1]), location)
@@ -4,7 +4,7 @@ from pydatalab.models import Cell, Sample
 from pydatalab.models.samples import Constituent
 
 
-def test_simple_graph(admin_client):
+def test_simple_graph(admin_client, admin_api_key):
     """Test the graph API with a simple manually constructed graph.
     All samples are uploaded without a creator so the test client needs admin priveleges.
 
@@ -78,6 +78,19 @@ def test_simple_graph(admin_client):
 
     assert len(graph["edges"]) == 3
 
+    response = admin_client.get(
+        "/item-graph",
+        headers={"Accept": "application/x-ndjson", "DATALAB_API_KEY": admin_api_key},
+    )
+    assert response.mimetype == "application/x-ndjson"
+    elements = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [e["data"] for e in elements if e["group"] == "nodes"] == [
+        n["data"] for n in graph["nodes"]
+    ]
+    assert [e["data"] for e in elements if e["group"] == "edges"] == [
+        e["data"] for e in graph["edges"]
+    ]
+
     graph = admin_client.get("/item-graph/child_1").json
     assert len(graph["nodes"]) == 2
     assert len(graph["edges"]) == 1
@@ -108,4 +121,197 @@ def test_simple_graph(admin_client):
 
     graph = admin_client.get("/item-graph/parent").json
     assert len(graph["nodes"]) == 5
-    assert len(graph["edges"]) == 8
+    assert len(graph["edges"]) == 6
+
+
+def test_graph_depth_and_budget(admin_client):
+    """Test that item graphs are traversed to the requested depth, truncated to the
+    node budget and updated when new relationships are added.
+
+    """
+    chain = [Sample(item_id="chain_0")]
+    for ind in range(1, 4):
+        chain.append(
+            Sample(
+                item_id=f"chain_{ind}",
+                synthesis_constituents=[
+                    Constituent(
+                        item={"type": "samples", "item_id": f"chain_{ind - 1}"}, quantity=None
+                    ),
+                ],
+            )
+        )
+
+    response = admin_client.post(
+        "/new-samples/",
+        json={"new_sample_datas": [json.loads(d.json()) for d in chain]},
+    )
+    assert response.status_code == 207
+
+    graph = admin_client.get("/item-graph/chain_3").json
+    assert {n["data"]["id"] for n in graph["nodes"]} == {"chain_2", "chain_3"}
+    assert not graph["truncated"]
+
+    graph = admin_client.get("/item-graph/chain_3?depth=2").json
+    assert {n["data"]["id"] for n in graph["nodes"]} == {"chain_1", "chain_2", "chain_3"}
+    assert len(graph["edges"]) == 2
+
+    graph = admin_client.get("/item-graph/chain_1?depth=5").json
+    assert len(graph["nodes"]) == 4
+    assert len(graph["edges"]) == 3
+
+    graph = admin_client.get("/item-graph/chain_3?depth=5&max_nodes=2").json
+    assert graph["truncated"]
+    assert {n["data"]["id"] for n in graph["nodes"]} == {"chain_2", "chain_3"}
+
+    response = admin_client.get("/item-graph/chain_3?depth=0")
+    assert response.status_code == 400
+
+    response = admin_client.post(
+        "/new-sample/",
+        json={
+            "new_sample_data": json.loads(
+                Sample(
+                    item_id="chain_4",
+                    synthesis_constituents=[
+                        Constituent(item={"type": "samples", "item_id": "chain_3"}, quantity=None),
+                    ],
+                ).json()
+            )
+        },
+    )
+    assert response.status_code == 201
+
+    graph = admin_client.get("/item-graph/chain_3").json
+    assert {n["data"]["id"] for n in graph["nodes"]} == {"chain_2", "chain_3", "chain_4"}
+
+
+def test_edges(admin_client, database):
+    """Test that the edge index follows relationships declared in either direction,
+    and can be rebuilt from scratch.
+
+    """
+    from pydatalab.edges import (
+        ancestors,
+        descendants,
+        neighbourhood,
+        rebuild_edges,
+        update_item_edges,
+    )
+
+    grandparent = Sample(item_id="edge_grandparent")
+    parent = Sample(
+        item_id="edge_parent",
+        synthesis_constituents=[
+            Constituent(item={"type": "samples", "item_id": "edge_grandparent"}, quantity=None),
+        ],
+    )
+    sibling = Sample(
+        item_id="edge_sibling",
+        synthesis_constituents=[
+            Constituent(item={"type": "samples", "item_id": "edge_grandparent"}, quantity=None),
+        ],
+    )
+    response = admin_client.post(
+        "/new-samples/",
+        json={"new_sample_datas": [json.loads(d.json()) for d in (grandparent, parent, sibling)]},
+    )
+    assert response.status_code == 207
+
+    # Relationships can also be declared from parent to child, and refer to items by refcode
+    parent_refcode = database.items.find_one({"item_id": "edge_parent"})["refcode"]
+    database.items.insert_many(
+        [
+            {
+                "item_id": "edge_child",
+                "type": "samples",
+                "refcode": "test:EDGEC",
+                "relationships": [
+                    {"type": "samples", "relation": "parent", "refcode": parent_refcode}
+                ],
+            },
+            {"item_id": "edge_adopted", "type": "samples", "refcode": "test:EDGEA"},
+        ]
+    )
+    database.items.update_one(
+        {"item_id": "edge_parent"},
+        {
+            "$push": {
+                "relationships": {"type": "samples", "relation": "child", "item_id": "edge_adopted"}
+            }
+        },
+    )
+    update_item_edges({"item_id": {"$in": ["edge_parent", "edge_child"]}}, database=database)
+
+    assert ancestors("edge_child", database=database) == {"edge_parent": 1, "edge_grandparent": 2}
+    assert ancestors("edge_child", max_depth=1, database=database) == {"edge_parent": 1}
+    assert descendants("edge_grandparent", database=database) == {
+        "edge_parent": 1,
+        "edge_sibling": 1,
+        "edge_child": 2,
+        "edge_adopted": 2,
+    }
+    assert neighbourhood("edge_parent", k=1, database=database) == {
+        "edge_grandparent": 1,
+        "edge_child": 1,
+        "edge_adopted": 1,
+    }
+    assert neighbourhood("edge_parent", k=2, database=database)["edge_sibling"] == 2
+
+    response = admin_client.get("/get-item-data/edge_parent")
+    assert response.json["parent_items"] == ["edge_grandparent"]
+    assert response.json["child_items"] == ["edge_adopted", "edge_child"]
+
+    edges = list(database.edges.find({}, projection={"_id": 0}).sort("target"))
+    database.edges.delete_many({})
+    rebuild_edges(database)
+    assert list(database.edges.find({}, projection={"_id": 0}).sort("target")) == edges
+
+    response = admin_client.post("/delete-sample/", json={"item_id": "edge_child"})
+    assert response.status_code == 200
+    assert descendants("edge_parent", database=database) == {"edge_adopted": 1}
+
+
+def test_edges_resolve_references_to_later_items(database):
+    """Test that references by refcode or immutable ID to items that do not exist yet
+    are resolved to `item_id`s once the referenced items are created."""
+    from bson import ObjectId
+
+    from pydatalab.edges import ancestors, update_item_edges, update_referencing_edges
+
+    later_id = ObjectId()
+    database.items.insert_one(
+        {
+            "item_id": "edge_early_child",
+            "type": "samples",
+            "refcode": "test:EDGEEARLY",
+            "relationships": [
+                {"type": "samples", "relation": "parent", "refcode": "test:EDGELATER"},
+                {"type": "samples", "relation": "parent", "immutable_id": later_id},
+            ],
+        }
+    )
+    update_item_edges({"item_id": "edge_early_child"}, database=database)
+    assert ancestors("edge_early_child", database=database) == {
+        "test:EDGELATER": 1,
+        str(later_id): 1,
+    }
+
+    database.items.insert_many(
+        [
+            {"item_id": "edge_later_parent", "type": "samples", "refcode": "test:EDGELATER"},
+            {
+                "_id": later_id,
+                "item_id": "edge_later_other",
+                "type": "samples",
+                "refcode": "test:EDGEOTHER",
+            },
+        ]
+    )
+    update_referencing_edges(
+        {"item_id": {"$in": ["edge_later_parent", "edge_later_other"]}}, database=database
+    )
+    assert ancestors("edge_early_child", database=database) == {
+        "edge_later_parent": 1,
+        "edge_later_other": 1,
+    }
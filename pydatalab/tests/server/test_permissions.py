@@ -25,3 +25,47 @@ def test_deactivated_user_permissions(deactivated_client):
 
     response = client.get("/starting-materials/")
     assert response.status_code == 200
+
+
+def test_managed_users_are_cached(
+    app, admin_client, user_api_key, user_id, deactivated_user_id, monkeypatch
+):
+    """Test that the managed users of a user are looked up at most once across requests,
+    until the managers of a user are changed.
+
+    """
+    import pydatalab.permissions
+    from pydatalab.permissions import get_default_permissions, invalidate_permissions_cache
+
+    database_calls = []
+    get_database = pydatalab.permissions.get_database
+
+    def counting_get_database():
+        database_calls.append(1)
+        return get_database()
+
+    monkeypatch.setattr(pydatalab.permissions, "get_database", counting_get_database)
+    invalidate_permissions_cache()
+
+    def get_permitted_creators():
+        with app.test_request_context(headers={"DATALAB-API-KEY": user_api_key}):
+            permissions = [get_default_permissions(user_only=True) for _ in range(3)]
+            assert all(p == permissions[0] for p in permissions)
+            return permissions[0]["creator_ids"]["$in"]
+
+    assert get_permitted_creators() == [user_id]
+    assert get_permitted_creators() == [user_id]
+    assert len(database_calls) == 1
+
+    response = admin_client.patch(
+        f"/users/{deactivated_user_id}", json={"managers": [str(user_id)]}
+    )
+    assert response.status_code == 200
+    try:
+        assert get_permitted_creators() == [user_id, deactivated_user_id]
+        assert len(database_calls) == 2
+    finally:
+        response = admin_client.patch(f"/users/{deactivated_user_id}", json={"managers": []})
+        assert response.status_code == 200
+
+    assert get_permitted_creators() == [user_id]
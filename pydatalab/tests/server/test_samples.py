@@ -146,7 +146,14 @@ def test_create_indices(real_mongo_client):
 
     create_default_indices(real_mongo_client)
     indexes = list(real_mongo_client.get_database().items.list_indexes())
-    expected_index_names = ("_id_", "items full-text search", "item type", "unique item ID")
+    expected_index_names = (
+        "_id_",
+        "items full-text search",
+        "item type",
+        "unique item ID",
+        "relationships refcode",
+        "relationships immutable id",
+    )
     names = [index["name"] for index in indexes]
 
     assert all(name in names for name in expected_index_names)
@@ -597,3 +604,182 @@ def test_items_added_to_existing_collection(client, default_collection, default_
         len([d for d in response.json["item_data"]["relationships"] if d["type"] == "collections"])
         == 1
     )
+
+
+def test_item_summaries(client, database):
+    from pydatalab.item_summaries import rebuild_item_summaries
+
+    def get_summary(item_id):
+        response = client.get("/samples/")
+        assert response.status_code == 200
+        summaries = [s for s in response.json["samples"] if s["item_id"] == item_id]
+        return summaries[0] if summaries else None
+
+    item_id = "summarised_sample"
+    response = client.post(
+        "/new-sample/", json=json.loads(Sample(item_id=item_id, name="Summarised").json())
+    )
+    assert response.status_code == 201, response.json
+
+    summary = get_summary(item_id)
+    assert summary["name"] == "Summarised"
+    assert summary["nblocks"] == 0
+    assert summary["collections"] == []
+    assert "_id" not in summary
+    assert "creator_ids" not in summary
+
+    # Adding blocks and saving the item should update the summary
+    response = client.post(
+        "/add-data-block/", json={"block_type": "comment", "item_id": item_id, "index": 0}
+    )
+    assert response.status_code == 200
+    response = client.post(
+        "/save-item/", json={"item_id": item_id, "data": {"type": "samples", "name": "Renamed"}}
+    )
+    assert response.status_code == 200, response.json
+    summary = get_summary(item_id)
+    assert summary["nblocks"] == 1
+    assert summary["name"] == "Renamed"
+
+    # Changes to collection membership should update the summary
+    response = client.put(
+        "/collections",
+        json={
+            "data": {
+                "collection_id": "summary_collection",
+                "starting_members": [{"item_id": item_id}],
+            }
+        },
+    )
+    assert response.status_code == 201, response.json
+    assert get_summary(item_id)["collections"] == [{"collection_id": "summary_collection"}]
+
+    response = client.delete("/collections/summary_collection")
+    assert response.status_code == 200
+    assert get_summary(item_id)["collections"] == []
+
+    # A rebuild from scratch should give identical summaries
+    listing = client.get("/samples/").json["samples"]
+    database.item_summaries.delete_many({})
+    database.item_summaries.insert_one({"_id": "stale", "item_id": "stale", "type": "samples"})
+    rebuild_item_summaries(database)
+    assert client.get("/samples/").json["samples"] == listing
+
+    response = client.post("/delete-sample/", json={"item_id": item_id})
+    assert response.status_code == 200
+    assert get_summary(item_id) is None
+
+
+def test_paginated_samples(client, user_api_key):
+    dates = [datetime.datetime(2020, 1, day) for day in (1, 2, 2, 2, 3)]
+    for ind, date in enumerate(dates):
+        sample = Sample(item_id=f"paginated_sample_{ind}", date=date)
+        response = client.post("/new-sample/", json=json.loads(sample.json()))
+        assert response.status_code == 201, response.json
+
+    date_range = "date_from=2020-01-01T00:00:00&date_to=2020-01-03T00:00:00"
+    response = client.get(f"/samples/?{date_range}")
+    assert response.status_code == 200
+    assert "next_cursor" not in response.json
+    expected = [s["item_id"] for s in response.json["samples"]]
+    assert sorted(expected) == [f"paginated_sample_{ind}" for ind in range(5)]
+
+    # Pages should be stable and non-overlapping, including for equal dates
+    for order, expected_order in (("desc", expected), ("asc", expected[::-1])):
+        item_ids = []
+        cursor = ""
+        while True:
+            response = client.get(
+                f"/samples/?{date_range}&limit=2&order={order}&fields=item_id&cursor={cursor}"
+            )
+            assert response.status_code == 200, response.json
+            assert len(response.json["samples"]) <= 2
+            assert all(list(s) == ["item_id"] for s in response.json["samples"])
+            item_ids += [s["item_id"] for s in response.json["samples"]]
+            cursor = response.json["next_cursor"]
+            if cursor is None:
+                break
+        assert item_ids == expected_order
+
+    response = client.get(f"/samples/?{date_range}&type=cells")
+    assert response.status_code == 200
+    assert response.json["samples"] == []
+
+    for params in ("limit=0", "sort=name", "fields=blocks_obj", "type=equipment", "cursor=abc"):
+        response = client.get(f"/samples/?{params}")
+        assert response.status_code == 400, params
+
+    # The same pages should be streamed as NDJSON if requested
+    response = client.get(
+        f"/samples/?{date_range}&limit=3&fields=item_id",
+        headers={"Accept": "application/x-ndjson", "DATALAB_API_KEY": user_api_key},
+    )
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [line["item_id"] for line in lines[:-1]] == expected[:3]
+    response = client.get(
+        f"/samples/?{date_range}&limit=3&fields=item_id&cursor={lines[-1]['next_cursor']}",
+        headers={"Accept": "application/x-ndjson", "DATALAB_API_KEY": user_api_key},
+    )
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [line["item_id"] for line in lines] == expected[3:]
+
+    for ind in range(5):
+        client.post("/delete-sample/", json={"item_id": f"paginated_sample_{ind}"})
+
+
+def test_bulk_create_samples(client, database):
+    response = client.put(
+        "/collections", json={"data": {"collection_id": "bulk_collection", "starting_members": []}}
+    )
+    assert response.status_code == 201, response.json
+
+    response = client.post("/new-sample/", json=json.loads(Sample(item_id="bulk_existing").json()))
+    assert response.status_code == 201, response.json
+
+    new_samples = [
+        json.loads(s.json())
+        for s in (
+            Sample(item_id="bulk_0", name="first"),
+            Sample(item_id="bulk_existing"),
+            Sample(item_id="bulk_1"),
+            Sample(item_id="bulk_1"),
+            Sample(item_id="bulk_2"),
+            Sample(item_id="bulk_3", name="copied"),
+            Sample(item_id="bulk_4"),
+        )
+    ]
+    new_samples[2]["collections"] = [{"collection_id": "bulk_collection"}]
+    new_samples[4]["collections"] = [{"collection_id": "missing_collection"}]
+    response = client.post(
+        "/new-samples/",
+        json={
+            "new_sample_datas": new_samples,
+            "copy_from_item_ids": [None, None, None, None, None, "bulk_existing", "missing"],
+        },
+    )
+    assert response.status_code == 207, response.json
+    assert response.json["http_codes"] == [201, 409, 201, 409, 401, 201, 404]
+    assert response.json["nsuccess"] == 3
+    assert response.json["nerror"] == 4
+
+    refcodes = [
+        r["sample_list_entry"]["refcode"]
+        for r in response.json["responses"]
+        if "sample_list_entry" in r
+    ]
+    assert len(set(refcodes)) == 3
+
+    created = {
+        doc["item_id"]: doc
+        for doc in database.items.find({"item_id": {"$in": [f"bulk_{i}" for i in range(5)]}})
+    }
+    assert set(created) == {"bulk_0", "bulk_1", "bulk_3"}
+    assert created["bulk_3"]["name"] == "copied"
+    collection = database.collections.find_one({"collection_id": "bulk_collection"})
+    assert [r["immutable_id"] for r in created["bulk_1"]["relationships"]] == [collection["_id"]]
+
+    for item_id in ("bulk_existing", *created):
+        client.post("/delete-sample/", json={"item_id": item_id})
+    client.delete("/collections/bulk_collection")
@@ -114,3 +114,35 @@ def test_user_update_admin(admin_client, real_mongo_client, user_id):
     assert resp.status_code == 200
     user = real_mongo_client.get_database().users.find_one({"_id": user_id})
     assert user["display_name"] == "Test Person"
+
+
+def test_user_cache(client, admin_client, user_id, monkeypatch):
+    """Test that authenticated users are cached between requests, and that the
+    cache is invalidated when their details are changed."""
+    import pydatalab.login
+
+    lookups = []
+    get_by_id = pydatalab.login.get_by_id
+
+    def counting_get_by_id(user_id):
+        lookups.append(user_id)
+        return get_by_id(user_id)
+
+    monkeypatch.setattr(pydatalab.login, "get_by_id", counting_get_by_id)
+    pydatalab.login.invalidate_user_cache()
+
+    display_name = client.get("/get-current-user/").json["display_name"]
+    for _ in range(3):
+        resp = client.get("/get-current-user/")
+        assert resp.status_code == 200
+        assert resp.json["display_name"] == display_name
+    assert lookups.count(str(user_id)) == 1
+
+    resp = admin_client.patch(f"/users/{user_id}", json={"display_name": "Cached Person"})
+    assert resp.status_code == 200
+    resp = client.get("/get-current-user/")
+    assert resp.json["display_name"] == "Cached Person"
+    assert lookups.count(str(user_id)) == 2
+
+    resp = admin_client.patch(f"/users/{user_id}", json={"display_name": display_name})
+    assert resp.status_code == 200
@@ -0,0 +1,98 @@
+import os
+
+import mongomock
+import pytest
+
+import pydatalab.models.utils
+import pydatalab.mongo
+from pydatalab.mongo import MONGO_POOL_STATS, _get_active_mongo_client
+
+
+@pytest.fixture(autouse=True)
+def reset_mongo_clients():
+    """Make sure that no clients are shared with other tests."""
+    pydatalab.mongo._reset_after_fork()
+    yield
+    pydatalab.mongo._reset_after_fork()
+
+
+@mongomock.patch(on_new="create")
+def test_mongo_client_is_reused():
+    client = _get_active_mongo_client()
+    assert _get_active_mongo_client() is client
+    assert _get_active_mongo_client(timeoutMS=100) is not client
+
+    # Clients inherited over a fork must be recreated
+    pydatalab.mongo._reset_after_fork()
+    assert _get_active_mongo_client() is not client
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires `os.fork`")
+@mongomock.patch(on_new="create")
+def test_mongo_client_recreated_after_fork():
+    client = _get_active_mongo_client()
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        os.write(write_fd, b"1" if _get_active_mongo_client() is not client else b"0")
+        os._exit(0)
+
+    os.close(write_fd)
+    os.waitpid(pid, 0)
+    assert os.read(read_fd, 1) == b"1"
+    assert _get_active_mongo_client() is client
+
+
+def test_mongo_pool_metrics():
+    metrics = pydatalab.mongo._POOL_METRICS
+
+    for _ in range(3):
+        metrics.connection_check_out_started(None)
+        metrics.connection_checked_out(None)
+    metrics.connection_checked_in(None)
+    metrics.connection_check_out_started(None)
+    metrics.connection_check_out_failed(None)
+
+    assert MONGO_POOL_STATS["checkouts"] == 3
+    assert MONGO_POOL_STATS["connections_checked_out"] == 2
+    assert MONGO_POOL_STATS["checkout_failures"] == 1
+    assert MONGO_POOL_STATS["checkout_wait_max_ms"] >= 0
+    assert MONGO_POOL_STATS["checkout_wait_total_ms"] >= MONGO_POOL_STATS["checkout_wait_max_ms"]
+
+
+def test_refcode_permutation_is_bijective():
+    from pydatalab.models.utils import _permute_index
+
+    half_size = 26
+    permuted = [_permute_index(index, half_size) for index in range(half_size**2)]
+    assert sorted(permuted) == list(range(half_size**2))
+    assert permuted[:10] != list(range(10))
+
+
+@mongomock.patch(on_new="create")
+def test_refcode_allocation():
+    from pydatalab.config import CONFIG
+    from pydatalab.models.utils import (
+        PermutedCounterRefcodeFactory,
+        generate_unique_refcode,
+        generate_unique_refcodes,
+    )
+    from pydatalab.mongo import get_database
+
+    assert CONFIG.REFCODE_GENERATOR is PermutedCounterRefcodeFactory
+
+    refcodes = generate_unique_refcodes(100)
+    assert len(set(refcodes)) == 100
+    assert all(refcode.split(":")[1].isalpha() for refcode in refcodes)
+    assert get_database().counters.find_one({"_id": "refcodes"})["value"] == 100
+
+    # Codes already assigned to items (e.g., by the random generator) should be skipped
+    next_refcode = PermutedCounterRefcodeFactory._encode(
+        pydatalab.models.utils._permute_index(100, 26**3)
+    )
+    get_database().items.insert_one({"refcode": f"{CONFIG.IDENTIFIER_PREFIX}:{next_refcode}"})
+    refcode = generate_unique_refcode()
+    assert refcode not in refcodes
+    assert refcode.split(":")[1] != next_refcode
+    assert get_database().counters.find_one({"_id": "refcodes"})["value"] == 102
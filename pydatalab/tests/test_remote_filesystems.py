@@ -1,4 +1,5 @@
 import datetime
+import os
 import subprocess as sp
 import time
 from pathlib import Path
@@ -118,26 +119,200 @@ def test_get_directory_structure_remote():
     assert dir_structure["last_updated"]
 
 
-def test_scp_escape_spaces():
-    """Test whether the escaping function for scp paths works correctly
+def test_split_remote_path_spaces():
+    """Test whether remote paths are split into their host and unescaped path
     in edge cases: already-escaped spaces, mixtures etc."""
-    from pydatalab.file_utils import _escape_spaces_scp_path
+    from pydatalab.remote_transfer import split_remote_path
 
-    assert (
-        _escape_spaces_scp_path(r"ssh://host:path with spaces")
-        == r'ssh://host:"path\ with\ spaces"'
+    assert split_remote_path(r"ssh://host:path with spaces") == ("ssh://host", "path with spaces")
+    assert split_remote_path(r"ssh://host:path with spaces/in two places/") == (
+        "ssh://host",
+        "path with spaces/in two places/",
     )
-    assert (
-        _escape_spaces_scp_path(r"ssh://host:path with spaces/in two places/")
-        == r'ssh://host:"path\ with\ spaces/in\ two\ places/"'
+    assert split_remote_path(
+        r"ssh://user@host:path with spaces/in two places/with\ some already\ escaped"
+    ) == ("ssh://user@host", "path with spaces/in two places/with some already escaped")
+    assert split_remote_path(r"ssh://host:path_without_spaces") == (
+        "ssh://host",
+        "path_without_spaces",
     )
-    assert (
-        _escape_spaces_scp_path(
-            r"ssh://host:path with spaces/in two places/with\ some already\ escaped"
+    with pytest.raises(ValueError):
+        split_remote_path("/local/path")
+
+
+def test_remote_transfer_with_local_remote(tmp_path, monkeypatch):
+    """Check stat batching, pooling, parallel transfers and delta transfers against
+    a fake SSH connection that runs commands and SFTP transfers locally."""
+    import io
+
+    import pydatalab.remote_transfer as remote_transfer
+
+    class LocalSFTPFile(io.FileIO):
+        def stat(self):
+            return os.fstat(self.fileno())
+
+        def prefetch(self, file_size=None):
+            pass
+
+    class LocalConnection:
+        is_active = True
+        connects = 0
+
+        def __init__(self):
+            LocalConnection.connects += 1
+            self.last_used = time.monotonic()
+
+        def run(self, command):
+            process = sp.run(command, shell=True, capture_output=True, text=True)
+            return process.returncode, process.stdout, process.stderr
+
+        def sftp(self):
+            return self
+
+        def open(self, path, mode):
+            return LocalSFTPFile(path, mode.replace("b", ""))
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(
+        remote_transfer.SSHConnectionPool, "_connect", lambda self: LocalConnection()
+    )
+    monkeypatch.setattr(remote_transfer, "_POOLS", {})
+
+    remote_dir = tmp_path / "remote dir"
+    remote_dir.mkdir()
+    paths = []
+    for i in range(5):
+        path = remote_dir / f"file {i}.txt"
+        path.write_text(str(i))
+        paths.append(str(path))
+
+    timestamps = remote_transfer.stat_remote_files("ssh://host", paths + ["/missing"])
+    assert timestamps["/missing"] is None
+    assert all(
+        timestamps[path] == datetime.datetime.fromtimestamp(int(os.path.getmtime(path)))
+        for path in paths
+    )
+
+    local_dir = tmp_path / "local"
+    local_dir.mkdir()
+    results = remote_transfer.fetch_remote_files(
+        [("ssh://host", path, local_dir / f"{i}.txt") for i, path in enumerate(paths)]
+        + [("ssh://host", "/missing", local_dir / "missing.txt")]
+    )
+    assert all(results[str(local_dir / f"{i}.txt")].error is None for i in range(5))
+    assert isinstance(results[str(local_dir / "missing.txt")].error, RuntimeError)
+    assert [(local_dir / f"{i}.txt").read_text() for i in range(5)] == [str(i) for i in range(5)]
+
+    # Connections are reused rather than opened for every operation
+    assert LocalConnection.connects <= CONFIG.REMOTE_SSH_POOL_SIZE
+
+    # Only the appended bytes of a growing file are transferred, for both remote and mounted files
+    monkeypatch.setattr(CONFIG, "REMOTE_DELTA_CHECK_BYTES", 16)
+    remote_file = remote_dir / "growing.csv"
+    initial = b"header\n" + b"1,2\n" * 100
+    remote_file.write_bytes(initial)
+    for hostname in ("ssh://host", None):
+        previous = local_dir / "growing.csv"
+        previous.write_bytes(initial)
+        remote_file.write_bytes(initial + b"3,4\n" * 10)
+        result = remote_transfer.fetch_remote_file(
+            hostname, str(remote_file), local_dir / "new.csv", previous=previous
         )
-        == r'ssh://host:"path\ with\ spaces/in\ two\ places/with\ some\ already\ escaped"'
+        assert result.delta
+        assert result.bytes_transferred == 40
+        assert (local_dir / "new.csv").read_bytes() == remote_file.read_bytes()
+
+        # If the previously synced contents have changed, the whole file is transferred
+        remote_file.write_bytes(b"HEADER\n" + remote_file.read_bytes()[7:] + b"5,6\n")
+        result = remote_transfer.fetch_remote_file(
+            hostname, str(remote_file), local_dir / "new.csv", previous=previous
+        )
+        assert not result.delta
+        assert result.bytes_transferred == remote_file.stat().st_size
+        assert (local_dir / "new.csv").read_bytes() == remote_file.read_bytes()
+        remote_file.write_bytes(initial)
+
+
+def test_remote_transfers_wait_for_pooled_connections(tmp_path, monkeypatch):
+    """Check that slow transfers of more files than there are pooled connections to a
+    host wait for a free connection rather than failing."""
+    import io
+    import threading
+
+    import pydatalab.remote_transfer as remote_transfer
+
+    class LocalSFTPFile(io.FileIO):
+        def stat(self):
+            return os.fstat(self.fileno())
+
+        def prefetch(self, file_size=None):
+            pass
+
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    class SlowConnection:
+        is_active = True
+
+        def __init__(self):
+            self.last_used = time.monotonic()
+
+        def sftp(self):
+            return self
+
+        def open(self, path, mode):
+            with lock:
+                active.append(path)
+                peak.append(len(active))
+            time.sleep(0.2)
+            with lock:
+                active.remove(path)
+            return LocalSFTPFile(path, mode.replace("b", ""))
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(
+        remote_transfer.SSHConnectionPool, "_connect", lambda self: SlowConnection()
     )
-    assert (
-        _escape_spaces_scp_path(r"ssh://host:path_without_spaces")
-        == r"ssh://host:path_without_spaces"
+    monkeypatch.setattr(remote_transfer, "_POOLS", {})
+    monkeypatch.setattr(CONFIG, "REMOTE_SSH_POOL_SIZE", 2)
+    monkeypatch.setattr(CONFIG, "REMOTE_SSH_TIMEOUT", 0)
+    monkeypatch.setattr(CONFIG, "REMOTE_TRANSFER_CONCURRENCY", 8)
+
+    paths = []
+    for i in range(6):
+        path = tmp_path / f"remote_{i}.txt"
+        path.write_text(str(i))
+        paths.append(str(path))
+
+    results = remote_transfer.fetch_remote_files(
+        ("ssh://host", path, tmp_path / f"local_{i}.txt") for i, path in enumerate(paths)
     )
+    assert all(result.error is None for result in results.values())
+    assert [(tmp_path / f"local_{i}.txt").read_text() for i in range(6)] == [
+        str(i) for i in range(6)
+    ]
+    assert max(peak) <= CONFIG.REMOTE_SSH_POOL_SIZE
+
+    # Leases beyond the size of the pool wait for a connection to be returned
+    pool = remote_transfer.get_pool("ssh://host")
+    errors = []
+
+    def lease():
+        try:
+            with pool.connection() as connection:
+                connection.open(paths[0], "rb").close()
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=lease) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert max(peak) <= CONFIG.REMOTE_SSH_POOL_SIZE